@@ -1,22 +1,42 @@
 
 from flask import Blueprint, jsonify, request
 from app import realtime_db  
+from app.utils.bookings import BOOKINGS_BY_EVENT, check_booking_index, rebuild_booking_index
 
 booking_bp = Blueprint("booking_bp", __name__)  
 
 @booking_bp.route("/bookings/by-event/<event_id>", methods=["GET"])
 def get_bookings_by_event(event_id):
     try:
-        all_bookings_snapshot = realtime_db.child("bookings").get()
-        all_bookings = all_bookings_snapshot.val() if hasattr(all_bookings_snapshot, 'val') else all_bookings_snapshot
+        # Only this event's slice of the index, not every booking
+        event_bookings = realtime_db.child(BOOKINGS_BY_EVENT).child(event_id).get() or {}
 
         matched_users = []
 
-        for booking_id, data in all_bookings.items():
-            # Ensure key exists and status is successful
-            if data.get("eventId") == event_id and data.get("status") == "successful":
+        for booking_id, data in event_bookings.items():
+            # Ensure status is successful
+            if isinstance(data, dict) and data.get("status") == "successful":
                 matched_users.append(data)
 
         return jsonify(matched_users), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+# Backfill bookings_by_event from bookings, also repairs drifted entries
+@booking_bp.route("/bookings/index/rebuild", methods=["GET"])
+def rebuild_bookings_index():
+    try:
+        result = rebuild_booking_index(chunk_size=request.args.get("chunk_size"))
+        status_code = 500 if result["writes"]["failed_chunks"] else 200
+        return jsonify(result), status_code
+    except Exception as e:
+        print(f"Error rebuilding bookings index: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@booking_bp.route("/bookings/index/check", methods=["GET"])
+def check_bookings_index():
+    try:
+        return jsonify(check_booking_index()), 200
+    except Exception as e:
+        print(f"Error checking bookings index: {e}")
+        return jsonify({"error": str(e)}), 500
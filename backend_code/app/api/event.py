@@ -1,5 +1,26 @@
 from flask import Blueprint, request, jsonify
 from app import realtime_db
+from firebase_admin.db import TransactionAbortedError
+from app.utils.streaming import batched_lines, csv_lines, ndjson_lines, streamed_response
+from app.utils.seats import (
+    EventNotFoundError,
+    SeatUnavailableError,
+    initial_seat_shards,
+    release_seat,
+    reserve_seat,
+    seat_counts
+)
+from app.utils.events import (
+    ATTENDEE_FIELDS,
+    EVENT_SUMMARIES,
+    attendee_page,
+    event_summary,
+    iter_attendees,
+    list_event_summaries,
+    rebuild_event_summaries,
+    with_seat_counts
+)
+from app.utils.checkin import CHECKINS, check_in_desk
 import uuid
 from datetime import datetime
 
@@ -27,45 +48,60 @@ def create_event():
         "booked_vip": 0
     }
 
+    # Hot events can spread their seat counters over several shards
+    seat_shards = int(data.get("seat_shards", 1) or 1)
+    if seat_shards > 1:
+        event_data["seat_shard_count"] = seat_shards
+        event_data["seat_shards"] = initial_seat_shards(event_data, seat_shards)
 
-    realtime_db.child("events").child(event_id).set(event_data)
+    # The event and its listing summary go out in one write
+    realtime_db.update({
+        f"events/{event_id}": event_data,
+        f"{EVENT_SUMMARIES}/{event_id}": event_summary(event_data)
+    })
     return jsonify({"msg": "Event created", "event_id": event_id}), 201
 
 
-# Get upcoming events
-@event_bp.route("/api/v1/events/upcoming", methods=["GET"])
-def get_upcoming_events():
-    all_events = realtime_db.child("events").get()
+def list_events(upcoming, default_limit=None):
+    """Summaries without tickets/rsvps, paged when `limit` or `cursor` is given.
+
+    `default_limit` only sizes pages, the plain list without either
+    parameter holds every event.
+    """
     now = datetime.utcnow().isoformat()
+    cursor = request.args.get("cursor")
+    paged = "limit" in request.args or bool(cursor)
+    limit = (request.args.get("limit", type=int) or default_limit) if paged else None
 
-    upcoming = []
-    if all_events:
-        for event_id, event in all_events.items():
-            if event.get("event_date") > now:
-                event["event_id"] = event_id
-                event["booked_normal"] = int(event.get("booked_normal", 0))
-                event["booked_vip"] = int(event.get("booked_vip", 0))
-                event["available_normal"] = int(event.get("max_tickets", 0)) - event["booked_normal"]
-                event["available_vip"] = int(event.get("vip_limit", 0)) - event["booked_vip"]
-                upcoming.append(event)
+    events, next_cursor = list_event_summaries(upcoming, now, limit=limit, cursor=cursor)
+    with_seat_counts(events)
 
-    return jsonify(upcoming), 200
+    if paged:
+        return jsonify({"events": events, "next_cursor": next_cursor}), 200
+    return jsonify(events), 200
 
 
-# Get past events
-@event_bp.route("/api/v1/events/past", methods=["GET"])
-def get_past_events():
-    all_events = realtime_db.child("events").get()
-    now = datetime.utcnow().isoformat()
+# Get upcoming events, soonest first
+@event_bp.route("/api/v1/events/upcoming", methods=["GET"])
+def get_upcoming_events():
+    return list_events(upcoming=True)
 
-    past = []
-    if all_events:
-        for event_id, event in all_events.items():
-            if event.get("event_date") <= now:
-                event["event_id"] = event_id
-                past.append(event)
 
-    return jsonify(past), 200
+# Get past events, newest first
+@event_bp.route("/api/v1/events/past", methods=["GET"])
+def get_past_events():
+    return list_events(upcoming=False, default_limit=50)
+
+# Backfill eventSummaries for events created before the listing index
+@event_bp.route("/api/v1/events/summaries/rebuild", methods=["GET"])
+def rebuild_summaries():
+    try:
+        result = rebuild_event_summaries(chunk_size=request.args.get("chunk_size"))
+        status_code = 500 if result["writes"]["failed_chunks"] else 200
+        return jsonify(result), status_code
+    except Exception as e:
+        print(f"Error rebuilding event summaries: {e}")
+        return jsonify({"msg": "Error rebuilding event summaries", "error": str(e)}), 500
 
 # RSVP to an event
 @event_bp.route("/api/v1/events/<event_id>/rsvp", methods=["POST"])
@@ -75,7 +111,25 @@ def rsvp_event(event_id):
     if not user_id:
         return jsonify({"msg": "user_id is required"}), 400
 
-    realtime_db.child("events").child(event_id).child("rsvps").update({user_id: True})
+    # Keys only, an RSVP must not create a stub of a missing event
+    if not realtime_db.child("events").child(event_id).get(shallow=True):
+        return jsonify({"msg": "Event not found"}), 404
+
+    added = []
+
+    def add_rsvp(current):
+        added[:] = [not current]
+        return True
+
+    def count_rsvp(summary):
+        # Only bump a summary that exists, the rebuild backfills missing ones
+        if not summary:
+            return summary
+        return {**summary, "rsvp_count": int(summary.get("rsvp_count", 0)) + 1}
+
+    realtime_db.child("events").child(event_id).child("rsvps").child(user_id).transaction(add_rsvp)
+    if added[0]:
+        realtime_db.child(EVENT_SUMMARIES).child(event_id).transaction(count_rsvp)
     return jsonify({"msg": "RSVP successful"}), 200
 
 # Get event ticket stats
@@ -91,12 +145,9 @@ def get_event_stats(event_id):
         "location": event.get("location"),
         "event_date": event.get("event_date"),
         "max_tickets": int(event.get("max_tickets", 0)),
-        "vip_limit": int(event.get("vip_limit", 0)),
-        "booked_normal": int(event.get("booked_normal", 0)),
-        "booked_vip": int(event.get("booked_vip", 0))
+        "vip_limit": int(event.get("vip_limit", 0))
     }
-    stats["available_normal"] = stats["max_tickets"] - stats["booked_normal"]
-    stats["available_vip"] = stats["vip_limit"] - stats["booked_vip"]
+    stats.update(seat_counts(event))
 
     return jsonify(stats), 200
 
@@ -112,20 +163,20 @@ def book_ticket(event_id):
     if not all([name, age, gender, seat_type]):
         return jsonify({"msg": "All fields are required"}), 400
 
-    event = realtime_db.child("events").child(event_id).get()
-    if not event:
-        return jsonify({"msg": "Event not found"}), 404
+    if seat_type not in ("normal", "vip"):
+        return jsonify({"msg": "Invalid seat type"}), 400
 
-    if seat_type == "normal":
-        if int(event.get("booked_normal", 0)) >= int(event.get("max_tickets", 0)):
+    try:
+        shard = reserve_seat(event_id, seat_type)
+    except EventNotFoundError:
+        return jsonify({"msg": "Event not found"}), 404
+    except SeatUnavailableError:
+        if seat_type == "normal":
             return jsonify({"msg": "No normal tickets available"}), 400
-        event["booked_normal"] = int(event.get("booked_normal", 0)) + 1
-    elif seat_type == "vip":
-        if int(event.get("booked_vip", 0)) >= int(event.get("vip_limit", 0)):
-            return jsonify({"msg": "No VIP tickets available"}), 400
-        event["booked_vip"] = int(event.get("booked_vip", 0)) + 1
-    else:
-        return jsonify({"msg": "Invalid seat type"}), 400
+        return jsonify({"msg": "No VIP tickets available"}), 400
+    except TransactionAbortedError as e:
+        print(f"Error reserving seat for event {event_id}: {e}")
+        return jsonify({"msg": "Too many bookings at once, please try again"}), 503
 
     ticket_id = str(uuid.uuid4())
     ticket_data = {
@@ -137,24 +188,31 @@ def book_ticket(event_id):
         "booked_at": datetime.utcnow().isoformat()
     }
 
-    realtime_db.child("events").child(event_id).child("tickets").child(ticket_id).set(ticket_data)
-    realtime_db.child("events").child(event_id).update({
-        "booked_normal": event.get("booked_normal"),
-        "booked_vip": event.get("booked_vip")
-    })
+    try:
+        realtime_db.child("events").child(event_id).child("tickets").child(ticket_id).set(ticket_data)
+    except Exception:
+        # The seat is already counted, without its ticket nothing would give it back
+        release_seat(event_id, seat_type, shard)
+        raise
+    check_in_desk.add_ticket(event_id, ticket_id)
 
     return jsonify({"msg": "Ticket booked", "ticket_id": ticket_id}), 200
 
 # Delete an event by ID
 @event_bp.route("/api/v1/events/<event_id>", methods=["DELETE"])
 def delete_event(event_id):
-    event_ref = realtime_db.child("events").child(event_id)
-    event = event_ref.get()
+    # Keys only, no need to download the tickets just to check it exists
+    event = realtime_db.child("events").child(event_id).get(shallow=True)
 
     if not event:
         return jsonify({"msg": "Event not found"}), 404
 
-    event_ref.delete()
+    realtime_db.update({
+        f"events/{event_id}": None,
+        f"{EVENT_SUMMARIES}/{event_id}": None,
+        f"{CHECKINS}/{event_id}": None
+    })
+    check_in_desk.forget_event(event_id)
     return jsonify({"msg": f"Event {event_id} deleted successfully"}), 200
 
 
@@ -165,28 +223,102 @@ def get_event(event_id):
         return jsonify({"msg": "Event not found"}), 404
 
     event["event_id"] = event_id
+    event.update(seat_counts(event))
     return jsonify(event), 200
 
 
 # Get list of registered attendees for an event
 @event_bp.route("/api/v1/events/<event_id>/attendees", methods=["GET"])
 def get_event_attendees(event_id):
-    event = realtime_db.child("events").child(event_id).get()
+    # Keys only, the tickets are read page by page below
+    event = realtime_db.child("events").child(event_id).get(shallow=True)
     if not event:
         return jsonify({"msg": "Event not found"}), 404
 
-    tickets = event.get("tickets", {})
-    attendees = []
-
-    for ticket_id, ticket_info in tickets.items():
-        attendee = {
-            "ticket_id": ticket_id,
-            "name": ticket_info.get("name"),
-            "age": ticket_info.get("age"),
-            "gender": ticket_info.get("gender"),
-            "seat_type": ticket_info.get("seat_type"),
-            "booked_at": ticket_info.get("booked_at")
-        }
-        attendees.append(attendee)
-
-    return jsonify(attendees), 200
+    seat_type = request.args.get("seat_type")
+    export_format = request.args.get("format", "").lower()
+
+    # format=csv / format=ndjson stream every attendee without holding them in memory
+    if export_format == "csv":
+        rows = csv_lines(ATTENDEE_FIELDS, iter_attendees(event_id, seat_type=seat_type))
+        return streamed_response(batched_lines(rows), "text/csv")
+    if export_format == "ndjson":
+        lines = ndjson_lines(iter_attendees(event_id, seat_type=seat_type))
+        return streamed_response(batched_lines(lines), "application/x-ndjson")
+
+    # Cursor mode: `limit` attendees per request, ordered by ticket ID
+    if "limit" in request.args or "cursor" in request.args:
+        limit = max(1, request.args.get("limit", 50, type=int))
+        attendees, next_cursor = attendee_page(event_id, limit, request.args.get("cursor"), seat_type)
+        return jsonify({"attendees": attendees, "next_cursor": next_cursor}), 200
+
+    return jsonify(list(iter_attendees(event_id, seat_type=seat_type))), 200
+
+
+# Door check-in: ticket IDs are held in memory, scans are buffered locally
+# and flushed to checkins/<event_id> in batches
+@event_bp.route("/api/v1/events/<event_id>/checkin/load", methods=["GET"])
+def load_event_checkin(event_id):
+    try:
+        return jsonify(check_in_desk.load_event(event_id)), 200
+    except EventNotFoundError:
+        return jsonify({"msg": "Event not found"}), 404
+    except Exception as e:
+        print(f"Error loading check-in for event {event_id}: {e}")
+        return jsonify({"msg": str(e)}), 500
+
+
+@event_bp.route("/api/v1/events/<event_id>/checkin", methods=["POST"])
+def check_in_ticket(event_id):
+    data = request.get_json() or {}
+    gate = data.get("gate")
+
+    # A scanner coming back online can send its scans as one list
+    ticket_ids = data.get("ticket_ids")
+    if ticket_ids is None and data.get("ticket_id"):
+        ticket_ids = [data["ticket_id"]]
+    if not ticket_ids:
+        return jsonify({"msg": "ticket_id is required"}), 400
+
+    try:
+        results = [{"ticket_id": ticket_id, "status": check_in_desk.scan(event_id, ticket_id, gate)} for ticket_id in ticket_ids]
+    except EventNotFoundError:
+        return jsonify({"msg": "Event not found"}), 404
+    except Exception as e:
+        print(f"Error checking in tickets for event {event_id}: {e}")
+        return jsonify({"msg": str(e)}), 500
+
+    if "ticket_ids" in data:
+        return jsonify({"results": results}), 200
+
+    status_codes = {"admitted": 200, "duplicate": 409, "invalid": 404}
+    return jsonify(results[0]), status_codes[results[0]["status"]]
+
+
+@event_bp.route("/api/v1/events/<event_id>/checkin/status", methods=["GET"])
+def event_checkin_status(event_id):
+    return jsonify(check_in_desk.status(event_id)), 200
+
+
+# Bloom filter of tickets not checked in yet, for scanners working offline
+@event_bp.route("/api/v1/events/<event_id>/checkin/bloom", methods=["GET"])
+def event_checkin_bloom(event_id):
+    error_rate = request.args.get("error_rate", 0.001, type=float)
+    if not 0 < error_rate < 1:
+        return jsonify({"msg": "error_rate must be between 0 and 1"}), 400
+
+    try:
+        return jsonify(check_in_desk.bloom_filter(event_id, error_rate)), 200
+    except EventNotFoundError:
+        return jsonify({"msg": "Event not found"}), 404
+
+
+@event_bp.route("/api/v1/checkins/flush", methods=["GET"])
+def flush_checkins():
+    try:
+        result = check_in_desk.flush()
+        status_code = 500 if result["failed"] else 200
+        return jsonify({**result, "desk": check_in_desk.status()}), status_code
+    except Exception as e:
+        print(f"Error flushing check-ins: {e}")
+        return jsonify({"msg": str(e)}), 500
@@ -5,7 +5,24 @@ import stripe
 from app.firebase_helpers import create_payment_document
 from app.firebase_helpers import create_booking_document 
 from app import realtime_db  
+from firebase_admin.db import TransactionAbortedError
+from app.utils.seats import SEAT_TYPES, EventNotFoundError, SeatUnavailableError
+from app.utils.holds import hold_sweeper, settle_writes
+from app.utils.webhook_queue import WebhookQueue
+from app.utils.bookings import booking_delete_writes, booking_update_writes, booking_writes, BOOKING_GROUPS, BOOKINGS_BY_EVENT
+from app.utils.listing import clear_children, list_by_created
+from app.utils.payment_rollups import (
+    booking_day,
+    increment_writes,
+    payment_deltas,
+    payment_summary,
+    rebuild_payment_rollups,
+    status_change_deltas
+)
+from app.config import GROUP_BOOKING_MAX_SIZE, WEBHOOK_QUEUE_PATH, WEBHOOK_WORKERS
 import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 payment_bp = Blueprint("payment_bp", __name__)
@@ -13,9 +30,8 @@ payment_bp = Blueprint("payment_bp", __name__)
 stripe.api_key = ''
 
 
-# Function to create a payment document (no change needed)
-def create_payment_document(payment_id, amount, currency, status):
-    payment_doc = {
+def payment_document(payment_id, amount, currency, status):
+    return {
         'paymentId': payment_id,
         'amount': amount,
         'currency': currency,
@@ -23,15 +39,16 @@ def create_payment_document(payment_id, amount, currency, status):
         'createdAt': datetime.now(timezone.utc).isoformat(),
         'updatedAt': datetime.now(timezone.utc).isoformat()
     }
+
+# Function to create a payment document (no change needed)
+def create_payment_document(payment_id, amount, currency, status):
+    payment_doc = payment_document(payment_id, amount, currency, status)
     realtime_db.child("payments").child(payment_id).set(payment_doc)
 
 def slugify(text: str) -> str:
     return text.strip().replace(" ", "_").lower()
 
-# Function to create a booking document using Realtime Database
-def create_booking_document(event_id, name, age, gender, seat_type, amount):
-    booking_id = str(uuid.uuid4())
-
+def booking_document(event_id, name, age, gender, seat_type, amount, hold=None):
     booking_doc = {
         'eventId': slugify(event_id),
         'eventName': event_id,  # 👈 Optional: store original name for display
@@ -44,10 +61,68 @@ def create_booking_document(event_id, name, age, gender, seat_type, amount):
         'createdAt': datetime.now(timezone.utc).isoformat(),
         'updatedAt': datetime.now(timezone.utc).isoformat()
     }
+    if hold:
+        booking_doc['holdId'] = hold['holdId']
+        booking_doc['holdExpiresAt'] = hold['expiresAt']
+        # Same day as the hold, so the sweeper's rollup updates line up
+        booking_doc['createdAt'] = hold['createdAt']
+    return booking_doc
 
-    realtime_db.child("bookings").child(booking_id).set(booking_doc)
+# Function to create a booking document using Realtime Database
+def create_booking_document(event_id, name, age, gender, seat_type, amount, booking_id=None, hold=None):
+    booking_id = booking_id or str(uuid.uuid4())
+    booking_doc = booking_document(event_id, name, age, gender, seat_type, amount, hold=hold)
+
+    # Booking, its by-event index entry and the rollup counters go out in one write
+    realtime_db.update({
+        **booking_writes(booking_id, booking_doc),
+        **increment_writes(status_change_deltas(booking_doc, None, 'pending'))
+    })
     return booking_id
 
+def create_group_booking_documents(event_id, attendees, holds, group_id):
+    """Every booking of a group, their index entries, the group record and the rollups in one write."""
+    writes = {}
+    deltas = Counter()
+    for attendee, hold in zip(attendees, holds):
+        booking_doc = booking_document(
+            event_id,
+            attendee['name'],
+            attendee['age'],
+            attendee['gender'],
+            attendee['seat_type'],
+            attendee['amount'],
+            hold=hold
+        )
+        booking_doc['groupId'] = group_id
+        writes.update(booking_writes(hold['bookingId'], booking_doc))
+        deltas.update(status_change_deltas(booking_doc, None, 'pending'))
+
+    writes[f"{BOOKING_GROUPS}/{group_id}"] = {
+        'groupId': group_id,
+        'eventId': slugify(event_id),
+        'bookingIds': {hold['bookingId']: hold['seatType'] for hold in holds},
+        'amount': sum(int(attendee['amount']) for attendee in attendees),
+        'status': 'pending',
+        'holdExpiresAt': holds[0]['expiresAt'],
+        'createdAt': holds[0]['createdAt'],
+        'updatedAt': datetime.now(timezone.utc).isoformat()
+    }
+
+    realtime_db.update({**writes, **increment_writes(deltas)})
+
+def group_line_items(attendees):
+    """One checkout line item per seat type and price, the attendee count as quantity."""
+    quantities = Counter((attendee['seat_type'], int(attendee['amount'])) for attendee in attendees)
+    return [{
+        'price_data': {
+            'currency': 'usd',
+            'product_data': {'name': f"Event Ticket ({seat_type})"},
+            'unit_amount': amount,
+        },
+        'quantity': quantity,
+    } for (seat_type, amount), quantity in quantities.items()]
+
 @payment_bp.route("/api/v1/bookings/initiate", methods=["POST"])
 def initiate_booking():
     # Print when the endpoint is hit
@@ -65,7 +140,15 @@ def initiate_booking():
             print(f"Missing required field: {field}")
             return jsonify({"detail": f"{field} is required"}), 400
 
+    if data['seat_type'] not in SEAT_TYPES:
+        return jsonify({"detail": f"Unknown seat type: {data['seat_type']}"}), 400
+
     try:
+        # Hold the seat until the payment comes through or the hold lapses
+        booking_id = str(uuid.uuid4())
+        hold = hold_sweeper.place_hold(slugify(data['event_id']), data['seat_type'], booking_id)
+        print(f"Holding a {data['seat_type']} seat until {hold['expiresAt']}")
+
         # Print that we're about to create a booking
         print("Creating booking document in Realtime Database")
         
@@ -75,14 +158,24 @@ def initiate_booking():
             age=data['age'],
             gender=data['gender'],
             seat_type=data['seat_type'],
-            amount=data['amount']
+            amount=data['amount'],
+            booking_id=booking_id,
+            hold=hold
         )
         
         # Print the booking ID after creation
         print(f"Booking created successfully with ID: {booking_id}")
 
         # Return the booking ID for later use in checkout session creation
-        return jsonify({"booking_id": booking_id}), 201
+        return jsonify({"booking_id": booking_id, "hold_expires_at": hold['expiresAt']}), 201
+
+    except EventNotFoundError:
+        return jsonify({"detail": "Event not found"}), 404
+    except SeatUnavailableError:
+        return jsonify({"detail": f"No {data['seat_type']} seats available"}), 409
+    except TransactionAbortedError as e:
+        print(f"Error holding seat: {e}")
+        return jsonify({"detail": "Too many bookings at once, please try again"}), 503
 
     except Exception as e:
         # Print the error if there is one
@@ -90,6 +183,82 @@ def initiate_booking():
         return jsonify({"detail": f"Error creating booking: {str(e)}"}), 500
 
 
+@payment_bp.route("/api/v1/bookings/group", methods=["POST"])
+def initiate_group_booking():
+    data = request.json or {}
+    event_id = data.get("event_id")
+    attendees = data.get("attendees")
+
+    if not event_id:
+        return jsonify({"detail": "event_id is required"}), 400
+    if not isinstance(attendees, list) or not attendees:
+        return jsonify({"detail": "attendees is required"}), 400
+    if len(attendees) > GROUP_BOOKING_MAX_SIZE:
+        return jsonify({"detail": f"At most {GROUP_BOOKING_MAX_SIZE} attendees per group booking"}), 400
+
+    required_fields = ['name', 'age', 'gender', 'seat_type', 'amount']
+    for index, attendee in enumerate(attendees):
+        for field in required_fields:
+            if not isinstance(attendee, dict) or field not in attendee:
+                return jsonify({"detail": f"attendees[{index}].{field} is required"}), 400
+        if attendee['seat_type'] not in SEAT_TYPES:
+            return jsonify({"detail": f"Unknown seat type: {attendee['seat_type']}"}), 400
+        if not str(attendee['amount']).isdigit():
+            return jsonify({"detail": f"attendees[{index}].amount must be a whole number of cents"}), 400
+
+    group_id = str(uuid.uuid4())
+    booking_ids = [str(uuid.uuid4()) for _ in attendees]
+
+    try:
+        # Every attendee's seat or none of them, then all bookings in one write
+        holds = hold_sweeper.place_holds(slugify(event_id), [attendee['seat_type'] for attendee in attendees], booking_ids)
+        create_group_booking_documents(event_id, attendees, holds, group_id)
+        print(f"Holding {len(holds)} seats for group {group_id} until {holds[0]['expiresAt']}")
+    except EventNotFoundError:
+        return jsonify({"detail": "Event not found"}), 404
+    except SeatUnavailableError:
+        return jsonify({"detail": "Not enough seats available for this group"}), 409
+    except TransactionAbortedError as e:
+        print(f"Error holding group seats: {e}")
+        return jsonify({"detail": "Too many bookings at once, please try again"}), 503
+    except Exception as e:
+        print(f"Error creating group booking: {str(e)}")
+        return jsonify({"detail": f"Error creating group booking: {str(e)}"}), 500
+
+    try:
+        session = stripe.checkout.Session.create(
+            payment_method_types=['card'],
+            line_items=group_line_items(attendees),
+            mode='payment',
+            success_url="http://localhost:5173/success",
+            cancel_url="http://localhost:5173/cancel",
+            shipping_address_collection={
+                'allowed_countries': ['US']
+            },
+            payment_intent_data={
+                "metadata": {
+                    "group_id": group_id  # The webhook confirms every booking of the group
+                }
+            }
+        )
+    except Exception as e:
+        # No way to pay, hand the seats back instead of waiting for the holds to lapse
+        print(f"Error creating checkout session for group {group_id}: {str(e)}")
+        hold_sweeper.release([hold['holdId'] for hold in holds], status="cancelled")
+        realtime_db.child(BOOKING_GROUPS).child(group_id).update({
+            'status': 'cancelled',
+            'updatedAt': datetime.now(timezone.utc).isoformat()
+        })
+        return jsonify({"detail": str(e)}), 400
+
+    return jsonify({
+        "group_id": group_id,
+        "booking_ids": booking_ids,
+        "checkoutUrl": session.url,
+        "hold_expires_at": holds[0]['expiresAt']
+    }), 201
+
+
 @payment_bp.route("/api/v1/create-checkout-session", methods=["POST", "OPTIONS"])
 def create_checkout_session():
     if request.method == "OPTIONS":
@@ -150,23 +319,235 @@ def create_payment_intent():
         return jsonify({"detail": str(e)}), 400
 
 
+def secure_seats(event_id, bookings, owner):
+    """Claim the seat hold of every booking for `owner`, with fresh claimed holds for the ones that lapsed.
+
+    Returns (holds, bookings, unavailable): the claimed hold per booking ID,
+    the bookings (read again where they were pointed at a new hold) and the
+    IDs no seat was left for. A fresh hold and its booking's new holdId go
+    out in one update, so calling this again for the same owner finds the
+    same holds and never takes a second seat.
+    """
+    claimed = hold_sweeper.claim_holds([booking["holdId"] for booking in bookings.values() if booking.get("holdId")], owner)
+    holds = {
+        booking_id: claimed[booking["holdId"]]
+        for booking_id, booking in bookings.items() if booking.get("holdId") in claimed
+    }
+    lapsed = [booking_id for booking_id in bookings if booking_id not in holds]
+    if not lapsed:
+        return holds, bookings, []
+
+    def point_bookings(new_holds):
+        writes = {}
+        for hold in new_holds:
+            writes.update(booking_update_writes(hold["bookingId"], event_id, {
+                "holdId": hold["holdId"],
+                "holdExpiresAt": hold["expiresAt"]
+            }))
+        return writes
+
+    try:
+        new_holds = hold_sweeper.place_holds(
+            event_id,
+            [bookings[booking_id].get("seatType") for booking_id in lapsed],
+            lapsed,
+            claimed_by=owner,
+            extra_writes=point_bookings
+        )
+    except SeatUnavailableError:
+        return holds, bookings, lapsed
+
+    # The sweeper may have expired them before they pointed at the new hold
+    bookings = dict(bookings)
+    for hold in new_holds:
+        holds[hold["bookingId"]] = hold
+        bookings[hold["bookingId"]] = realtime_db.child("bookings").child(hold["bookingId"]).get() or bookings[hold["bookingId"]]
+    print(f"Placed {len(new_holds)} new seat holds for lapsed holds on event {event_id}")
+    return holds, bookings, []
+
+
+def process_stripe_event(event):
+    """Apply one verified Stripe event, called by the webhook queue workers.
+
+    Raising leaves the event to be retried and eventually marked failed.
+    """
+    if event["type"] != "payment_intent.succeeded":
+        return
+
+    intent = event["data"]["object"]
+    group_id = intent.get("metadata", {}).get("group_id")
+    if group_id:
+        return process_group_payment(intent, group_id)
+
+    booking_id = intent.get("metadata", {}).get("booking_id")
+    if not booking_id:
+        print("No booking ID found in metadata")
+        return
+
+    print(f"Payment successful for booking ID: {booking_id}")
+
+    # Get booking data
+    booking = realtime_db.child("bookings").child(booking_id).get()
+    if not booking:
+        raise LookupError(f"No booking record found for ID: {booking_id}")
+
+    # Don't count the same booking or payment twice when an event is replayed
+    if booking.get("status") == "successful" or booking.get("paymentId") == intent["id"]:
+        print(f"Booking {booking_id} already processed")
+        return
+
+    event_id = booking.get("eventId")
+    seat_type = booking.get("seatType")
+
+    if seat_type not in SEAT_TYPES:
+        raise ValueError(f"Unknown seat type: {seat_type}")
+
+    # Claim the hold for this payment, or a fresh one when it lapsed. The
+    # hold stays until the write below, so a retried event finds its claim
+    # again instead of taking another seat. TransactionAbortedError
+    # propagates, the queue retries the event.
+    try:
+        holds, bookings, unavailable = secure_seats(event_id, {booking_id: booking}, f"payment:{intent['id']}")
+    except EventNotFoundError:
+        raise LookupError(f"Event {event_id} not found for booking {booking_id}")
+    booking = bookings[booking_id]
+
+    if unavailable:
+        # The payment already went through, keep it on record for a refund
+        status = "seats_unavailable"
+        print(f"No {seat_type} seats left on event {event_id} for booking {booking_id}")
+    else:
+        status = "successful"
+
+    # Booking status, payment record, the hold turned into a sale and the
+    # rollups in one write, so a retried event can't count anything twice
+    payment_doc = payment_document(
+        payment_id=intent["id"],
+        amount=intent["amount"],
+        currency=intent["currency"],
+        status=intent["status"],
+    )
+    payment_doc.update({"bookingId": booking_id, "eventId": event_id, "day": booking_day(booking)})
+
+    deltas = status_change_deltas(booking, booking.get("status"), status)
+    deltas.update(payment_deltas(event_id, booking_day(booking), intent["amount"], intent["currency"]))
+
+    realtime_db.update({
+        **booking_update_writes(booking_id, event_id, {
+            "status": status,
+            "paymentId": intent["id"],
+            "updatedAt": datetime.utcnow().isoformat()
+        }, booking=booking),
+        f"payments/{intent['id']}": payment_doc,
+        **settle_writes(holds.values()),
+        **increment_writes(deltas)
+    })
+
+    print(f"Booking {booking_id} marked as {status}")
+
+
+def process_group_payment(intent, group_id):
+    """Confirm every booking of a group paid with one checkout session, in a single pass."""
+    group = realtime_db.child(BOOKING_GROUPS).child(group_id).get()
+    if not group:
+        raise LookupError(f"No booking group found for ID: {group_id}")
+
+    if group.get("status") == "successful" or group.get("paymentId") == intent["id"]:
+        print(f"Booking group {group_id} already processed")
+        return
+
+    event_id = group.get("eventId")
+    booking_ids = list(group.get("bookingIds") or {})
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(booking_ids)))) as executor:
+        bookings = dict(zip(booking_ids, executor.map(
+            lambda booking_id: realtime_db.child("bookings").child(booking_id).get(),
+            booking_ids
+        )))
+    missing = [booking_id for booking_id, booking in bookings.items() if not booking]
+    if missing:
+        raise LookupError(f"No booking records found for IDs: {', '.join(missing)}")
+
+    # Bookings that are already successful stay as they are
+    pending = {booking_id: booking for booking_id, booking in bookings.items() if booking.get("status") != "successful"}
+    updated_at = datetime.utcnow().isoformat()
+
+    def status_writes(statuses):
+        writes = {}
+        deltas = Counter()
+        for booking_id, status in statuses.items():
+            booking = pending[booking_id]
+            writes.update(booking_update_writes(booking_id, event_id, {
+                "status": status,
+                "paymentId": intent["id"],
+                "updatedAt": updated_at
+            }, booking=booking))
+            deltas.update(status_change_deltas(booking, booking.get("status"), status))
+        return writes, deltas
+
+    # Claim the holds for this payment, the ones that already lapsed get
+    # fresh holds, all of them or none. Nothing is sold until the write
+    # below, a retried event finds the same claims again
+    try:
+        holds, claimed_bookings, unavailable = secure_seats(event_id, pending, f"payment:{intent['id']}")
+    except EventNotFoundError:
+        raise LookupError(f"Event {event_id} not found for booking group {group_id}")
+    pending.update(claimed_bookings)
+    bookings.update(claimed_bookings)
+
+    statuses = {booking_id: "successful" for booking_id in pending}
+    if unavailable:
+        # The payment already went through, keep it on record for a refund
+        for booking_id in unavailable:
+            statuses[booking_id] = "seats_unavailable"
+        print(f"No seats left on event {event_id} for {len(unavailable)} bookings of group {group_id}")
+
+    final_statuses = {booking_id: booking.get("status") for booking_id, booking in bookings.items()}
+    final_statuses.update(statuses)
+    successful = sum(1 for status in final_statuses.values() if status == "successful")
+    if successful == len(final_statuses):
+        group_status = "successful"
+    elif successful:
+        group_status = "partially_successful"
+    else:
+        group_status = "seats_unavailable"
+
+    # Every booking, the group, the payment record and the rollups in one write
+    day = booking_day(group)
+    payment_doc = payment_document(
+        payment_id=intent["id"],
+        amount=intent["amount"],
+        currency=intent["currency"],
+        status=intent["status"],
+    )
+    payment_doc.update({"groupId": group_id, "eventId": event_id, "day": day})
+
+    writes, deltas = status_writes(statuses)
+    deltas.update(payment_deltas(event_id, day, intent["amount"], intent["currency"]))
+    writes.update({
+        f"{BOOKING_GROUPS}/{group_id}/status": group_status,
+        f"{BOOKING_GROUPS}/{group_id}/paymentId": intent["id"],
+        f"{BOOKING_GROUPS}/{group_id}/updatedAt": updated_at,
+        f"payments/{intent['id']}": payment_doc,
+        **settle_writes(holds.values())
+    })
+    realtime_db.update({**writes, **increment_writes(deltas)})
+
+    print(f"Booking group {group_id} marked as {group_status}")
+
+
+stripe_event_queue = WebhookQueue(WEBHOOK_QUEUE_PATH, process_stripe_event, workers=WEBHOOK_WORKERS)
+payment_bp.record_once(lambda state: stripe_event_queue.start())
+
+
 @payment_bp.route("/api/v1/webhook", methods=["POST"])
 def stripe_webhook():
-    print("Webhook received from Stripe")
-
     payload = request.get_data(as_text=False)
     sig_header = request.headers.get("stripe-signature")
     endpoint_secret = "whsec_kszJzWPepqIpvejK1N1QIj805lbhb5s8"
 
     try:
-        print(f"Payload received: {payload}")
-        print(f"Stripe Signature: {sig_header}")
-
         # Verify the event
         event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
-
-        print(f"Event received: {event['type']}")
-
     except ValueError as e:
         print(f"Invalid payload: {str(e)}")
         return jsonify({"detail": f"Invalid payload: {str(e)}"}), 400
@@ -174,68 +555,100 @@ def stripe_webhook():
         print(f"Invalid signature: {str(e)}")
         return jsonify({"detail": f"Invalid signature: {str(e)}"}), 400
 
-    if event["type"] == "payment_intent.succeeded":
-        intent = event["data"]["object"]
-        booking_id = intent.get("metadata", {}).get("booking_id")
-
-        if booking_id:
-            print(f"Payment successful for booking ID: {booking_id}")
-
-            # Get booking data
-            booking = realtime_db.child("bookings").child(booking_id).get()
-            if not booking:
-                print(f"No booking record found for ID: {booking_id}")
-                return jsonify({"detail": "Booking not found"}), 404
-
-            event_id = booking.get("eventId")
-            seat_type = booking.get("seatType")
-
-            # Get event data
-            event_ref = realtime_db.child("events").child(event_id)
-            event_data = event_ref.get()
-
-            if not event_data:
-                print(f"Event {event_id} not found for booking {booking_id}")
-                return jsonify({"detail": "Event not found"}), 404
-
-            # Update the event's seat count
-            if seat_type == "normal":
-                current = int(event_data.get("booked_normal", 0))
-                event_ref.update({"booked_normal": current + 1})
-                print(f"Incremented booked_normal to {current + 1}")
-            elif seat_type == "vip":
-                current = int(event_data.get("booked_vip", 0))
-                event_ref.update({"booked_vip": current + 1})
-                print(f"Incremented booked_vip to {current + 1}")
-            else:
-                print(f"Unknown seat type: {seat_type}")
-                return jsonify({"detail": f"Unknown seat type: {seat_type}"}), 400
-
-            # Update booking status
-            realtime_db.child("bookings").child(booking_id).update({
-                "status": "successful",
-                "updatedAt": datetime.utcnow().isoformat()
-            })
-
-            # Create payment record
-            create_payment_document(
-                payment_id=intent["id"],
-                amount=intent["amount"],
-                currency=intent["currency"],
-                status=intent["status"],
-            )
-
-            print(f"Booking {booking_id} marked as successful, event seats updated")
+    # Acknowledge as soon as the event is stored, the workers do the rest
+    try:
+        queued = stripe_event_queue.enqueue(event["id"], event["type"], payload.decode("utf-8"))
+    except Exception as e:
+        print(f"Error queueing webhook event {event['id']}: {str(e)}")
+        return jsonify({"detail": f"Error queueing event: {str(e)}"}), 500
+
+    return jsonify({"status": "queued" if queued else "duplicate"})
 
-        else:
-            print("No booking ID found in metadata")
 
-    return jsonify({"status": "success"})
+@payment_bp.route("/api/v1/webhook/replay", methods=["GET"])
+def replay_webhook_events():
+    try:
+        replayed = stripe_event_queue.replay(
+            event_id=request.args.get("event_id"),
+            status=request.args.get("status", "failed")
+        )
+        return jsonify({"replayed": replayed, "count": len(replayed)}), 200
+    except Exception as e:
+        print(f"Error replaying webhook events: {str(e)}")
+        return jsonify({"detail": f"Error replaying webhook events: {str(e)}"}), 500
+
+
+@payment_bp.route("/api/v1/webhook/status", methods=["GET"])
+def webhook_queue_status():
+    try:
+        return jsonify(stripe_event_queue.stats()), 200
+    except Exception as e:
+        print(f"Error reading webhook queue: {str(e)}")
+        return jsonify({"detail": f"Error reading webhook queue: {str(e)}"}), 500
+
+
+@payment_bp.route("/api/v1/seat_holds/sweep", methods=["GET"])
+def sweep_seat_holds():
+    try:
+        result = hold_sweeper.sweep()
+        status_code = 500 if result["failed"] else 200
+        return jsonify({**result, "sweeper": hold_sweeper.status()}), status_code
+    except Exception as e:
+        print(f"Error sweeping seat holds: {str(e)}")
+        return jsonify({"detail": f"Error sweeping seat holds: {str(e)}"}), 500
+
+
+@payment_bp.route("/api/v1/payments/summary", methods=["GET"])
+def get_payments_summary():
+    try:
+        summary = payment_summary(
+            start_day=request.args.get("from"),
+            end_day=request.args.get("to"),
+            event_id=request.args.get("event_id")
+        )
+        return jsonify(summary), 200
+    except Exception as e:
+        print(f"Error fetching payments summary: {str(e)}")
+        return jsonify({"detail": f"Error fetching payments summary: {str(e)}"}), 500
+
+
+@payment_bp.route("/api/v1/payments/summary/rebuild", methods=["GET"])
+def rebuild_payments_summary():
+    try:
+        return jsonify(rebuild_payment_rollups()), 200
+    except Exception as e:
+        print(f"Error rebuilding payments summary: {str(e)}")
+        return jsonify({"detail": f"Error rebuilding payments summary: {str(e)}"}), 500
+
+
+def paged_listing(ref, filters, id_field, items_key):
+    """Cursor page of `ref` for the admin listings, or None when no paging argument is given."""
+    paging_args = ("limit", "cursor", *filters)
+    if not any(arg in request.args for arg in paging_args):
+        return None
+
+    limit = max(1, min(request.args.get("limit", 50, type=int), 1000))
+    items, next_cursor = list_by_created(
+        ref,
+        limit,
+        cursor=request.args.get("cursor"),
+        filters={field: request.args.get(arg) for arg, field in filters.items()},
+        id_field=id_field
+    )
+    return jsonify({items_key: items, "next_cursor": next_cursor}), 200
 
 
 @payment_bp.route("/api/v1/bookings", methods=["GET"])
 def get_all_bookings():
     try:
+        # ?limit=&cursor=&status=&event_id= pages newest first, an event's
+        # bookings are read from its bookings_by_event slice
+        event_id = request.args.get("event_id")
+        ref = realtime_db.child(BOOKINGS_BY_EVENT).child(event_id) if event_id else realtime_db.child("bookings")
+        page = paged_listing(ref, {"status": "status", "event_id": "eventId"}, "booking_id", "bookings")
+        if page is not None:
+            return page
+
         bookings_snapshot = realtime_db.child("bookings").get()
         if bookings_snapshot:
             return jsonify(bookings_snapshot), 200
@@ -249,6 +662,11 @@ def get_all_bookings():
 @payment_bp.route("/api/v1/payments", methods=["GET"])
 def get_all_payments():
     try:
+        # ?limit=&cursor=&status=&event_id= pages newest first
+        page = paged_listing(realtime_db.child("payments"), {"status": "status", "event_id": "eventId"}, "payment_id", "payments")
+        if page is not None:
+            return page
+
         payments_snapshot = realtime_db.child("payments").get()
         if payments_snapshot:
             return jsonify(payments_snapshot), 200
@@ -262,9 +680,11 @@ def get_all_payments():
 @payment_bp.route("/api/v1/bookings/<string:booking_id>", methods=["DELETE"])
 def delete_booking(booking_id):
     try:
-        booking_ref = realtime_db.child("bookings").child(booking_id)
-        if booking_ref.get() is not None:
-            booking_ref.delete()
+        booking = realtime_db.child("bookings").child(booking_id).get()
+        if booking is not None:
+            event_id = booking.get("eventId") if isinstance(booking, dict) else None
+            deltas = status_change_deltas(booking, booking.get("status"), None) if isinstance(booking, dict) else {}
+            realtime_db.update({**booking_delete_writes(booking_id, event_id), **increment_writes(deltas)})
             return jsonify({"message": f"Booking {booking_id} deleted successfully."}), 200
         else:
             return jsonify({"detail": "Booking not found"}), 404
@@ -276,9 +696,13 @@ def delete_booking(booking_id):
 @payment_bp.route("/api/v1/payments/<string:payment_id>", methods=["DELETE"])
 def delete_payment(payment_id):
     try:
-        payment_ref = realtime_db.child("payments").child(payment_id)
-        if payment_ref.get() is not None:
-            payment_ref.delete()
+        payment = realtime_db.child("payments").child(payment_id).get()
+        if payment is not None:
+            writes = {f"payments/{payment_id}": None}
+            if isinstance(payment, dict):
+                day = payment.get("day") or booking_day(payment)
+                writes.update(increment_writes(payment_deltas(payment.get("eventId"), day, payment.get("amount"), payment.get("currency"), sign=-1)))
+            realtime_db.update(writes)
             return jsonify({"message": f"Payment {payment_id} deleted successfully."}), 200
         else:
             return jsonify({"detail": "Payment not found"}), 404
@@ -290,11 +714,15 @@ def delete_payment(payment_id):
 @payment_bp.route("/api/v1/bookings/clear", methods=["DELETE"])
 def clear_all_bookings():
     try:
-        bookings_snapshot = realtime_db.child("bookings").get()
-        if bookings_snapshot:
-            for booking_id in bookings_snapshot.keys():
-                realtime_db.child("bookings").child(booking_id).delete()
-            return jsonify({"message": "All bookings cleared successfully."}), 200
+        # Chunked multi-location null updates instead of one DELETE per booking
+        result = clear_children("bookings", chunk_size=request.args.get("chunk_size"))
+        if result["deleted"]:
+            index_result = clear_children(BOOKINGS_BY_EVENT, chunk_size=request.args.get("chunk_size"))
+            rebuild_payment_rollups()
+            failed_chunks = result["writes"]["failed_chunks"] + index_result["writes"]["failed_chunks"]
+            if failed_chunks:
+                return jsonify({"detail": f"{failed_chunks} chunks failed to clear", **result}), 500
+            return jsonify({"message": "All bookings cleared successfully.", **result}), 200
         else:
             return jsonify({"message": "No bookings to delete."}), 200
     except Exception as e:
@@ -304,11 +732,12 @@ def clear_all_bookings():
 @payment_bp.route("/api/v1/payments/clear", methods=["DELETE"])
 def clear_all_payments():
     try:
-        payments_snapshot = realtime_db.child("payments").get()
-        if payments_snapshot:
-            for payment_id in payments_snapshot.keys():
-                realtime_db.child("payments").child(payment_id).delete()
-            return jsonify({"message": "All payments cleared successfully."}), 200
+        result = clear_children("payments", chunk_size=request.args.get("chunk_size"))
+        if result["deleted"]:
+            rebuild_payment_rollups()
+            if result["writes"]["failed_chunks"]:
+                return jsonify({"detail": f"{result['writes']['failed_chunks']} chunks failed to clear", **result}), 500
+            return jsonify({"message": "All payments cleared successfully.", **result}), 200
         else:
             return jsonify({"message": "No payments to delete."}), 200
     except Exception as e:
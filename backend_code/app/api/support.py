@@ -1,6 +1,31 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import queue
 import uuid
 from datetime import datetime
+from app.config import SUPPORT_ARCHIVE_AFTER_DAYS
+from app.utils.streaming import sse_event
+from app.utils.support import (
+    MESSAGE_FIELDS,
+    SUPPORT_TICKET_SUMMARIES,
+    USER_TICKETS,
+    compact_messages,
+    current_summary,
+    inbox,
+    message_page,
+    message_preview,
+    messages_since,
+    push_key,
+    rebuild_ticket_summaries,
+    rebuild_user_ticket_index,
+    summary_update_writes,
+    ticket_summary,
+    user_tickets
+)
+from app.utils.support_archive import ArchiveInProgressError, support_archive
+from app.utils.support_stream import support_message_hub
+
+# Seconds between keep-alive comments on an idle message stream
+STREAM_KEEPALIVE = 15
 
 support_bp = Blueprint('support_bp', __name__)
 
@@ -11,17 +36,25 @@ def create_ticket():
     
     data = request.get_json()
     ticket_id = str(uuid.uuid4())
+    now = datetime.utcnow().isoformat()
 
     ticket_data = {
         "ticket_id": ticket_id,
         "created_by": data.get("user_id"),
-        "created_at": datetime.utcnow().isoformat(),
+        "created_at": now,
         "status": "open",
         "messages": {},  # Changed to empty dict for Firebase
-        "last_activity": datetime.utcnow().isoformat()
+        "last_activity": now
     }
 
-    realtime_db.child("supportTickets").child(ticket_id).set(ticket_data)
+    # Ticket, its inbox summary and the owner's index entry in one write
+    writes = {
+        f"supportTickets/{ticket_id}": ticket_data,
+        f"{SUPPORT_TICKET_SUMMARIES}/{ticket_id}": ticket_summary(ticket_id, ticket_data)
+    }
+    if ticket_data["created_by"]:
+        writes[f"{USER_TICKETS}/{ticket_data['created_by']}/{ticket_id}"] = True
+    realtime_db.update(writes)
     return jsonify({"msg": "Ticket created", "ticket_id": ticket_id}), 201
 
 
@@ -37,23 +70,41 @@ def add_message(ticket_id):
         "sender_type": "admin" if data.get("sender", "").lower().startswith("admin") else "user"
     }
 
-    # Add message to messages collection
-    ticket_ref = realtime_db.child("supportTickets").child(ticket_id).child("messages")
-    ticket_ref.push(message)
-    
-    # Update last activity
-    realtime_db.child("supportTickets").child(ticket_id).child("last_activity").set(datetime.utcnow().isoformat())
+    summary, stored = current_summary(ticket_id)
+    if summary is None:
+        return jsonify({"error": "Ticket not found"}), 404
+
+    # Message, last activity and the inbox summary in one write
+    message_id = push_key()
+    realtime_db.update({
+        f"supportTickets/{ticket_id}/messages/{message_id}": message,
+        f"supportTickets/{ticket_id}/last_activity": message["timestamp"],
+        **summary_update_writes(ticket_id, summary, stored, {
+            "last_message": message_preview(message["text"]),
+            "last_activity": message["timestamp"]
+        }, new_messages=1)
+    })
     
-    return jsonify({"msg": "Message added", "message": message}), 200
+    return jsonify({"msg": "Message added", "message": dict(message, id=message_id)}), 200
 
 
 @support_bp.route("/api/v1/support/tickets/<ticket_id>/messages", methods=["GET"])
 def get_messages(ticket_id):
-    """Fetch messages for a specific ticket"""
-    from app import realtime_db
-    
+    """Fetch messages for a specific ticket, only those after message `since` when given"""
     try:
-        messages_data = realtime_db.child("supportTickets").child(ticket_id).child("messages").get() or {}
+        # ?limit=&before= pages back from the newest message by key, push keys
+        # are in creation order so nothing is sorted. ?compact=1 sends rows of
+        # values under one list of field names
+        compact = request.args.get("compact", "").lower() in ("1", "true")
+        if "limit" in request.args or "before" in request.args or compact:
+            limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+            messages, next_cursor = message_page(ticket_id, limit, request.args.get("before"))
+            if compact:
+                return jsonify({"fields": MESSAGE_FIELDS, "rows": compact_messages(messages), "next_cursor": next_cursor}), 200
+            messages = [dict(message, id=key) for key, message in messages if isinstance(message, dict)]
+            return jsonify({"messages": messages, "next_cursor": next_cursor}), 200
+
+        messages_data = messages_since(ticket_id, request.args.get("since"))
         
         # Convert Firebase data to list
         messages_list = []
@@ -71,43 +122,120 @@ def get_messages(ticket_id):
         return jsonify({"error": str(e)}), 500
 
 
+@support_bp.route("/api/v1/support/tickets/<ticket_id>/messages/stream", methods=["GET"])
+def stream_messages(ticket_id):
+    """Server-Sent Events stream of a ticket's messages.
+
+    Sends the messages after the Last-Event-ID header an EventSource sends
+    when it reconnects (or `since` on the first connect), then each new
+    message as it is written. Every event id is the message key.
+    """
+    from app import realtime_db
+
+    try:
+        if not realtime_db.child("supportTickets").child(ticket_id).get(shallow=True):
+            return jsonify({"error": "Ticket not found"}), 404
+    except Exception as e:
+        print(f"Error opening message stream: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+
+    def events():
+        # Subscribe before reading the backlog so nothing written in between is lost
+        subscriber = support_message_hub.subscribe(ticket_id)
+        try:
+            yield "retry: 3000\n\n"
+            sent = set()
+            for key, message in support_message_hub.backlog(ticket_id, since):
+                if isinstance(message, dict):
+                    sent.add(key)
+                    yield sse_event(dict(message, id=key), event_id=key)
+
+            while True:
+                try:
+                    key, message = subscriber.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if key in sent or (since and key <= since):
+                    continue
+                sent.add(key)
+                yield sse_event(dict(message, id=key), event_id=key)
+        finally:
+            support_message_hub.unsubscribe(ticket_id, subscriber)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+@support_bp.route("/api/v1/support/streams/status", methods=["GET"])
+def support_stream_status():
+    return jsonify(support_message_hub.status()), 200
+
+
 @support_bp.route("/api/v1/support/tickets", methods=["GET"])
 def get_tickets():
     """Get all tickets (for admin dashboard)"""
-    from app import realtime_db
-    
     try:
         status_filter = request.args.get("status")  # "open" or "closed"
-        all_tickets = realtime_db.child("supportTickets").get() or {}
-        filtered = []
-
-        for ticket_id, ticket in all_tickets.items():
-            if isinstance(ticket, dict):
-                if not status_filter or ticket.get("status") == status_filter:
-                    ticket["ticket_id"] = ticket_id
-                    
-                    # Get message count
-                    messages = ticket.get("messages", {})
-                    ticket["message_count"] = len(messages) if isinstance(messages, dict) else 0
-                    
-                    # Get last message preview
-                    if messages:
-                        last_msg = max(messages.values(), key=lambda x: x.get('timestamp', '')) if isinstance(messages, dict) else None
-                        ticket["last_message"] = last_msg.get('text', '')[:50] + '...' if last_msg else ''
-                    else:
-                        ticket["last_message"] = "No messages yet"
-                    
-                    filtered.append(ticket)
-
-        # Sort by last activity (newest first)
-        filtered.sort(key=lambda x: x.get('last_activity', ''), reverse=True)
-        
-        return jsonify(filtered), 200
+
+        # Read from the summaries only, messages are never downloaded here.
+        # ?limit=&cursor= pages by last activity (newest first)
+        if "limit" in request.args or "cursor" in request.args:
+            limit = max(1, min(request.args.get("limit", 50, type=int), 200))
+            tickets, next_cursor = inbox(status_filter, limit, request.args.get("cursor"))
+            return jsonify({"tickets": tickets, "next_cursor": next_cursor}), 200
+
+        tickets, _ = inbox(status_filter)
+        return jsonify(tickets), 200
     except Exception as e:
         print(f"Error fetching tickets: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
+# Backfill supportTicketSummaries from supportTickets, also repairs drifted summaries
+@support_bp.route("/api/v1/support/tickets/summaries/rebuild", methods=["GET"])
+def rebuild_support_ticket_summaries():
+    try:
+        result = rebuild_ticket_summaries(chunk_size=request.args.get("chunk_size"))
+        status_code = 500 if result["writes"]["failed_chunks"] else 200
+        return jsonify(result), status_code
+    except Exception as e:
+        print(f"Error rebuilding ticket summaries: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+# Backfill userTickets from supportTickets, also drops entries of deleted tickets
+@support_bp.route("/api/v1/support/tickets/user-index/rebuild", methods=["GET"])
+def rebuild_support_user_index():
+    try:
+        result = rebuild_user_ticket_index(chunk_size=request.args.get("chunk_size"))
+        status_code = 500 if result["writes"]["failed_chunks"] else 200
+        return jsonify(result), status_code
+    except Exception as e:
+        print(f"Error rebuilding user ticket index: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+# Move tickets closed more than ?max_age_days= ago out of the database, at most ?limit= per run
+@support_bp.route("/api/v1/support/tickets/archive", methods=["GET"])
+def archive_closed_tickets():
+    try:
+        max_age_days = request.args.get("max_age_days", SUPPORT_ARCHIVE_AFTER_DAYS, type=int)
+        limit = max(1, min(request.args.get("limit", 1000, type=int), 10000))
+        result = support_archive.archive(max_age_days, limit=limit, chunk_size=request.args.get("chunk_size"))
+        status_code = 500 if result.get("writes", {}).get("failed_chunks") else 200
+        return jsonify(result), status_code
+    except ArchiveInProgressError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        print(f"Error archiving support tickets: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @support_bp.route("/api/v1/support/tickets/<ticket_id>/status", methods=["PUT"])
 def update_ticket_status(ticket_id):
     """Update ticket status (open/closed)"""
@@ -120,8 +248,16 @@ def update_ticket_status(ticket_id):
         if new_status not in ["open", "closed"]:
             return jsonify({"error": "Invalid status. Must be 'open' or 'closed'"}), 400
         
-        realtime_db.child("supportTickets").child(ticket_id).child("status").set(new_status)
-        realtime_db.child("supportTickets").child(ticket_id).child("last_activity").set(datetime.utcnow().isoformat())
+        summary, stored = current_summary(ticket_id)
+        if summary is None:
+            return jsonify({"error": "Ticket not found"}), 404
+
+        now = datetime.utcnow().isoformat()
+        realtime_db.update({
+            f"supportTickets/{ticket_id}/status": new_status,
+            f"supportTickets/{ticket_id}/last_activity": now,
+            **summary_update_writes(ticket_id, summary, stored, {"status": new_status, "last_activity": now})
+        })
         
         return jsonify({"msg": f"Ticket status updated to {new_status}"}), 200
     except Exception as e:
@@ -130,11 +266,15 @@ def update_ticket_status(ticket_id):
 
 @support_bp.route("/api/v1/support/tickets/<ticket_id>", methods=["GET"])
 def get_ticket_details(ticket_id):
-    """Get details of a specific ticket"""
+    """Get details of a specific ticket, from the archive once it was moved there"""
     from app import realtime_db
     
     try:
         ticket_data = realtime_db.child("supportTickets").child(ticket_id).get()
+        if not ticket_data:
+            ticket_data = support_archive.get(ticket_id)
+            if ticket_data:
+                ticket_data["archived"] = True
         
         if not ticket_data:
             return jsonify({"error": "Ticket not found"}), 404
@@ -159,19 +299,9 @@ def debug_support():
 
 @support_bp.route("/api/v1/support/user/<user_id>/tickets", methods=["GET"])
 def get_user_tickets(user_id):
-    from app import realtime_db
-
+    """The user's ticket summaries, found through the userTickets index"""
     try:
-        all_tickets = realtime_db.child("supportTickets").get() or {}
-        user_tickets = []
-
-        for ticket_id, ticket in all_tickets.items():
-            if isinstance(ticket, dict) and ticket.get("created_by") == user_id:
-                ticket["ticket_id"] = ticket_id
-                user_tickets.append(ticket)
-
-        user_tickets.sort(key=lambda x: x.get('last_activity', ''), reverse=True)
-        return jsonify(user_tickets), 200
+        return jsonify(user_tickets(user_id)), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -187,12 +317,21 @@ def delete_ticket(ticket_id):
         ticket_data = realtime_db.child("supportTickets").child(ticket_id).get()
 
         if not ticket_data:
+            # Archived tickets are dropped from the archive index
+            if support_archive.forget(ticket_id):
+                return jsonify({"msg": f"Ticket {ticket_id} deleted successfully"}), 200
             return jsonify({"error": "Ticket not found"}), 404
 
         print(f"Deleting ticket: {ticket_id}")
 
-        # ✅ Clear the ticket data using `.set({})` for Pyrebase compatibility
-        realtime_db.child("supportTickets").child(ticket_id).set({})
+        # Ticket, its inbox summary and the owner's index entry in one write
+        writes = {
+            f"supportTickets/{ticket_id}": None,
+            f"{SUPPORT_TICKET_SUMMARIES}/{ticket_id}": None
+        }
+        if ticket_data.get("created_by"):
+            writes[f"{USER_TICKETS}/{ticket_data['created_by']}/{ticket_id}"] = None
+        realtime_db.update(writes)
 
         return jsonify({"msg": f"Ticket {ticket_id} deleted successfully"}), 200
     except Exception as e:
@@ -7,19 +7,49 @@ from app import app, realtime_db, bucket
 from app.utils.user import *
 from app.utils.total import *
 from app.utils.attractiveness import *
+from app.utils.snapshot import user_snapshot
+from app.utils.rollups import demographic_rollups, format_top_data
+from app.utils.columnar import get_user_table
+from app.utils.search import get_user_search_index, order_matches, user_search_index
+from app.utils.batch import BatchWriter, summarize_report
+from app.utils.streaming import batched_lines, json_object_chunks, ndjson_lines, streamed_response
 
 @app.route("/api/v1/get_all_users", methods=["GET"])
 def get_all_users():
   try:
-    users_ref = realtime_db.child('users')
-    users_data = users_ref.get()
+    users_data = user_snapshot.get_users()
 
     if not users_data:
       return jsonify({"msg": "No users found"}), 404
   
     total_count = len(users_data)
-     
-    return jsonify({"msg": "Users fetched successfully", "count": total_count, "users": users_data}), 200
+    fields = parse_fields(request.args.get("fields"))
+    stream = request.args.get("stream", "").lower()
+
+    def projected_users():
+      for user_id, user_data in users_data.items():
+        if not isinstance(user_data, dict):
+          yield user_id, user_data
+        elif fields:
+          yield user_id, {field: user_data[field] for field in fields if field in user_data}
+        else:
+          yield user_id, user_data
+
+    # stream=ndjson writes one {"id": ..., ...} line per user
+    if stream == "ndjson":
+      records = (
+        {"id": user_id, **user_data} for user_id, user_data in projected_users()
+        if isinstance(user_data, dict)
+      )
+      return streamed_response(batched_lines(ndjson_lines(records)), "application/x-ndjson")
+
+    # stream=json keeps the regular response shape but writes it user by user
+    if stream == "json":
+      header = {"msg": "Users fetched successfully", "count": total_count}
+      chunks = json_object_chunks(header, "users", projected_users())
+      return streamed_response(batched_lines(chunks), "application/json")
+
+    return jsonify({"msg": "Users fetched successfully", "count": total_count, "users": dict(projected_users())}), 200
 
   except Exception as e:
     print(f"Error encountered while fetching users: {e}")
@@ -28,35 +58,65 @@ def get_all_users():
 @app.route("/api/v1/get_paginated_users", methods=["GET"])
 def get_paginated_users():
     try:
-        users_ref = realtime_db.child('users')
-        users_data = users_ref.get()
-
-        if not users_data:
-            return jsonify({"msg": "No users found"}), 404
-        
-        users_list = [{"id": user_id, **user_data} for user_id, user_data in users_data.items() if isinstance(user_data, dict)]
-
         search_query = request.args.get("search", "").strip().lower()
+        fields = parse_fields(request.args.get("fields"))
 
         page = int(request.args.get("page", 1))
         limit = int(request.args.get("limit", 10))
 
-        if search_query:
-          users_list = [
-            user for user in users_list
-            if search_query in str(user.get("name", "")).lower()
-            or search_query in str(user.get("email", "")).lower()
-            or search_query in str(user.get("age", ""))
-            or search_query in str(user.get("attractiveness", ""))
-            or search_query in str(user.get("gender", "")).lower()
+        # Cursor mode: let the database page by key, only `limit` profiles are read
+        if "cursor" in request.args and not search_query:
+          cursor = request.args.get("cursor")
+          query = realtime_db.child('users').order_by_key()
+          if cursor:
+            query = query.start_at(cursor)
+          users_page = query.limit_to_first(limit + 1).get() or {}
+
+          user_ids = list(users_page.keys())
+          next_cursor = user_ids[limit] if len(user_ids) > limit else None
+          paginated_users = [
+            project_user(user_id, users_page[user_id], fields)
+            for user_id in user_ids[:limit] if isinstance(users_page[user_id], dict)
           ]
 
-        total_count = len(users_list)
+          # No total here, counting would mean reading every profile
+          return jsonify({
+            "msg": "Users fetched successfully",
+            "users": paginated_users,
+            "next_cursor": next_cursor
+          }), 200
+
+        users_data = user_snapshot.get_users()
+
+        if not users_data:
+            return jsonify({"msg": "No users found"}), 404
+
+        user_ids = user_snapshot.sorted_user_ids(users_data)
+
+        if search_query:
+          search_index = get_user_search_index()
+          if search_index is not None:
+            user_ids = order_matches(search_index.search(search_query), user_ids)
+          else:
+            user_ids = [
+              user_id for user_id in user_ids
+              if isinstance(users_data.get(user_id), dict) and matches_search(users_data[user_id], search_query)
+            ]
+
+        total_count = len(user_ids)
         start_index = (page - 1) * limit
         end_index = start_index + limit
-        paginated_users = users_list[start_index:end_index]
 
-        return jsonify({"msg": "Users fetched successfully", "count": total_count, "users": paginated_users}), 200
+        paginated_users = []
+        for user_id in user_ids[start_index:end_index]:
+          user_data = users_data.get(user_id)
+          if isinstance(user_data, dict):
+            paginated_users.append(project_user(user_id, user_data, fields))
+
+        # Search results are only paged by offset, cursors walk the unfiltered key order
+        next_cursor = user_ids[end_index] if end_index < total_count and not search_query else None
+
+        return jsonify({"msg": "Users fetched successfully", "count": total_count, "users": paginated_users, "next_cursor": next_cursor}), 200
     except Exception as e:
         print(f"Error encountered while fetching users: {e}")
         return jsonify({"msg": "Error fetching users","error": str(e)}), 500
@@ -64,95 +124,50 @@ def get_paginated_users():
 @app.route("/api/v1/get_user_demographics", methods=["GET"])
 def get_user_demographics():
   try:
-    users_ref = realtime_db.child('users')
-    users_data = users_ref.get()
+    users_data = user_snapshot.get_users()
 
     if not users_data:
       return jsonify({"msg": "No data available"}), 404
 
-    periods = ['day', 'week', 'month', '6months', 'year']
-    demographic_data = {period: {
-      "heights": { "Man": Counter(), "Woman": Counter() },
-      "skin_colors": { "Man": Counter(), "Woman": Counter() },
-      "job_prominences": { "Man": Counter(), "Woman": Counter() },
-      "yearly_incomes": { "Man": Counter(), "Woman": Counter() },
-      "hobbies": { "Man": Counter(), "Woman": Counter() },
-      "colleges": Counter(),
-      "cities": Counter()
-    } for period in periods}
-
-    for user_data in users_data.values():
-      gender = user_data.get('gender')
-      likes_received = user_data.get('likesReceived')
-
-      height = user_data.get('height')
-      skin_color = user_data.get('skinColor')
-      job_prominence = user_data.get('jobProminence')
-      yearly_income = user_data.get('yearlyIncome')
-      hobbies = user_data.get('hobbies', [])
-      college = user_data.get('collegeOrSchool')
-
-      for period in periods:
-         if likes_received:
-            filtered_likes_count = filter_likes_by_period(likes_received, period)
-
-            if gender and height:
-              demographic_data[period]["heights"][gender][height] += filtered_likes_count
-
-            if gender and skin_color:
-              demographic_data[period]["skin_colors"][gender][skin_color] += filtered_likes_count 
-
-            if gender and job_prominence:
-              demographic_data[period]["job_prominences"][gender][job_prominence] += filtered_likes_count
-
-            if gender and yearly_income:
-              demographic_data[period]["yearly_incomes"][gender][yearly_income] += filtered_likes_count
-
-            if hobbies:
-              for hobby in hobbies:
-                demographic_data[period]["hobbies"][gender][hobby] += filtered_likes_count
-
-            if college:
-              demographic_data[period]["colleges"][college] += filtered_likes_count
-
-            if 'livesIn' in user_data and isinstance(user_data['livesIn'], dict):
-              lives_in = user_data['livesIn']
-              if 'latitude' in lives_in and 'longitude' in lives_in:
-                closest_city = get_closest_city(lives_in['latitude'], lives_in['longitude'])
-                demographic_data[period]["cities"][closest_city] += filtered_likes_count
-
-    top_data = {}
-    for period in periods:
-      top_data[period] = {
-        "top_heights": {
-          gender: [height for height, _ in height_count.most_common(4)]
-          for gender, height_count in demographic_data[period]["heights"].items()
-        },
-        "top_skin_colors": {
-          gender: [skin_color for skin_color, _ in skin_color_count.most_common(4)]
-          for gender, skin_color_count in demographic_data[period]["skin_colors"].items()
-        },
-        "top_job_prominences": {
-          gender: [job_prominence for job_prominence, _ in job_prominence_count.most_common(4)]
-          for gender, job_prominence_count in demographic_data[period]["job_prominences"].items()
-        },
-        "top_yearly_incomes": {
-          gender: [yearly_income for yearly_income, _ in yearly_income_count.most_common(4)]
-          for gender, yearly_income_count in demographic_data[period]["yearly_incomes"].items()
-        },
-        "top_hobbies": {
-          gender: [hobby for hobby, _ in hobby_count.most_common(4)]
-          for gender, hobby_count in demographic_data[period]["hobbies"].items()
-        },
-        "top_colleges": [college for college, _ in demographic_data[period]["colleges"].most_common(4)],
-        "top_cities": [city for city, _ in demographic_data[period]["cities"].most_common(4)]
-      }
+    # exact=true counts likes over sliding windows instead of whole-day rollup buckets
+    if request.args.get("exact", "").lower() == "true":
+      top_data = format_top_data(get_user_table().period_totals())
+    else:
+      demographic_rollups.ensure_built()
+      top_data = demographic_rollups.top_data()
 
     return jsonify(top_data), 200
   except Exception as e:
     print(f"Error getting user demographics: {e}")
     return jsonify({"msg": "error getting user demographics"}), 500
 
+@app.route("/api/v1/rebuild_demographic_rollups", methods=["GET"])
+def rebuild_demographic_rollups():
+  try:
+    day_count = demographic_rollups.rebuild_from(realtime_db.child('users').get)
+    return jsonify({"msg": "Demographic rollups rebuilt successfully", "days": day_count}), 200
+  except Exception as e:
+    print(f"Error encountered while rebuilding demographic rollups: {e}")
+    return jsonify({"msg": "Error rebuilding demographic rollups", "error": str(e)}), 500
+
+@app.route("/api/v1/check_demographic_rollups", methods=["GET"])
+def check_demographic_rollups():
+  try:
+    users_data = realtime_db.child('users').get()
+
+    if not users_data:
+      return jsonify({"msg": "No data available"}), 404
+
+    report = demographic_rollups.check(users_data)
+    return jsonify({"msg": "Demographic rollups checked", **report}), 200
+  except Exception as e:
+    print(f"Error encountered while checking demographic rollups: {e}")
+    return jsonify({"msg": "Error checking demographic rollups", "error": str(e)}), 500
+
+@app.route("/api/v1/user_snapshot_status", methods=["GET"])
+def get_user_snapshot_status():
+  return jsonify({"msg": "Success", "snapshot": user_snapshot.status()}), 200
+
 @app.route("/api/v1/update_user/<user_id>", methods=["PUT"])
 def udpate_user(user_id):
   try:
@@ -168,6 +183,11 @@ def udpate_user(user_id):
       return jsonify({"msg": f"User {user_id} not found"}), 404
 
     users_ref.child(user_id).update(updated_user_data)
+
+    # Don't wait for the mirror to echo the change before search can see it
+    if user_search_index.built:
+      user_search_index.update(user_id, {**user_data, **updated_user_data})
+
     return jsonify({"msg": "User updated successfully", "user": updated_user_data}), 200
   except Exception as e:
     print(f"Error encountered while updating user: {e}")
@@ -183,6 +203,7 @@ def delete_user(user_id):
       return jsonify({'msg': "User not found"}), 404
     
     users_ref.child(user_id).delete()
+    user_search_index.remove(user_id)
     return jsonify({"msg": "User deleted successfully"}), 200
   except Exception as e:
     print(f"Error encountered while deleting user: {e}")
@@ -199,6 +220,8 @@ def upload_images_to_storage():
 
       if not users_data:
         return jsonify({"msg": "No data available"}), 404
+
+      writer = BatchWriter(chunk_size=request.args.get("chunk_size"))
       
       for index, (user_id, user_data) in enumerate(users_data.items(), start=1):
           if not isinstance(user_data, dict):
@@ -212,22 +235,25 @@ def upload_images_to_storage():
           storage_blob = bucket.blob(f"profile_images/{user_id}.jpg")
           if storage_blob.exists():
               image_url = storage_blob.public_url
-              users_ref.child(user_id).update({
+              writer.update(f"users/{user_id}", {
                 'profileImageURL': image_url
               })
-              print(f"Profile image already exists for user {user_id}. URL updated.")
+              print(f"Profile image already exists for user {user_id}. URL queued.")
           else:
             if os.path.exists(image_file_path):
                 image_url = upload_image_to_firebase(image_file_path, user_id)
                 print(f"Uploaded image for user {user_id} successfully")
-                users_ref.child(user_id).update({
+                writer.update(f"users/{user_id}", {
                     'profileImageURL': image_url
                 })
-                print(f"Updated profileImageURL for user {user_id}")
             else:
                 print(f"Image file {image_file_path} not found for user {user_id}")
 
-      return jsonify({"msg": "Images uploaded successfully"}), 200
+      summary = summarize_report(writer.flush())
+      if summary["failed_chunks"]:
+        return jsonify({"msg": "Error updating profile image URLs", **summary}), 500
+
+      return jsonify({"msg": "Images uploaded successfully", **summary}), 200
   except Exception as e:
         print(f"Error encountered: {e}")
         return jsonify({"msg": "Error uploading image", "error": str(e)}), 500
@@ -240,16 +266,21 @@ def add_status_field():
 
         if not users_data:
             return jsonify({"msg": "No data available"}), 404
+
+        writer = BatchWriter(chunk_size=request.args.get("chunk_size"))
         
         for user_id, user_data in users_data.items():
             if not isinstance(user_data, dict):
                 print(f"Skipping invalid user data for user ID: {user_id}")
                 continue
 
-            users_ref.child(str(user_id)).update({'status': 1})
-            print(f"Status added for user {user_id}.")
+            writer.update(f"users/{user_id}", {'status': 1})
+
+        summary = summarize_report(writer.flush())
+        if summary["failed_chunks"]:
+            return jsonify({"msg": "Error adding status field", **summary}), 500
 
-        return jsonify({"msg": "Status added successfully"}), 200
+        return jsonify({"msg": "Status added successfully", **summary}), 200
     
     except Exception as e:
         print(f"Error encountered: {e}")
@@ -291,6 +322,8 @@ def calc_attractiveness():
 
     if not users_data:
        return jsonify({"msg": "No data available"}), 404
+
+    writer = BatchWriter(chunk_size=request.args.get("chunk_size"))
     
     for (user_id, user_data) in users_data.items():
       if not isinstance(user_data, dict):
@@ -299,12 +332,15 @@ def calc_attractiveness():
 
       profileImageURL = user_data['profileImageURL']    
       attractiveness = process_image(profileImageURL)
-      users_ref.child(user_id).update({
+      writer.update(f"users/{user_id}", {
          'attractiveness': attractiveness
       })
-      print(f"Updated attractiveness for user {user_id}")
 
-    return jsonify({"msg": "Attractiveness calculated successfully"}), 200
+    summary = summarize_report(writer.flush())
+    if summary["failed_chunks"]:
+      return jsonify({"msg": "Error saving attractiveness", **summary}), 500
+
+    return jsonify({"msg": "Attractiveness calculated successfully", **summary}), 200
   except Exception as e:
     print(f"Error encountered: {e}")
     return jsonify({"msg": "Error calculating attrativeness", "error": str(e)}), 500
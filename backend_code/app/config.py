@@ -10,3 +10,28 @@ import os
 
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "your_default_stripe_secret_here")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
+
+# Paths per multi-location update() issued by app.utils.batch.BatchWriter
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 500))
+
+# Seconds a seat stays held between bookings/initiate and payment
+SEAT_HOLD_TTL = int(os.getenv("SEAT_HOLD_TTL", 900))
+
+# SQLite file and worker threads behind the Stripe webhook queue
+WEBHOOK_QUEUE_PATH = os.getenv("WEBHOOK_QUEUE_PATH", "webhook_queue.sqlite3")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+
+# Attendees accepted by one bookings/group request
+GROUP_BOOKING_MAX_SIZE = int(os.getenv("GROUP_BOOKING_MAX_SIZE", 20))
+
+# SQLite buffer of door check-ins and seconds between its flushes to the database
+CHECKIN_BUFFER_PATH = os.getenv("CHECKIN_BUFFER_PATH", "checkin_buffer.sqlite3")
+CHECKIN_FLUSH_INTERVAL = float(os.getenv("CHECKIN_FLUSH_INTERVAL", 2))
+
+# Seconds the analytics user table is served between rebuilds while the users mirror is down
+USER_TABLE_MAX_AGE = int(os.getenv("USER_TABLE_MAX_AGE", 60))
+
+# Closed support tickets older than this many days move to the archive, kept
+# under "local:<directory>" on disk or "bucket:<prefix>" in the storage bucket
+SUPPORT_ARCHIVE_AFTER_DAYS = int(os.getenv("SUPPORT_ARCHIVE_AFTER_DAYS", 90))
+SUPPORT_ARCHIVE_STORE = os.getenv("SUPPORT_ARCHIVE_STORE", "local:support_archive")
@@ -0,0 +1,83 @@
+import time
+
+from app import realtime_db
+from app.config import WRITE_BATCH_SIZE
+
+def increment(amount):
+    """Server-side increment, safe to combine with other paths in one update()."""
+    return {".sv": {"increment": amount}}
+
+def is_server_value(value):
+    return isinstance(value, dict) and ".sv" in value
+
+class BatchWriter:
+    """Collects per-path writes and sends them as chunked multi-location updates.
+
+    Every queued path becomes one key of a root `update()`, so N profile
+    changes cost N / chunk_size round trips instead of N. Paths within one
+    batch must not be ancestors of each other, the database rejects those.
+    A failed chunk is retried only when it holds plain values: an increment
+    may already have been applied by the time the error comes back.
+    """
+
+    def __init__(self, root_ref=None, chunk_size=None, max_retries=3, retry_delay=0.5):
+        self.root_ref = root_ref if root_ref is not None else realtime_db
+        self.chunk_size = max(1, int(chunk_size or WRITE_BATCH_SIZE))
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._changes = {}
+
+    def __len__(self):
+        return len(self._changes)
+
+    def set(self, path, value):
+        self._changes[path.strip("/")] = value
+
+    def update(self, path, values):
+        for key, value in values.items():
+            self.set(f"{path.strip('/')}/{key}", value)
+
+    def delete(self, path):
+        self.set(path, None)
+
+    def _write_chunk(self, chunk):
+        retries = 0 if any(is_server_value(value) for value in chunk.values()) else self.max_retries
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                self.root_ref.update(chunk)
+                return attempts, None
+            except Exception as e:
+                if attempts > retries:
+                    return attempts, str(e)
+                print(f"Batch write of {len(chunk)} paths failed ({e}), retrying")
+                time.sleep(self.retry_delay * 2 ** (attempts - 1))
+
+    def flush(self):
+        """Write every queued change and return one report entry per chunk."""
+        paths = list(self._changes.items())
+        self._changes = {}
+
+        report = []
+        for index, start in enumerate(range(0, len(paths), self.chunk_size)):
+            chunk = dict(paths[start:start + self.chunk_size])
+            attempts, error = self._write_chunk(chunk)
+            report.append({
+                "chunk": index,
+                "paths": len(chunk),
+                "attempts": attempts,
+                "ok": error is None,
+                "error": error,
+                "failed_paths": list(chunk) if error else []
+            })
+
+        return report
+
+def summarize_report(report):
+    return {
+        "chunks": len(report),
+        "paths": sum(entry["paths"] for entry in report),
+        "failed_chunks": sum(1 for entry in report if not entry["ok"]),
+        "report": report
+    }
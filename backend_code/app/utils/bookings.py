@@ -0,0 +1,117 @@
+from app import realtime_db
+from app.utils.batch import BatchWriter, summarize_report
+
+# bookings_by_event/<eventId>/<bookingId> holds a copy of each booking, so an
+# event's attendee list is read from its own slice instead of every booking
+BOOKINGS_BY_EVENT = "bookings_by_event"
+
+# bookingGroups/<groupId> ties together the bookings paid with one checkout
+# session, each of those bookings carries the groupId
+BOOKING_GROUPS = "bookingGroups"
+
+def booking_index_path(event_id, booking_id):
+    return f"{BOOKINGS_BY_EVENT}/{event_id}/{booking_id}"
+
+def booking_writes(booking_id, booking_doc):
+    """Multi-location update creating a booking together with its index entry."""
+    return {
+        f"bookings/{booking_id}": booking_doc,
+        booking_index_path(booking_doc.get("eventId"), booking_id): booking_doc
+    }
+
+def booking_update_writes(booking_id, event_id, values, booking=None):
+    """Multi-location update applying `values` to a booking and its index entry.
+
+    Pass the current `booking` when it is at hand, the index entry is then
+    written whole, so bookings made before the index existed end up complete.
+    """
+    writes = {f"bookings/{booking_id}/{key}": value for key, value in values.items()}
+    if not event_id:
+        return writes
+
+    if booking is not None:
+        writes[booking_index_path(event_id, booking_id)] = {**booking, **values}
+    else:
+        for key, value in values.items():
+            writes[f"{booking_index_path(event_id, booking_id)}/{key}"] = value
+    return writes
+
+def booking_delete_writes(booking_id, event_id):
+    writes = {f"bookings/{booking_id}": None}
+    if event_id:
+        writes[booking_index_path(event_id, booking_id)] = None
+    return writes
+
+def iter_bookings(page_size=1000):
+    """(booking_id, booking) pairs in key order, read one page at a time."""
+    return iter_children(realtime_db.child("bookings"), page_size)
+
+def iter_children(ref, page_size=1000):
+    """(key, value) pairs below `ref` in key order, read one page at a time."""
+    start = None
+    while True:
+        query = ref.order_by_key()
+        if start is not None:
+            query = query.start_at(start)
+        page = query.limit_to_first(page_size + 1).get() or {}
+
+        page_items = list(page.items())
+        if start is not None and page_items and page_items[0][0] == start:
+            page_items = page_items[1:]
+        yield from page_items
+
+        if len(page) <= page_size:
+            return
+        start = page_items[-1][0]
+
+def _index_diff(page_size):
+    """Entries to write and entries to delete so the index matches `bookings`."""
+    expected = {}
+    for booking_id, booking in iter_bookings(page_size):
+        if isinstance(booking, dict) and booking.get("eventId"):
+            expected[(booking["eventId"], booking_id)] = booking
+
+    actual = {}
+    for event_id, entries in (realtime_db.child(BOOKINGS_BY_EVENT).get() or {}).items():
+        for booking_id, entry in (entries or {}).items():
+            actual[(event_id, booking_id)] = entry
+
+    missing = [key for key in expected if key not in actual]
+    stale = [key for key in actual if key not in expected]
+    changed = [key for key in expected if key in actual and actual[key] != expected[key]]
+    return expected, missing, stale, changed
+
+def check_booking_index(page_size=1000, max_mismatches=100):
+    """Compare `bookings_by_event` against the `bookings` tree."""
+    expected, missing, stale, changed = _index_diff(page_size)
+
+    def describe(keys):
+        return [{"event_id": event_id, "booking_id": booking_id} for event_id, booking_id in keys[:max_mismatches]]
+
+    return {
+        "consistent": not (missing or stale or changed),
+        "bookings": len(expected),
+        "missing_count": len(missing),
+        "stale_count": len(stale),
+        "changed_count": len(changed),
+        "missing": describe(missing),
+        "stale": describe(stale),
+        "changed": describe(changed)
+    }
+
+def rebuild_booking_index(page_size=1000, chunk_size=None):
+    """Write every missing or outdated index entry and drop the stale ones."""
+    expected, missing, stale, changed = _index_diff(page_size)
+
+    writer = BatchWriter(chunk_size=chunk_size)
+    for event_id, booking_id in missing + changed:
+        writer.set(booking_index_path(event_id, booking_id), expected[(event_id, booking_id)])
+    for event_id, booking_id in stale:
+        writer.delete(booking_index_path(event_id, booking_id))
+
+    return {
+        "bookings": len(expected),
+        "written": len(missing) + len(changed),
+        "deleted": len(stale),
+        "writes": summarize_report(writer.flush())
+    }
@@ -0,0 +1,283 @@
+import base64
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+
+from datetime import datetime, timezone
+from app import realtime_db
+from app.config import CHECKIN_BUFFER_PATH, CHECKIN_FLUSH_INTERVAL
+from app.utils.batch import BatchWriter, summarize_report
+from app.utils.seats import EventNotFoundError
+
+# checkins/<eventId>/<ticketId> = {"gate": ..., "checkedInAt": ...}
+CHECKINS = "checkins"
+
+class BloomFilter:
+    """Fixed-size Bloom filter over ticket IDs, for scanners that validate offline.
+
+    Bit i lives in byte i // 8 at position i % 8. A ticket ID sets bits
+    (h1 + j * h2) % size for j in range(hashes), where h1 and h2 are the
+    first and second 8 bytes of its UTF-8 SHA-256 digest read as
+    little-endian integers.
+    """
+
+    def __init__(self, size, hashes, bits=None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray(bits) if bits is not None else bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=0.001):
+        capacity = max(1, capacity)
+        size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        hashes = max(1, int(round(size / capacity * math.log(2))))
+        return cls(size, hashes)
+
+    def _positions(self, item):
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little")
+        return [(h1 + j * h2) % self.size for j in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, item):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(item))
+
+    def to_dict(self):
+        return {
+            "size": self.size,
+            "hashes": self.hashes,
+            "hash": "sha256",
+            "bits": base64.b64encode(bytes(self.bits)).decode("ascii")
+        }
+
+class CheckInDesk:
+    """Door check-in against in-memory ticket sets, written to RTDB in batches.
+
+    `load_event()` reads an event's ticket IDs and recorded check-ins (keys
+    only) once. After that `scan()` is a set lookup plus one insert into a
+    local SQLite buffer (WAL). The buffer's primary key on (event, ticket)
+    turns away a second scan of a ticket from any gate worker sharing the
+    file, other processes included. A background thread writes pending rows
+    to `checkins/<eventId>/<ticketId>` through BatchWriter and marks them
+    flushed, rows a stopped process left behind go out on the next start.
+    Gates on other machines see these check-ins once they load the event
+    again.
+    """
+
+    def __init__(self, db_path, flush_interval=2, batch_size=None):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        # Held for a whole flush, so forget_event() can wait one out
+        self._flush_lock = threading.Lock()
+        self._conn = None
+        self._tickets = {}
+        self._checked_in = {}
+        self._dirty = threading.Event()
+        self._thread = None
+        self._last_flush = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Survives the process dying, only an OS crash can lose the last scans
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkins (
+                    event_id TEXT NOT NULL,
+                    ticket_id TEXT NOT NULL,
+                    gate TEXT,
+                    scanned_at REAL NOT NULL,
+                    flushed INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (event_id, ticket_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS checkins_flushed ON checkins (flushed, scanned_at)")
+            self._conn = conn
+        return self._conn
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            pending = self._connect().execute("SELECT 1 FROM checkins WHERE flushed = 0 LIMIT 1").fetchone()
+            self._thread = threading.Thread(target=self._run, name="checkin-flusher", daemon=True)
+            self._thread.start()
+
+        if pending:
+            self._dirty.set()
+
+    def load_event(self, event_id):
+        """Read the event's ticket IDs and check-ins into memory, returns their counts."""
+        event_ref = realtime_db.child("events").child(event_id)
+        if not event_ref.get(shallow=True):
+            raise EventNotFoundError()
+
+        tickets = event_ref.child("tickets").get(shallow=True) or {}
+        recorded = realtime_db.child(CHECKINS).child(event_id).get(shallow=True) or {}
+
+        with self._lock:
+            local = [row[0] for row in self._connect().execute(
+                "SELECT ticket_id FROM checkins WHERE event_id = ?", (event_id,)
+            )]
+            self._tickets[event_id] = set(tickets)
+            self._checked_in[event_id] = set(recorded) | set(local)
+            return {"tickets": len(self._tickets[event_id]), "checked_in": len(self._checked_in[event_id])}
+
+    def forget_event(self, event_id):
+        """Drop a deleted event's tickets and buffered check-ins, returns how many rows were dropped.
+
+        Waits for a flush in progress, then removes whatever that flush
+        wrote under `checkins/<eventId>` after the event was deleted.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._tickets.pop(event_id, None)
+                self._checked_in.pop(event_id, None)
+                dropped = self._connect().execute("DELETE FROM checkins WHERE event_id = ?", (event_id,)).rowcount
+
+            if dropped:
+                realtime_db.child(CHECKINS).child(event_id).delete()
+        return dropped
+
+    def add_ticket(self, event_id, ticket_id):
+        """Make a ticket booked after `load_event()` scannable, no-op for events not loaded."""
+        with self._lock:
+            if event_id in self._tickets:
+                self._tickets[event_id].add(ticket_id)
+
+    def scan(self, event_id, ticket_id, gate=None):
+        """Check a ticket in, returns "admitted", "duplicate" or "invalid".
+
+        The first scan for an event loads it. Raises EventNotFoundError.
+        """
+        if event_id not in self._tickets:
+            self.load_event(event_id)
+
+        with self._lock:
+            if ticket_id not in self._tickets.get(event_id, ()):
+                return "invalid"
+
+            checked_in = self._checked_in[event_id]
+            if ticket_id in checked_in:
+                return "duplicate"
+
+            cursor = self._connect().execute(
+                "INSERT OR IGNORE INTO checkins (event_id, ticket_id, gate, scanned_at) VALUES (?, ?, ?, ?)",
+                (event_id, ticket_id, gate, time.time())
+            )
+            checked_in.add(ticket_id)
+            # Another process sharing the buffer scanned it first
+            if cursor.rowcount == 0:
+                return "duplicate"
+
+        self._dirty.set()
+        if self._thread is None:
+            self.start()
+        return "admitted"
+
+    def flush(self, limit=5000):
+        """Write pending check-ins to RTDB, `limit` rows per round of batched updates."""
+        with self._flush_lock:
+            return self._flush(limit)
+
+    def _flush(self, limit):
+        flushed = 0
+        failed = 0
+        reports = []
+        while True:
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT event_id, ticket_id, gate, scanned_at FROM checkins WHERE flushed = 0 ORDER BY scanned_at LIMIT ?",
+                    (limit,)
+                ).fetchall()
+            if not rows:
+                break
+
+            writer = BatchWriter(chunk_size=self.batch_size)
+            for event_id, ticket_id, gate, scanned_at in rows:
+                writer.set(f"{CHECKINS}/{event_id}/{ticket_id}", {
+                    "gate": gate,
+                    "checkedInAt": datetime.fromtimestamp(scanned_at, timezone.utc).isoformat()
+                })
+            report = writer.flush()
+            reports.extend(report)
+
+            failed_paths = {path for entry in report for path in entry["failed_paths"]}
+            done = [(event_id, ticket_id) for event_id, ticket_id, _, _ in rows
+                    if f"{CHECKINS}/{event_id}/{ticket_id}" not in failed_paths]
+            with self._lock:
+                conn = self._connect()
+                conn.execute("BEGIN")
+                conn.executemany("UPDATE checkins SET flushed = 1 WHERE event_id = ? AND ticket_id = ?", done)
+                conn.execute("COMMIT")
+            flushed += len(done)
+            failed += len(rows) - len(done)
+
+            # Leave failed rows for the next round instead of retrying them in a loop
+            if failed or len(rows) < limit:
+                break
+
+        self._last_flush = time.time()
+        return {"flushed": flushed, "failed": failed, "writes": summarize_report(reports)}
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            # Let scans pile up so one round of updates carries many of them
+            time.sleep(self.flush_interval)
+            self._dirty.clear()
+            try:
+                result = self.flush()
+                if result["failed"]:
+                    self._dirty.set()
+            except Exception as e:
+                print(f"Error flushing check-ins: {e}")
+                self._dirty.set()
+
+    def bloom_filter(self, event_id, error_rate=0.001):
+        """Bloom filter of the event's tickets that are not checked in yet."""
+        if event_id not in self._tickets:
+            self.load_event(event_id)
+
+        with self._lock:
+            admissible = self._tickets[event_id] - self._checked_in[event_id]
+        bloom = BloomFilter.for_capacity(len(admissible), error_rate)
+        for ticket_id in admissible:
+            bloom.add(ticket_id)
+        return {**bloom.to_dict(), "tickets": len(admissible), "error_rate": error_rate}
+
+    def status(self, event_id=None):
+        with self._lock:
+            conn = self._connect()
+            if event_id:
+                pending = conn.execute(
+                    "SELECT COUNT(*) FROM checkins WHERE flushed = 0 AND event_id = ?", (event_id,)
+                ).fetchone()[0]
+                return {
+                    "loaded": event_id in self._tickets,
+                    "tickets": len(self._tickets.get(event_id, ())),
+                    "checked_in": len(self._checked_in.get(event_id, ())),
+                    "pending_flush": pending,
+                    "last_flush": self._last_flush
+                }
+            pending = conn.execute("SELECT COUNT(*) FROM checkins WHERE flushed = 0").fetchone()[0]
+            return {
+                "events": sorted(self._tickets),
+                "pending_flush": pending,
+                "running": self._thread is not None and self._thread.is_alive(),
+                "last_flush": self._last_flush
+            }
+
+
+check_in_desk = CheckInDesk(CHECKIN_BUFFER_PATH, flush_interval=CHECKIN_FLUSH_INTERVAL)
@@ -0,0 +1,379 @@
+import threading
+import time
+import numpy as np
+
+from collections import Counter
+from datetime import datetime
+from app.config import USER_TABLE_MAX_AGE
+from app.utils.user import LIKE_PERIODS
+from app.utils.total import SIGNUP_EPOCH, get_city_index
+from app.utils.snapshot import user_snapshot
+
+# column name -> user field, dictionary-encoded into int32 codes
+CODED_FIELDS = {
+    "gender": "gender",
+    "college": "collegeOrSchool",
+    "height": "height",
+    "skin_color": "skinColor",
+    "job_prominence": "jobProminence",
+    "yearly_income": "yearlyIncome",
+}
+
+# demographics family -> coded column, broken down by gender
+GENDERED_FAMILIES = {
+    "heights": "height",
+    "skin_colors": "skin_color",
+    "job_prominences": "job_prominence",
+    "yearly_incomes": "yearly_income",
+}
+
+EMPTY_ROW = (np.zeros(0, dtype=np.int32), np.zeros(0))
+
+def to_epoch(moment):
+    return (moment - SIGNUP_EPOCH).total_seconds()
+
+def parse_epoch(timestamp):
+    try:
+        return to_epoch(datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S"))
+    except (TypeError, ValueError):
+        return np.nan
+
+def parse_like_epochs(likes_received):
+    epochs = []
+    for timestamp in likes_received:
+        try:
+            epochs.append(to_epoch(datetime.fromisoformat(timestamp)))
+        except (TypeError, ValueError):
+            continue
+    return np.sort(np.array(epochs, dtype=np.float64))
+
+def splice_rows(offsets, values, changed, capacity, index):
+    """Offset/value arrays with every row in `changed` replaced by `changed[row][index]`."""
+    old_rows = len(offsets) - 1
+    lengths = np.zeros(capacity, dtype=np.int64)
+    lengths[:old_rows] = np.diff(offsets)
+
+    pieces = []
+    start = 0
+    for row in sorted(changed):
+        pieces.append(values[offsets[min(start, old_rows)]:offsets[min(row, old_rows)]])
+        pieces.append(changed[row][index])
+        lengths[row] = len(changed[row][index])
+        start = row + 1
+    pieces.append(values[offsets[min(start, old_rows)]:])
+
+    return np.concatenate(([0], np.cumsum(lengths))), np.concatenate(pieces).astype(values.dtype, copy=False)
+
+class ValueCodes:
+    """Dictionary encoding for one categorical column, -1 means missing."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, value):
+        if not value:
+            return -1
+        if not isinstance(value, (str, int, float)):
+            value = str(value)
+
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+class UserTable:
+    """Columnar copy of the user mirror for the analytics endpoints.
+
+    Scalar fields live in fixed-width NumPy columns indexed by row and are
+    rewritten in place when a user changes. Hobbies and likes only live in
+    offset/value arrays; rows changed since the last query wait in a small
+    overlay and are spliced in the next time a query needs them. Queries
+    read the columns under the lock, since growing the table replaces them.
+    """
+
+    def __init__(self, capacity=1024):
+        self._lock = threading.Lock()
+        self.built = False
+
+        self.built_at = None
+
+        self.user_ids = []
+        self._rows = {}
+        self._free_rows = []
+        self.codes = {column: ValueCodes() for column in CODED_FIELDS}
+        self.hobby_codes = ValueCodes()
+
+        self._capacity = 0
+        self.valid = np.zeros(0, dtype=bool)
+        self.created = np.zeros(0, dtype=np.float64)
+        self.created_set = np.zeros(0, dtype=bool)
+        self.has_lives_in = np.zeros(0, dtype=bool)
+        self.latitude = np.zeros(0, dtype=np.float32)
+        self.longitude = np.zeros(0, dtype=np.float32)
+        self.city = np.zeros(0, dtype=np.int16)
+        self.coded = {column: np.zeros(0, dtype=np.int32) for column in CODED_FIELDS}
+
+        self._packed = {
+            "hobby_offsets": np.zeros(1, dtype=np.int64),
+            "hobby_values": np.zeros(0, dtype=np.int32),
+            "like_offsets": np.zeros(1, dtype=np.int64),
+            "like_values": np.zeros(0),
+        }
+        # row -> (hobby codes, like epochs) written since the last pack
+        self._changed = {}
+        self._pending = None
+        self._grow(capacity)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _grow(self, capacity):
+        extra = capacity - self._capacity
+        if extra <= 0:
+            return
+
+        self.valid = np.concatenate((self.valid, np.zeros(extra, dtype=bool)))
+        self.created = np.concatenate((self.created, np.full(extra, np.nan)))
+        self.created_set = np.concatenate((self.created_set, np.zeros(extra, dtype=bool)))
+        self.has_lives_in = np.concatenate((self.has_lives_in, np.zeros(extra, dtype=bool)))
+        self.latitude = np.concatenate((self.latitude, np.full(extra, np.nan, dtype=np.float32)))
+        self.longitude = np.concatenate((self.longitude, np.full(extra, np.nan, dtype=np.float32)))
+        self.city = np.concatenate((self.city, np.full(extra, -1, dtype=np.int16)))
+        for column in CODED_FIELDS:
+            self.coded[column] = np.concatenate((self.coded[column], np.full(extra, -1, dtype=np.int32)))
+
+        self.user_ids.extend([None] * extra)
+        self._free_rows = list(range(capacity - 1, self._capacity - 1, -1)) + self._free_rows
+        self._capacity = capacity
+
+    def _clear_row(self, row):
+        self.user_ids[row] = None
+        self.valid[row] = False
+        self.created[row] = np.nan
+        self.created_set[row] = False
+        self.has_lives_in[row] = False
+        self.latitude[row] = np.nan
+        self.longitude[row] = np.nan
+        self.city[row] = -1
+        for column in CODED_FIELDS:
+            self.coded[column][row] = -1
+        self._changed[row] = EMPTY_ROW
+
+    def _write_row(self, row, user_id, user_data, assign_city=True):
+        self._clear_row(row)
+        self.user_ids[row] = user_id
+        self.valid[row] = True
+
+        created_at = user_data.get("created_at")
+        self.created_set[row] = bool(created_at)
+        if created_at:
+            self.created[row] = parse_epoch(created_at)
+
+        lives_in = user_data.get("livesIn")
+        self.has_lives_in[row] = bool(lives_in) and isinstance(lives_in, dict)
+        if isinstance(lives_in, dict) and "latitude" in lives_in and "longitude" in lives_in:
+            self.latitude[row] = lives_in["latitude"]
+            self.longitude[row] = lives_in["longitude"]
+            if assign_city:
+                self.city[row] = get_city_index().nearest_indices([lives_in["latitude"]], [lives_in["longitude"]])[0]
+
+        for column, field in CODED_FIELDS.items():
+            self.coded[column][row] = self.codes[column].encode(user_data.get(field))
+
+        hobbies = user_data.get("hobbies") or []
+        likes_received = user_data.get("likesReceived")
+        if hobbies or likes_received:
+            self._changed[row] = (
+                np.array([self.hobby_codes.encode(hobby) for hobby in hobbies], dtype=np.int32),
+                parse_like_epochs(likes_received or [])
+            )
+
+    def upsert(self, user_id, user_data, assign_city=True):
+        if not isinstance(user_data, dict):
+            self.remove(user_id)
+            return
+
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                if not self._free_rows:
+                    self._grow(max(1024, self._capacity * 2))
+                row = self._free_rows.pop()
+                self._rows[user_id] = row
+
+            self._write_row(row, user_id, user_data, assign_city)
+
+    def remove(self, user_id):
+        with self._lock:
+            row = self._rows.pop(user_id, None)
+            if row is None:
+                return
+            self._clear_row(row)
+            self._free_rows.append(row)
+
+    def on_user_change(self, user_id, old_user, new_user):
+        with self._lock:
+            if self._pending is not None:
+                self._pending[user_id] = new_user
+        if self.built:
+            self.upsert(user_id, new_user)
+
+    def track_changes(self):
+        """Remember changes that arrive while a rebuild is reading its copy of the users."""
+        with self._lock:
+            self._pending = {}
+
+    def rebuild(self, users_data):
+        rebuilt = UserTable(capacity=max(1024, len(users_data or {})))
+        for user_id, user_data in (users_data or {}).items():
+            rebuilt.upsert(user_id, user_data, assign_city=False)
+
+        located = rebuilt.valid & ~np.isnan(rebuilt.latitude)
+        if located.any():
+            rebuilt.city[located] = get_city_index().nearest_indices(
+                rebuilt.latitude[located], rebuilt.longitude[located]
+            )
+
+        rebuilt._pack_locked()
+
+        with self._lock:
+            pending = self._pending or {}
+            self.user_ids = rebuilt.user_ids
+            self._rows = rebuilt._rows
+            self._free_rows = rebuilt._free_rows
+            self.codes = rebuilt.codes
+            self.hobby_codes = rebuilt.hobby_codes
+            self._capacity = rebuilt._capacity
+            self.valid = rebuilt.valid
+            self.created = rebuilt.created
+            self.created_set = rebuilt.created_set
+            self.has_lives_in = rebuilt.has_lives_in
+            self.latitude = rebuilt.latitude
+            self.longitude = rebuilt.longitude
+            self.city = rebuilt.city
+            self.coded = rebuilt.coded
+            self._packed = rebuilt._packed
+            self._changed = {}
+            self._pending = None
+            self.built = True
+            self.built_at = time.time()
+
+        for user_id, user_data in pending.items():
+            self.upsert(user_id, user_data)
+
+    def _pack_locked(self):
+        """Offset/value arrays for hobbies and likes with the changed rows spliced in."""
+        if self._changed:
+            packed = self._packed
+            hobby_offsets, hobby_values = splice_rows(packed["hobby_offsets"], packed["hobby_values"], self._changed, self._capacity, 0)
+            like_offsets, like_values = splice_rows(packed["like_offsets"], packed["like_values"], self._changed, self._capacity, 1)
+            self._packed = {
+                "hobby_offsets": hobby_offsets,
+                "hobby_values": hobby_values,
+                "like_offsets": like_offsets,
+                "like_values": like_values,
+            }
+            self._changed = {}
+        return self._packed
+
+    def signup_epochs(self):
+        with self._lock:
+            created = self.created[self.valid & self.has_lives_in & ~np.isnan(self.created)]
+        return np.sort(created)
+
+    def total_user_count(self):
+        with self._lock:
+            return int(np.count_nonzero(self.valid & self.created_set & ~np.isnan(self.latitude)))
+
+    def recent_user_counts(self, current_time, hours):
+        with self._lock:
+            created = self.created[self.valid & ~np.isnan(self.created)]
+        age = to_epoch(current_time) - created
+        return [int(np.count_nonzero(age <= window * 3600)) for window in hours]
+
+    def college_counts(self):
+        with self._lock:
+            colleges = self.coded["college"][self.valid]
+            college_values = list(self.codes["college"].values)
+        counts = np.bincount(colleges[colleges >= 0], minlength=len(college_values))
+        return {college_values[code]: int(count) for code, count in enumerate(counts) if count}
+
+    def city_counts(self):
+        with self._lock:
+            cities = self.city[self.valid]
+        return np.bincount(cities[cities >= 0], minlength=len(get_city_index().names))
+
+    def period_totals(self, current_time=None):
+        """Exact likes per (gender, family, value) for every period in LIKE_PERIODS."""
+        if current_time is None:
+            current_time = datetime.now()
+
+        with self._lock:
+            packed = self._pack_locked()
+            coded = {column: self.coded[column].copy() for column in CODED_FIELDS}
+            values = {column: list(self.codes[column].values) for column in CODED_FIELDS}
+            hobby_values = list(self.hobby_codes.values)
+            cities = self.city.astype(np.int32)
+
+        like_offsets = packed["like_offsets"]
+        genders = coded["gender"]
+        gender_values = values["gender"]
+        hobby_lengths = np.diff(packed["hobby_offsets"])
+        hobby_rows = np.repeat(np.arange(len(hobby_lengths)), hobby_lengths)
+
+        def add_counts(totals, gender_codes, value_codes, weights, values, family, gendered):
+            if not values:
+                return
+
+            selected = (value_codes >= 0) & (weights > 0)
+            if gendered:
+                selected &= gender_codes >= 0
+            else:
+                gender_codes = np.zeros_like(gender_codes)
+
+            combined = gender_codes[selected].astype(np.int64) * len(values) + value_codes[selected]
+            sums = np.bincount(combined, weights=weights[selected])
+            for index in np.flatnonzero(sums):
+                gender = gender_values[index // len(values)] if gendered else None
+                totals[(gender, family, values[index % len(values)])] += int(sums[index])
+
+        totals_by_period = {}
+        for period, delta in LIKE_PERIODS.items():
+            newer = np.concatenate(([0], np.cumsum(packed["like_values"] > to_epoch(current_time - delta))))
+            likes = newer[like_offsets[1:]] - newer[like_offsets[:-1]]
+
+            totals = Counter()
+            for family, column in GENDERED_FAMILIES.items():
+                add_counts(totals, genders, coded[column], likes, values[column], family, True)
+            add_counts(totals, genders[hobby_rows], packed["hobby_values"], likes[hobby_rows], hobby_values, "hobbies", True)
+            add_counts(totals, genders, coded["college"], likes, values["college"], "colleges", False)
+            add_counts(totals, genders, cities, likes, get_city_index().names, "cities", False)
+
+            totals_by_period[period] = totals
+
+        return totals_by_period
+
+
+user_table = UserTable()
+user_snapshot.subscribe(user_table.on_user_change)
+_rebuild_lock = threading.Lock()
+
+def _table_is_current():
+    if not user_table.built:
+        return False
+    return user_snapshot.is_live() or time.time() - user_table.built_at < USER_TABLE_MAX_AGE
+
+def get_user_table():
+    """The columnar table, rebuilt from a fresh read at most every USER_TABLE_MAX_AGE seconds while the mirror is not live."""
+    if _table_is_current():
+        return user_table
+
+    with _rebuild_lock:
+        # Another request may have rebuilt it while this one waited
+        if not _table_is_current():
+            user_table.track_changes()
+            user_table.rebuild(user_snapshot.get_users())
+    return user_table
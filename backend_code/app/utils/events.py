@@ -0,0 +1,173 @@
+from concurrent.futures import ThreadPoolExecutor
+from app import realtime_db
+from app.utils.batch import BatchWriter, summarize_report
+from app.utils.seats import seat_counts
+
+# eventSummaries/<eventId> mirrors the listing fields of events/<eventId>
+# without tickets and rsvps. Listing queries order it by event_date, which
+# needs `".indexOn": ["event_date"]` on eventSummaries in the database rules.
+EVENT_SUMMARIES = "eventSummaries"
+
+SUMMARY_FIELDS = ["name", "event_date", "location", "max_tickets", "vip_limit", "created_by", "seat_shard_count"]
+
+def event_summary(event_data):
+    summary = {field: event_data[field] for field in SUMMARY_FIELDS if event_data.get(field) is not None}
+    summary["rsvp_count"] = len(event_data.get("rsvps") or {})
+    return summary
+
+def encode_event_cursor(summary):
+    return f"{summary.get('event_date', '')}|{summary['event_id']}"
+
+def decode_event_cursor(cursor):
+    event_date, _, event_id = cursor.partition("|")
+    return event_date, event_id
+
+def _summary_page(upcoming, bound, size):
+    """Up to `size` summaries from `bound` on, in listing order, as (event_id, summary) pairs."""
+    query = realtime_db.child(EVENT_SUMMARIES).order_by_child("event_date")
+    try:
+        if upcoming:
+            page = query.start_at(bound).limit_to_first(size).get() or {}
+            return list(page.items())
+        page = query.end_at(bound).limit_to_last(size).get() or {}
+        return list(reversed(list(page.items())))
+    except Exception as e:
+        # No index on event_date yet, sort the (small) summaries here instead
+        print(f"Error querying event summaries by date, sorting locally: {e}")
+        summaries = realtime_db.child(EVENT_SUMMARIES).get() or {}
+        items = sorted(summaries.items(), key=lambda item: (str(item[1].get("event_date", "")), item[0]))
+        if upcoming:
+            return [item for item in items if str(item[1].get("event_date", "")) >= bound][:size]
+        return [item for item in reversed(items) if str(item[1].get("event_date", "")) <= bound][:size]
+
+def list_event_summaries(upcoming, now, limit=None, cursor=None):
+    """Upcoming (soonest first) or past (newest first) summaries plus the next cursor.
+
+    Events sharing an event_date are ordered by ID, the cursor carries both so
+    a page boundary can fall inside such a group.
+    """
+    after = decode_event_cursor(cursor) if cursor else None
+    bound = after[0] if after else now
+    size = (limit or 100) + 1
+
+    while True:
+        page = _summary_page(upcoming, bound, size)
+
+        selected = []
+        for event_id, summary in page:
+            if not isinstance(summary, dict):
+                continue
+            key = (str(summary.get("event_date", "")), event_id)
+            if (key[0] > now) != upcoming:
+                continue
+            if after and (key <= after if upcoming else key >= after):
+                continue
+            selected.append(dict(summary, event_id=event_id))
+
+        # Stop once the page holds one more than asked for or nothing is left,
+        # otherwise skipped ties cut it short and the next read goes further
+        if len(page) < size or limit is not None and len(selected) > limit:
+            break
+        size *= 2
+
+    if limit is None or len(selected) <= limit:
+        return selected, None
+    selected = selected[:limit]
+    return selected, encode_event_cursor(selected[-1])
+
+def _seat_fields(event_id, shard_count):
+    """Counter fields of one event, without downloading its tickets and rsvps."""
+    event_ref = realtime_db.child("events").child(event_id)
+    # booked_normal, booked_vip, created_by, event_date, held_normal, held_vip
+    fields = dict(event_ref.order_by_key().start_at("booked_").end_at("held_~").get() or {})
+    if shard_count:
+        fields["seat_shards"] = event_ref.child("seat_shards").get() or {}
+    return fields
+
+def with_seat_counts(summaries, workers=8):
+    """Add booked_*, held_* and available_* to each summary, reading the counters in parallel."""
+    if not summaries:
+        return summaries
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(summaries))) as executor:
+        seat_fields = list(executor.map(
+            lambda summary: _seat_fields(summary["event_id"], summary.get("seat_shard_count")),
+            summaries
+        ))
+
+    for summary, fields in zip(summaries, seat_fields):
+        summary.update(seat_counts({**summary, **fields}))
+    return summaries
+
+def rebuild_event_summaries(page_size=100, chunk_size=None):
+    """Rewrite eventSummaries from the events tree, one page of events at a time."""
+    writer = BatchWriter(chunk_size=chunk_size)
+    seen = set()
+
+    start = None
+    while True:
+        query = realtime_db.child("events").order_by_key()
+        if start is not None:
+            query = query.start_at(start)
+        page = query.limit_to_first(page_size + 1).get() or {}
+
+        page_items = list(page.items())
+        if start is not None and page_items and page_items[0][0] == start:
+            page_items = page_items[1:]
+        for event_id, event_data in page_items:
+            if isinstance(event_data, dict):
+                writer.set(f"{EVENT_SUMMARIES}/{event_id}", event_summary(event_data))
+                seen.add(event_id)
+
+        if len(page) <= page_size:
+            break
+        start = page_items[-1][0]
+
+    for event_id in realtime_db.child(EVENT_SUMMARIES).get(shallow=True) or {}:
+        if event_id not in seen:
+            writer.delete(f"{EVENT_SUMMARIES}/{event_id}")
+
+    return {"events": len(seen), "writes": summarize_report(writer.flush())}
+
+ATTENDEE_FIELDS = ["ticket_id", "name", "age", "gender", "seat_type", "booked_at"]
+
+def attendee_record(ticket_id, ticket_info):
+    return {
+        "ticket_id": ticket_id,
+        "name": ticket_info.get("name"),
+        "age": ticket_info.get("age"),
+        "gender": ticket_info.get("gender"),
+        "seat_type": ticket_info.get("seat_type"),
+        "booked_at": ticket_info.get("booked_at")
+    }
+
+def iter_attendees(event_id, start=None, page_size=1000, seat_type=None):
+    """Attendees of an event in ticket ID order from `start` on, read one page of tickets at a time."""
+    tickets_ref = realtime_db.child("events").child(event_id).child("tickets")
+    skip = None
+    while True:
+        query = tickets_ref.order_by_key()
+        if start is not None:
+            query = query.start_at(start)
+        page = query.limit_to_first(page_size).get() or {}
+
+        for ticket_id, ticket_info in page.items():
+            if ticket_id == skip or not isinstance(ticket_info, dict):
+                continue
+            if seat_type and ticket_info.get("seat_type") != seat_type:
+                continue
+            yield attendee_record(ticket_id, ticket_info)
+
+        if len(page) < page_size:
+            return
+        # The next page starts at (and skips) the last ticket of this one
+        start = skip = list(page)[-1]
+
+def attendee_page(event_id, limit, cursor=None, seat_type=None):
+    """Up to `limit` attendees from `cursor` on, plus the cursor of the next page."""
+    attendees = []
+    for attendee in iter_attendees(event_id, start=cursor or None, page_size=limit + 1, seat_type=seat_type):
+        if len(attendees) == limit:
+            return attendees, attendee["ticket_id"]
+        attendees.append(attendee)
+    return attendees, None
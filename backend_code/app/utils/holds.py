@@ -0,0 +1,301 @@
+import heapq
+import threading
+import time
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from app import realtime_db
+from app.config import SEAT_HOLD_TTL
+from app.utils.batch import increment
+from app.utils.bookings import booking_index_path
+from app.utils.payment_rollups import increment_writes, status_change_deltas
+from app.utils.seats import reserve_seats, seat_counter_path
+
+class HoldClaimedError(Exception):
+    pass
+
+class BookingMovedError(Exception):
+    pass
+
+def hold_key(expires_at, booking_id):
+    # Keys sort by expiry, so lapsed holds are a plain key range query
+    return f"{int(expires_at):010d}_{booking_id}"
+
+def hold_counter_path(hold):
+    """Path of the booked counter the hold's seat was taken from."""
+    return seat_counter_path(hold["eventId"], hold["seatType"], hold.get("shard"))
+
+def held_counter_path(hold):
+    return f"events/{hold['eventId']}/held_{hold['seatType']}"
+
+def settle_writes(holds):
+    """Update entries turning claimed holds into sales, the holds go and their seats stay booked."""
+    writes = {f"seatHolds/{hold['holdId']}": None for hold in holds}
+    for path, count in Counter(held_counter_path(hold) for hold in holds).items():
+        writes[path] = increment(-count)
+    return writes
+
+class HoldSweeper:
+    """Seat holds between `bookings/initiate` and the payment webhook.
+
+    A hold takes its seat up front with `reserve_seats`, so it already counts
+    against capacity, and is recorded under `seatHolds/<expiry>_<booking_id>`.
+    Lapsed holds are released by a background thread that sleeps until the
+    earliest expiry in its min-heap, then fetches every due hold with one key
+    range query. Webhook and sweeper both claim a hold by marking it in a
+    transaction, so a seat is either sold or released, never both. The hold
+    is only deleted by the update that sells or releases its seat, so a
+    claimant that failed halfway finds its claim again on the next try.
+    """
+
+    def __init__(self, holds_ref, ttl=SEAT_HOLD_TTL, batch_size=500, idle_interval=60, workers=16, claim_lease=60):
+        self.holds_ref = holds_ref
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self.workers = workers
+        self.claim_lease = claim_lease
+
+        self._heap = []
+        self._wakeup = threading.Condition()
+        self._thread = None
+        self._last_sweep = None
+
+    def start(self):
+        with self._wakeup:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="seat-hold-sweeper", daemon=True)
+            self._thread.start()
+
+    def status(self):
+        with self._wakeup:
+            next_expiry = self._heap[0][0] if self._heap else None
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "scheduled_holds": len(self._heap),
+                "next_expiry": next_expiry,
+                "last_sweep": self._last_sweep
+            }
+
+    def _schedule(self, expires_at, key):
+        with self._wakeup:
+            heapq.heappush(self._heap, (expires_at, key))
+            if self._heap[0][1] == key:
+                self._wakeup.notify()
+
+    def place_hold(self, event_id, seat_type, booking_id, now=None):
+        """Reserve a seat for `booking_id` until the TTL runs out, returns the hold record.
+
+        Raises the same errors as `reserve_seat`.
+        """
+        return self.place_holds(event_id, [seat_type], [booking_id], now=now)[0]
+
+    def place_holds(self, event_id, seat_types, booking_ids, now=None, claimed_by=None, extra_writes=None):
+        """Hold one seat per booking, all of them or none, returns the hold records in order.
+
+        `seat_types[i]` is the seat type of `booking_ids[i]`. The seats come
+        from `reserve_seats` and every hold record is written in one update,
+        together with `extra_writes(holds)` when given. With `claimed_by` the
+        holds are placed already claimed by that owner.
+        """
+        now = time.time() if now is None else now
+        seats = reserve_seats(event_id, Counter(seat_types))
+
+        expires_at = int(now + self.ttl)
+        created_at = datetime.fromtimestamp(now, timezone.utc).isoformat()
+        holds = []
+        for seat_type, booking_id in zip(seat_types, booking_ids):
+            key = hold_key(expires_at, booking_id)
+            hold = {
+                "holdId": key,
+                "bookingId": booking_id,
+                "eventId": event_id,
+                "seatType": seat_type,
+                "createdAt": created_at,
+                "expiresAt": expires_at
+            }
+            shard = seats[seat_type].pop()
+            if shard:
+                hold["shard"] = shard
+            if claimed_by:
+                hold["claimedBy"] = claimed_by
+                hold["claimedAt"] = now
+            holds.append(hold)
+
+        writes = {f"seatHolds/{hold['holdId']}": hold for hold in holds}
+        for seat_type, count in Counter(seat_types).items():
+            writes[f"events/{event_id}/held_{seat_type}"] = increment(count)
+        if extra_writes:
+            writes.update(extra_writes(holds))
+
+        try:
+            realtime_db.update(writes)
+        except Exception:
+            # Without hold records nothing would ever give the seats back
+            released = Counter(hold_counter_path(hold) for hold in holds)
+            realtime_db.update({path: increment(-count) for path, count in released.items()})
+            raise
+
+        for hold in holds:
+            self._schedule(expires_at, hold["holdId"])
+        self.start()
+        return holds
+
+    def claim_hold(self, key, owner, lease=None):
+        """Mark the hold as claimed by `owner` in a transaction, returns it if `owner` holds the claim.
+
+        A hold claimed by another owner stays theirs. `owner` takes its own
+        claim again right away, or after `lease` seconds when several
+        processes share the owner name.
+        """
+        claimed = {}
+        now = time.time()
+
+        def take(hold):
+            claimed.clear()
+            if not isinstance(hold, dict):
+                return hold
+            current = hold.get("claimedBy")
+            if current and (current != owner or (lease is not None and now - hold.get("claimedAt", 0) < lease)):
+                raise HoldClaimedError()
+            claimed.update(hold, claimedBy=owner, claimedAt=now)
+            return dict(claimed)
+
+        try:
+            self.holds_ref.child(key).transaction(take)
+        except HoldClaimedError:
+            return None
+        return claimed or None
+
+    def claim_holds(self, keys, owner):
+        """Claim these holds for `owner`, returns the claimed ones by key."""
+        if not keys:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(keys)))) as executor:
+            claimed = [hold for hold in executor.map(lambda key: self.claim_hold(key, owner), keys) if hold]
+        return {hold["holdId"]: hold for hold in claimed}
+
+    def due_holds(self, now):
+        """Keys of every hold that expired before `now`, in expiry order."""
+        cutoff = f"{int(now):010d}~"
+        keys = []
+        start = None
+        while True:
+            query = self.holds_ref.order_by_key().end_at(cutoff)
+            if start is not None:
+                query = query.start_at(start)
+            page = query.limit_to_first(self.batch_size + 1).get() or {}
+
+            page_keys = list(page)
+            if start is not None and page_keys and page_keys[0] == start:
+                page_keys = page_keys[1:]
+            keys.extend(page_keys)
+
+            if len(page) <= self.batch_size:
+                return keys
+            start = page_keys[-1]
+
+    def _move_booking(self, hold, status):
+        """Move the hold's booking from pending to `status` in a transaction.
+
+        Returns ("moved", booking) when it did, ("sold", None) when the
+        booking was paid on this hold, ("free", None) when there is no
+        booking on this hold any more (missing, moved on to another hold, or
+        already out of pending).
+        """
+        moved = {}
+        updated_at = datetime.now(timezone.utc).isoformat()
+
+        def move(booking):
+            moved.clear()
+            if not isinstance(booking, dict) or booking.get("holdId") != hold["holdId"]:
+                raise BookingMovedError("free")
+            if booking.get("status") == "successful":
+                raise BookingMovedError("sold")
+            if booking.get("status") not in ("pending", status) or booking.get("paymentId"):
+                raise BookingMovedError("free")
+            moved.update(booking, status=status, updatedAt=updated_at)
+            return dict(moved)
+
+        try:
+            realtime_db.child("bookings").child(hold["bookingId"]).transaction(move)
+        except BookingMovedError as e:
+            return str(e), None
+        return "moved", dict(moved)
+
+    def _release_hold(self, key, status):
+        hold = self.claim_hold(key, "sweeper", lease=self.claim_lease)
+        if not hold:
+            return "skipped"
+
+        try:
+            state, booking = self._move_booking(hold, status) if hold.get("bookingId") else ("free", None)
+            # The seat, the hold and the booking's index entry and rollups in
+            # one update, a failure leaves the claimed hold for the next sweep
+            writes = {f"seatHolds/{key}": None, held_counter_path(hold): increment(-1)}
+            if state != "sold":
+                writes[hold_counter_path(hold)] = increment(-1)
+            if state == "moved":
+                # The transaction already moved the booking, writing its status
+                # again could undo a payment that landed since
+                writes[booking_index_path(hold["eventId"], hold["bookingId"])] = booking
+                writes.update(increment_writes(status_change_deltas(booking, "pending", status)))
+            realtime_db.update(writes)
+            return "released" if state != "sold" else "settled"
+        except Exception as e:
+            print(f"Error releasing seat hold {key}: {e}")
+            return "failed"
+
+    def release(self, keys, status="expired"):
+        """Give the seats of these holds back and move their still pending bookings to `status`."""
+        if not keys:
+            return {"released": 0, "failed": 0}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(keys)))) as executor:
+            results = list(executor.map(lambda key: self._release_hold(key, status), keys))
+        return {"released": results.count("released"), "failed": results.count("failed")}
+
+    def sweep(self, now=None):
+        """Release every lapsed hold and mark its booking expired."""
+        now = time.time() if now is None else now
+
+        with self._wakeup:
+            while self._heap and self._heap[0][0] <= now:
+                heapq.heappop(self._heap)
+
+        keys = self.due_holds(now)
+        result = self.release(keys)
+        self._last_sweep = now
+        return {"due": len(keys), **result}
+
+    def _seed(self):
+        """Schedule holds placed before this process started or by other workers."""
+        page = self.holds_ref.order_by_key().limit_to_first(self.batch_size).get() or {}
+        for key, hold in page.items():
+            if isinstance(hold, dict) and hold.get("expiresAt") is not None:
+                self._schedule(int(hold["expiresAt"]), key)
+
+    def _run(self):
+        try:
+            self._seed()
+        except Exception as e:
+            print(f"Error loading seat holds: {e}")
+
+        while True:
+            with self._wakeup:
+                delay = self._heap[0][0] - time.time() if self._heap else self.idle_interval
+                # An earlier hold was scheduled, plan again around it
+                if delay > 0 and self._wakeup.wait(min(delay, self.idle_interval)):
+                    continue
+
+            try:
+                result = self.sweep()
+                if result["released"]:
+                    print(f"Released {result['released']} lapsed seat holds")
+            except Exception as e:
+                print(f"Error sweeping seat holds: {e}")
+                time.sleep(1)
+
+
+hold_sweeper = HoldSweeper(realtime_db.child("seatHolds"))
@@ -0,0 +1,96 @@
+from app import realtime_db
+from app.utils.batch import BatchWriter, summarize_report
+
+# Newest-first listings ordered by one child of each record. The queries need
+# an ".indexOn" for that child in the database rules: createdAt on bookings,
+# payments and each bookings_by_event/<eventId>, status_activity and
+# last_activity on supportTicketSummaries.
+
+def encode_listing_cursor(position, key):
+    return f"{position or ''}|{key}"
+
+def decode_listing_cursor(cursor):
+    position, _, key = cursor.rpartition("|")
+    return position, key
+
+def _newest_page(ref, order_child, bound, size, prefix=""):
+    """Up to `size` children whose `order_child` is at most `bound`, newest first, as (key, value) pairs.
+
+    With a `prefix` only children whose `order_child` starts with it are read.
+    """
+    query = ref.order_by_child(order_child)
+    if bound is None and prefix:
+        bound = prefix + "~"
+    try:
+        if prefix:
+            query = query.start_at(prefix)
+        if bound is not None:
+            query = query.end_at(bound)
+        page = query.limit_to_last(size).get() or {}
+        return list(reversed(list(page.items())))
+    except Exception as e:
+        # No index on the child yet, sort the whole node here instead
+        print(f"Error querying {ref.key} by {order_child}, sorting locally: {e}")
+        children = ref.get() or {}
+
+        def position(item):
+            return str(item[1].get(order_child) or "") if isinstance(item[1], dict) else ""
+
+        items = sorted(children.items(), key=lambda item: (position(item), item[0]), reverse=True)
+        return [
+            item for item in items
+            if position(item).startswith(prefix) and (bound is None or position(item) <= bound)
+        ][:size]
+
+def list_newest(ref, order_child, limit, cursor=None, filters=None, id_field="id", prefix=""):
+    """Up to `limit` children of `ref` matching `filters`, newest `order_child` first, plus the next cursor.
+
+    `filters` maps field names to required values and is applied here, reads
+    carry on below the last child seen with twice the page size until enough
+    children matched. Children sharing an `order_child` value are ordered by
+    key, the cursor carries both.
+    """
+    filters = {field: value for field, value in (filters or {}).items() if value}
+    after = decode_listing_cursor(cursor) if cursor else None
+    size = limit + 1
+
+    selected = []
+    while len(selected) <= limit:
+        page = _newest_page(ref, order_child, after[0] if after else None, size, prefix)
+
+        last = after
+        for key, value in page:
+            position = (str(value.get(order_child) or "") if isinstance(value, dict) else "", key)
+            if after and position >= after:
+                continue
+            last = position
+            if not isinstance(value, dict):
+                continue
+            if any(value.get(field) != expected for field, expected in filters.items()):
+                continue
+            selected.append(dict(value, **{id_field: key}))
+
+        if len(page) < size:
+            break
+        # Carry on below the last child read, the doubled size also gets
+        # past a tie larger than one page
+        after = last
+        size *= 2
+
+    if len(selected) <= limit:
+        return selected, None
+    selected = selected[:limit]
+    return selected, encode_listing_cursor(selected[-1].get(order_child), selected[-1][id_field])
+
+def list_by_created(ref, limit, cursor=None, filters=None, id_field="id"):
+    """Up to `limit` children of `ref` matching `filters`, newest createdAt first, plus the next cursor."""
+    return list_newest(ref, "createdAt", limit, cursor=cursor, filters=filters, id_field=id_field)
+
+def clear_children(path, chunk_size=None):
+    """Delete every child of `path` through chunked multi-location null updates."""
+    keys = realtime_db.child(path).get(shallow=True) or {}
+
+    writer = BatchWriter(chunk_size=chunk_size)
+    for key in keys:
+        writer.delete(f"{path}/{key}")
+    return {"deleted": len(keys), "writes": summarize_report(writer.flush())}
@@ -0,0 +1,140 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from app import realtime_db
+from app.utils.batch import increment
+from app.utils.bookings import iter_bookings, iter_children
+
+# paymentRollups/{events/<eventId>, days/<YYYY-MM-DD>}/... counters:
+#   bookings/<status>  bookings currently in that status
+#   seats/<seat type>  successful bookings per seat type
+#   payments           recorded payments
+#   gross/<currency>   summed payment amounts, in Stripe's minor units
+# A booking and its payment count towards the day the booking was created.
+PAYMENT_ROLLUPS = "paymentRollups"
+
+def booking_day(booking):
+    return str(booking.get("createdAt") or "")[:10] or None
+
+def rollup_scopes(event_id, day):
+    scopes = []
+    if event_id:
+        scopes.append(f"{PAYMENT_ROLLUPS}/events/{event_id}")
+    if day:
+        scopes.append(f"{PAYMENT_ROLLUPS}/days/{day}")
+    return scopes
+
+def status_change_deltas(booking, old_status, new_status):
+    """Counter deltas for a booking moving from `old_status` to `new_status` (None = absent)."""
+    deltas = Counter()
+    if old_status == new_status:
+        return deltas
+
+    seat_type = booking.get("seatType")
+    for scope in rollup_scopes(booking.get("eventId"), booking_day(booking)):
+        if old_status:
+            deltas[f"{scope}/bookings/{old_status}"] -= 1
+            if old_status == "successful" and seat_type:
+                deltas[f"{scope}/seats/{seat_type}"] -= 1
+        if new_status:
+            deltas[f"{scope}/bookings/{new_status}"] += 1
+            if new_status == "successful" and seat_type:
+                deltas[f"{scope}/seats/{seat_type}"] += 1
+    return deltas
+
+def payment_deltas(event_id, day, amount, currency, sign=1):
+    deltas = Counter()
+    for scope in rollup_scopes(event_id, day):
+        deltas[f"{scope}/payments"] += sign
+        deltas[f"{scope}/gross/{str(currency or 'unknown').lower()}"] += sign * int(amount or 0)
+    return deltas
+
+def increment_writes(deltas):
+    """Multi-location update entries applying `deltas` as server-side increments."""
+    return {path: increment(delta) for path, delta in deltas.items() if delta}
+
+def _add(tree, path, delta):
+    node = tree
+    segments = path.split("/")
+    for segment in segments[:-1]:
+        node = node.setdefault(segment, {})
+    node[segments[-1]] = node.get(segments[-1], 0) + delta
+
+def rebuild_payment_rollups(page_size=1000):
+    """Recompute every counter from `bookings` and `payments` and replace the rollups.
+
+    Increments that land while the rebuild is reading are overwritten, run it
+    when the payment flow is quiet.
+    """
+    deltas = Counter()
+    bookings = {}
+    for booking_id, booking in iter_bookings(page_size):
+        if not isinstance(booking, dict):
+            continue
+        bookings[booking_id] = (booking.get("eventId"), booking_day(booking))
+        deltas.update(status_change_deltas(booking, None, booking.get("status")))
+
+    payments = 0
+    for payment_id, payment in iter_children(realtime_db.child("payments"), page_size):
+        if not isinstance(payment, dict):
+            continue
+        # Payments made before they carried a bookingId only count towards their day
+        event_id, day = bookings.get(payment.get("bookingId"), (payment.get("eventId"), payment.get("day")))
+        deltas.update(payment_deltas(event_id, day or booking_day(payment), payment.get("amount"), payment.get("currency")))
+        payments += 1
+
+    tree = {}
+    for path, delta in deltas.items():
+        if delta:
+            _add(tree, path[len(PAYMENT_ROLLUPS) + 1:], delta)
+
+    realtime_db.child(PAYMENT_ROLLUPS).set(tree or None)
+    return {
+        "bookings": len(bookings),
+        "payments": payments,
+        "events": len(tree.get("events", {})),
+        "days": len(tree.get("days", {}))
+    }
+
+def _merge(total, counters):
+    for key, value in (counters or {}).items():
+        if isinstance(value, dict):
+            _merge(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)):
+            total[key] = total.get(key, 0) + value
+    return total
+
+def with_conversion(counters):
+    statuses = counters.get("bookings", {})
+    total = sum(statuses.values())
+    counters["conversion"] = statuses.get("successful", 0) / total if total else None
+    return counters
+
+def payment_summary(start_day=None, end_day=None, event_id=None):
+    """Totals, per-day and per-event counters, read from the rollups only."""
+    if end_day is None:
+        end_day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    if start_day is None:
+        start_day = (datetime.strptime(end_day, "%Y-%m-%d") - timedelta(days=29)).strftime("%Y-%m-%d")
+
+    days_ref = realtime_db.child(PAYMENT_ROLLUPS).child("days")
+    days = days_ref.order_by_key().start_at(start_day).end_at(end_day).get() or {}
+
+    totals = {}
+    for counters in days.values():
+        _merge(totals, counters)
+
+    summary = {
+        "from": start_day,
+        "to": end_day,
+        "totals": with_conversion(totals),
+        "by_day": {day: with_conversion(_merge({}, counters)) for day, counters in days.items()}
+    }
+
+    if event_id:
+        event_counters = realtime_db.child(PAYMENT_ROLLUPS).child("events").child(event_id).get() or {}
+        summary["event"] = with_conversion(_merge({}, event_counters))
+    else:
+        events = realtime_db.child(PAYMENT_ROLLUPS).child("events").get() or {}
+        summary["by_event"] = {key: with_conversion(_merge({}, counters)) for key, counters in events.items()}
+
+    return summary
@@ -0,0 +1,231 @@
+import threading
+
+from collections import Counter
+from datetime import datetime
+from app.utils.user import LIKE_PERIODS
+from app.utils.total import get_closest_city
+from app.utils.snapshot import user_snapshot
+
+GENDERS = ["Man", "Woman"]
+
+# (family, user field) for the attributes that are broken down by gender
+GENDERED_ATTRIBUTES = [
+    ("heights", "height"),
+    ("skin_colors", "skinColor"),
+    ("job_prominences", "jobProminence"),
+    ("yearly_incomes", "yearlyIncome"),
+]
+
+def user_rollup_keys(user_data):
+    """(gender, family, value) keys a single like on this user counts towards."""
+    gender = user_data.get("gender")
+    keys = []
+
+    if gender:
+        for family, field in GENDERED_ATTRIBUTES:
+            value = user_data.get(field)
+            if value:
+                keys.append((gender, family, value))
+
+        for hobby in user_data.get("hobbies") or []:
+            keys.append((gender, "hobbies", hobby))
+
+    college = user_data.get("collegeOrSchool")
+    if college:
+        keys.append((gender, "colleges", college))
+
+    lives_in = user_data.get("livesIn")
+    if isinstance(lives_in, dict) and "latitude" in lives_in and "longitude" in lives_in:
+        keys.append((gender, "cities", get_closest_city(lives_in["latitude"], lives_in["longitude"])))
+
+    return tuple(keys)
+
+def user_like_days(user_data):
+    """Likes per calendar day, straight from the `%Y-%m-%d %H:%M:%S` prefix."""
+    likes_received = user_data.get("likesReceived") or []
+    return Counter(str(timestamp)[:10] for timestamp in likes_received)
+
+class DemographicRollups:
+    """Daily like counters keyed by (day, gender, attribute, value).
+
+    Kept current from user change events, so the demographics endpoint sums at
+    most a year of daily buckets instead of scanning every user's likes.
+    Changes that arrive while a rebuild reads the users are replayed on top
+    of it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._days = {}
+        self._contributions = {}
+        self._built = False
+        self._pending = None
+
+    def _apply(self, days, keys, like_days, sign):
+        for day, likes in like_days.items():
+            bucket = days.setdefault(day, Counter())
+            for key in keys:
+                bucket[key] += sign * likes
+                if not bucket[key]:
+                    del bucket[key]
+            if not bucket:
+                del days[day]
+
+    def apply_user(self, user_id, user_data):
+        if isinstance(user_data, dict) and user_data.get("likesReceived"):
+            contribution = (user_rollup_keys(user_data), user_like_days(user_data))
+        else:
+            contribution = None
+
+        with self._lock:
+            previous = self._contributions.get(user_id)
+            if previous == contribution:
+                return
+
+            if previous:
+                self._apply(self._days, previous[0], previous[1], -1)
+            if contribution:
+                self._apply(self._days, contribution[0], contribution[1], 1)
+                self._contributions[user_id] = contribution
+            else:
+                self._contributions.pop(user_id, None)
+
+    def on_user_change(self, user_id, old_user, new_user):
+        with self._lock:
+            if self._pending is not None:
+                self._pending[user_id] = new_user
+        if self._built:
+            self.apply_user(user_id, new_user)
+
+    def track_changes(self):
+        """Remember changes that arrive while a rebuild is reading its copy of the users."""
+        with self._lock:
+            self._pending = {}
+
+    def rebuild(self, users_data):
+        """Regenerate every bucket from the raw `users` data."""
+        rebuilt = DemographicRollups()
+        for user_id, user_data in (users_data or {}).items():
+            rebuilt.apply_user(user_id, user_data)
+
+        with self._lock:
+            pending = self._pending or {}
+            self._days = rebuilt._days
+            self._contributions = rebuilt._contributions
+            self._pending = None
+            self._built = True
+
+        for user_id, user_data in pending.items():
+            self.apply_user(user_id, user_data)
+
+        return len(self._days)
+
+    def rebuild_from(self, load_users):
+        """Rebuild from `load_users()`, keeping the changes that arrive while it reads."""
+        with self._rebuild_lock:
+            self.track_changes()
+            return self.rebuild(load_users())
+
+    def ensure_built(self):
+        if self._built:
+            return
+        with self._rebuild_lock:
+            # Another request may have built it while this one waited
+            if not self._built:
+                self.track_changes()
+                self.rebuild(user_snapshot.get_users())
+
+    def check(self, users_data, max_mismatches=100):
+        """Compare the live buckets against a fresh rebuild from `users_data`."""
+        expected = DemographicRollups()
+        expected.rebuild(users_data)
+
+        with self._lock:
+            actual_days = {day: Counter(bucket) for day, bucket in self._days.items()}
+
+        mismatches = []
+        for day in sorted(set(expected._days) | set(actual_days)):
+            expected_bucket = expected._days.get(day, Counter())
+            actual_bucket = actual_days.get(day, Counter())
+            for key in set(expected_bucket) | set(actual_bucket):
+                if expected_bucket[key] != actual_bucket[key]:
+                    mismatches.append({
+                        "day": day,
+                        "gender": key[0],
+                        "attribute": key[1],
+                        "value": key[2],
+                        "expected": expected_bucket[key],
+                        "actual": actual_bucket[key]
+                    })
+
+        return {
+            "consistent": not mismatches,
+            "days": len(expected._days),
+            "mismatch_count": len(mismatches),
+            "mismatches": mismatches[:max_mismatches]
+        }
+
+    def period_totals(self, current_time=None):
+        """Summed buckets per period, counting every day from the period's start day on."""
+        if current_time is None:
+            current_time = datetime.now()
+
+        with self._lock:
+            days = sorted(self._days.items(), reverse=True)
+
+        starts = sorted(
+            ((current_time - delta).strftime("%Y-%m-%d"), period)
+            for period, delta in LIKE_PERIODS.items()
+        )
+
+        totals = {}
+        running = Counter()
+        day_index = 0
+        for start_day, period in reversed(starts):
+            while day_index < len(days) and days[day_index][0] >= start_day:
+                running.update(days[day_index][1])
+                day_index += 1
+            totals[period] = Counter(running)
+
+        return totals
+
+    def top_data(self, current_time=None):
+        return format_top_data(self.period_totals(current_time))
+
+def format_top_data(totals_by_period):
+    """`get_user_demographics` response from per-period (gender, family, value) like totals."""
+    top_data = {}
+    for period, totals in totals_by_period.items():
+        families = {}
+        for (gender, family, value), likes in totals.items():
+            families.setdefault(family, {}).setdefault(gender, Counter())[value] += likes
+
+        def top_by_gender(family):
+            by_gender = families.get(family, {})
+            return {
+                gender: [value for value, _ in by_gender.get(gender, Counter()).most_common(4)]
+                for gender in GENDERS
+            }
+
+        def top_overall(family):
+            overall = Counter()
+            for counts in families.get(family, {}).values():
+                overall.update(counts)
+            return [value for value, _ in overall.most_common(4)]
+
+        top_data[period] = {
+            "top_heights": top_by_gender("heights"),
+            "top_skin_colors": top_by_gender("skin_colors"),
+            "top_job_prominences": top_by_gender("job_prominences"),
+            "top_yearly_incomes": top_by_gender("yearly_incomes"),
+            "top_hobbies": top_by_gender("hobbies"),
+            "top_colleges": top_overall("colleges"),
+            "top_cities": top_overall("cities")
+        }
+
+    return {period: top_data[period] for period in LIKE_PERIODS}
+
+
+demographic_rollups = DemographicRollups()
+user_snapshot.subscribe(demographic_rollups.on_user_change)
@@ -0,0 +1,141 @@
+import threading
+
+from app.utils.user import search_texts
+from app.utils.snapshot import user_snapshot
+
+GRAM_SIZE = 3
+
+def text_grams(texts):
+    """Every trigram inside each text, never spanning two fields."""
+    return {
+        text[index:index + GRAM_SIZE]
+        for text in texts
+        for index in range(len(text) - GRAM_SIZE + 1)
+    }
+
+class UserSearchIndex:
+    """Trigram inverted index over the fields the admin user search looks at.
+
+    Queries of three or more characters intersect the postings of their
+    trigrams and then confirm each candidate with a real substring check, so
+    results are exactly those of the linear scan. Shorter queries match most
+    users anyway and scan the pre-lowered field strings instead.
+
+    Queries are stripped before they get here and never contain the NUL
+    separator, so a match can't straddle two fields.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.built = False
+        self._postings = {}
+        # Fields joined by NUL, so one `in` checks them all without matching across fields
+        self._haystacks = {}
+        self._grams = {}
+        self._pending = None
+
+    def __len__(self):
+        return len(self._haystacks)
+
+    def _remove_locked(self, user_id):
+        for gram in self._grams.pop(user_id, ()):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(user_id)
+                if not posting:
+                    del self._postings[gram]
+        self._haystacks.pop(user_id, None)
+
+    def update(self, user_id, user_data):
+        with self._lock:
+            if not isinstance(user_data, dict):
+                self._remove_locked(user_id)
+                return
+
+            texts = search_texts(user_data)
+            haystack = "\0".join(texts)
+            if self._haystacks.get(user_id) == haystack:
+                return
+
+            self._remove_locked(user_id)
+            grams = text_grams(texts)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(user_id)
+            self._grams[user_id] = grams
+            self._haystacks[user_id] = haystack
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove_locked(user_id)
+
+    def on_user_change(self, user_id, old_user, new_user):
+        with self._lock:
+            if self._pending is not None:
+                self._pending[user_id] = new_user
+        if self.built:
+            self.update(user_id, new_user)
+
+    def track_changes(self):
+        """Remember changes that arrive while a rebuild is reading its copy of the users."""
+        with self._lock:
+            self._pending = {}
+
+    def rebuild(self, users_data):
+        rebuilt = UserSearchIndex()
+        for user_id, user_data in (users_data or {}).items():
+            rebuilt.update(user_id, user_data)
+
+        with self._lock:
+            pending = self._pending or {}
+            self._postings = rebuilt._postings
+            self._haystacks = rebuilt._haystacks
+            self._grams = rebuilt._grams
+            self._pending = None
+            self.built = True
+
+        for user_id, user_data in pending.items():
+            self.update(user_id, user_data)
+
+    def search(self, search_query):
+        """IDs of every user with `search_query` (already lowercased) in one of its fields."""
+        with self._lock:
+            if len(search_query) < GRAM_SIZE:
+                return {user_id for user_id, haystack in self._haystacks.items() if search_query in haystack}
+
+            postings = []
+            for gram in text_grams([search_query]):
+                posting = self._postings.get(gram)
+                if not posting:
+                    return set()
+                postings.append(posting)
+
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    return set()
+
+            return {user_id for user_id in candidates if search_query in self._haystacks[user_id]}
+
+
+user_search_index = UserSearchIndex()
+user_snapshot.subscribe(user_search_index.on_user_change)
+
+def get_user_search_index():
+    """The search index while the user mirror is live, None when callers should scan instead."""
+    if not user_snapshot.is_live():
+        return None
+
+    if not user_search_index.built:
+        user_search_index.track_changes()
+        user_search_index.rebuild(user_snapshot.get_users())
+
+    return user_search_index
+
+def order_matches(matched_ids, sorted_user_ids):
+    """Matched IDs in the same key order as the unfiltered listing."""
+    # Sorting a small match set is cheaper than walking the whole key order
+    if len(matched_ids) * 16 < len(sorted_user_ids):
+        return sorted(matched_ids)
+    return [user_id for user_id in sorted_user_ids if user_id in matched_ids]
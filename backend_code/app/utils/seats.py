@@ -0,0 +1,219 @@
+import random
+
+from firebase_admin.db import TransactionAbortedError
+from app import realtime_db
+from app.utils.batch import increment
+
+# seat type -> (booked counter, capacity field) on the event node
+SEAT_TYPES = {
+    "normal": ("booked_normal", "max_tickets"),
+    "vip": ("booked_vip", "vip_limit"),
+}
+
+class SeatUnavailableError(Exception):
+    """Every seat of the requested type is already booked."""
+
+class EventNotFoundError(Exception):
+    pass
+
+def shard_key(index):
+    # RTDB hands back children keyed 0..n as lists, so keep shard keys non-numeric
+    return f"s{index}"
+
+def split_capacity(capacity, shard_count):
+    return [capacity // shard_count + (1 if index < capacity % shard_count else 0) for index in range(shard_count)]
+
+def initial_seat_shards(event_data, shard_count):
+    """`seat_shards` node splitting each seat type's capacity across `shard_count` counters."""
+    return {
+        seat_type: {
+            shard_key(index): {"booked": 0, "capacity": capacity}
+            for index, capacity in enumerate(split_capacity(int(event_data.get(capacity_field, 0)), shard_count))
+        }
+        for seat_type, (_, capacity_field) in SEAT_TYPES.items()
+    }
+
+def booked_seats(event_data, seat_type):
+    """Seats of `seat_type` sold or held so far, summed over the shards of a sharded event."""
+    counter_field, _ = SEAT_TYPES[seat_type]
+    shards = (event_data.get("seat_shards") or {}).get(seat_type)
+    if shards:
+        return sum(int(shard.get("booked", 0)) for shard in shards.values() if isinstance(shard, dict))
+    return int(event_data.get(counter_field, 0))
+
+def seat_counts(event_data):
+    """booked_*, held_* and available_* for every seat type of an event dict.
+
+    Held seats are taken from the same counters as sold ones, booked_* only
+    reports the sold part.
+    """
+    counts = {}
+    for seat_type, (counter_field, capacity_field) in SEAT_TYPES.items():
+        taken = booked_seats(event_data, seat_type)
+        held = max(0, int(event_data.get(f"held_{seat_type}", 0) or 0))
+        counts[counter_field] = taken - held
+        counts[f"held_{seat_type}"] = held
+        counts[f"available_{seat_type}"] = int(event_data.get(capacity_field, 0)) - taken
+    return counts
+
+def seat_counter_path(event_id, seat_type, shard=None):
+    """Path of the booked counter a seat of `seat_type` is taken from, `shard` as returned by `reserve_seat`."""
+    counter_field, _ = SEAT_TYPES[seat_type]
+    if shard:
+        return f"events/{event_id}/seat_shards/{seat_type}/{shard}/booked"
+    return f"events/{event_id}/{counter_field}"
+
+def release_seat(event_id, seat_type, shard=None):
+    """Give back one seat taken by `reserve_seat`."""
+    realtime_db.update({seat_counter_path(event_id, seat_type, shard): increment(-1)})
+
+def _seat_limits(event_id):
+    """max_tickets, vip_limit and seat_shard_count of an event in one small read.
+
+    No key range of the event node holds them without rsvps or tickets in
+    between, its listing summary holds all three. Events from before the
+    summaries fall back to reading the fields one by one.
+    """
+    from app.utils.events import EVENT_SUMMARIES
+
+    summary = realtime_db.child(EVENT_SUMMARIES).child(event_id).get()
+    if isinstance(summary, dict) and all(summary.get(field) is not None for _, field in SEAT_TYPES.values()):
+        return summary
+
+    event_ref = realtime_db.child("events").child(event_id)
+    limits = {"seat_shard_count": event_ref.child("seat_shard_count").get()}
+    for _, capacity_field in SEAT_TYPES.values():
+        limits[capacity_field] = event_ref.child(capacity_field).get()
+    return limits
+
+def _take_counter_seat(capacity, count=1):
+    def take(booked):
+        booked = int(booked or 0)
+        if booked + count > capacity:
+            raise SeatUnavailableError()
+        return booked + count
+    return take
+
+def _take_shard_seat(shard):
+    if shard is None:
+        raise EventNotFoundError()
+
+    booked = int(shard.get("booked", 0))
+    if booked >= int(shard.get("capacity", 0)):
+        raise SeatUnavailableError()
+    return dict(shard, booked=booked + 1)
+
+def reserve_seat(event_id, seat_type):
+    """Take one seat of `seat_type` inside an RTDB transaction.
+
+    The capacity check runs inside the transaction, so concurrent bookings are
+    retried against the latest count instead of overwriting each other. Sharded
+    events start at a random shard and move on to the next one when it is full.
+    Returns the shard key the seat came from, or None for an unsharded event.
+    Raises EventNotFoundError, SeatUnavailableError, or TransactionAbortedError
+    when the counter stayed too contended to commit.
+    """
+    counter_field, capacity_field = SEAT_TYPES[seat_type]
+    event_ref = realtime_db.child("events").child(event_id)
+
+    limits = _seat_limits(event_id)
+    shard_count = limits.get("seat_shard_count")
+    if shard_count:
+        shards_ref = event_ref.child("seat_shards").child(seat_type)
+        first = random.randrange(int(shard_count))
+        aborted = None
+        for offset in range(int(shard_count)):
+            key = shard_key((first + offset) % int(shard_count))
+            try:
+                shards_ref.child(key).transaction(_take_shard_seat)
+                return key
+            except SeatUnavailableError:
+                continue
+            except TransactionAbortedError as e:
+                aborted = e
+        # Only report sold out when every shard said so
+        if aborted is not None:
+            raise aborted
+        raise SeatUnavailableError()
+
+    capacity = limits.get(capacity_field)
+    if capacity is None:
+        raise EventNotFoundError()
+
+    event_ref.child(counter_field).transaction(_take_counter_seat(int(capacity)))
+    return None
+
+def _take_shard_seats(count, taken):
+    """Transaction function taking up to `count` seats from one shard, records how many in `taken`."""
+    def take(shard):
+        taken.clear()
+        if shard is None:
+            raise EventNotFoundError()
+
+        booked = int(shard.get("booked", 0))
+        free = int(shard.get("capacity", 0)) - booked
+        if free <= 0:
+            raise SeatUnavailableError()
+        taken.append(min(count, free))
+        return dict(shard, booked=booked + taken[0])
+    return take
+
+def reserve_seats(event_id, counts):
+    """Take `counts[seat_type]` seats of every seat type, all of them or none.
+
+    Each seat type is taken in one transaction on its counter (one per shard
+    it draws from on a sharded event). When a later seat type can't be
+    filled, the seats already taken are handed back before the error is
+    raised. Returns {seat_type: [shard key or None, one per seat]}, raises
+    the same errors as `reserve_seat`.
+    """
+    event_ref = realtime_db.child("events").child(event_id)
+    limits = _seat_limits(event_id)
+    shard_count = limits.get("seat_shard_count")
+
+    taken = {}
+    seats = {}
+    try:
+        for seat_type, count in counts.items():
+            if count <= 0:
+                continue
+            counter_field, capacity_field = SEAT_TYPES[seat_type]
+
+            if not shard_count:
+                capacity = limits.get(capacity_field)
+                if capacity is None:
+                    raise EventNotFoundError()
+                event_ref.child(counter_field).transaction(_take_counter_seat(int(capacity), count))
+                taken[f"events/{event_id}/{counter_field}"] = count
+                seats[seat_type] = [None] * count
+                continue
+
+            shards_ref = event_ref.child("seat_shards").child(seat_type)
+            first = random.randrange(int(shard_count))
+            remaining = count
+            aborted = None
+            seats[seat_type] = []
+            for offset in range(int(shard_count)):
+                if not remaining:
+                    break
+                key = shard_key((first + offset) % int(shard_count))
+                shard_taken = []
+                try:
+                    shards_ref.child(key).transaction(_take_shard_seats(remaining, shard_taken))
+                except SeatUnavailableError:
+                    continue
+                except TransactionAbortedError as e:
+                    aborted = e
+                    continue
+                taken[f"events/{event_id}/seat_shards/{seat_type}/{key}/booked"] = shard_taken[0]
+                seats[seat_type] += [key] * shard_taken[0]
+                remaining -= shard_taken[0]
+
+            if remaining:
+                raise aborted if aborted is not None else SeatUnavailableError()
+    except Exception:
+        if taken:
+            realtime_db.update({path: increment(-count) for path, count in taken.items()})
+        raise
+
+    return seats
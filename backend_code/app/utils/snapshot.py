@@ -0,0 +1,262 @@
+import sys
+import threading
+import time
+
+from types import MappingProxyType
+from app import realtime_db
+
+# Profile values this short (gender, height, income bands, hobbies...) repeat
+# across users, the mirror keeps one shared copy of each. Longer strings are
+# mostly unique, interning them would only cost memory.
+SHARED_STRING_LENGTH = 16
+
+class UserSnapshot:
+    """In-process mirror of the `/users` tree kept current by a listen() stream.
+
+    The first event delivered by `listen()` is a put of the whole tree. Each
+    later put/patch event is applied to a copy of the top-level dict, which
+    then replaces the published one, and user dicts are replaced rather than
+    mutated. `get_users()` hands out the published dict without copying it,
+    and it never changes underneath the handler that is reading it. A
+    listener that is down is restarted from a background thread with
+    backoff, requests fall back to a direct fetch meanwhile.
+    """
+
+    def __init__(self, users_ref, load_timeout=10, retry_delay=1, max_retry_delay=60):
+        self.users_ref = users_ref
+        self.load_timeout = load_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._users = {}
+        self._registration = None
+        self._listeners = []
+        self._loaded_at = None
+        self._last_event_at = None
+        self._version = 0
+        self._membership_version = 0
+        self._sorted_ids = None
+        self._error = None
+        self._restart_lock = threading.Lock()
+        self._restarter = None
+
+    def start(self):
+        with self._start_lock:
+            # Still loading or already live, don't stack up another listener
+            if self._registration is not None and self._is_thread_alive():
+                return
+
+            self._loaded.clear()
+            self._error = None
+            try:
+                self._registration = self.users_ref.listen(self._on_event)
+            except Exception as e:
+                print(f"Error starting users listener: {e}")
+                self._registration = None
+                self._error = str(e)
+                return
+
+        self._loaded.wait(self.load_timeout)
+
+    def restart(self):
+        """Start the listener from a background thread, so no request waits on it to load."""
+        with self._restart_lock:
+            if self._restarter is not None and self._restarter.is_alive():
+                return
+            self._restarter = threading.Thread(target=self._keep_starting, name="users-listener-restart", daemon=True)
+            self._restarter.start()
+
+    def _keep_starting(self):
+        delay = self.retry_delay
+        while not self.is_live():
+            self.start()
+            if self.is_live():
+                return
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    def stop(self):
+        registration = self._registration
+        self._registration = None
+        if registration is not None:
+            registration.close()
+
+    def _is_thread_alive(self):
+        thread = getattr(self._registration, "_thread", None)
+        return thread is None or thread.is_alive()
+
+    def is_live(self):
+        return self._registration is not None and self._loaded.is_set() and self._is_thread_alive()
+
+    def staleness(self):
+        """Seconds since the mirror last heard from the database, or None if never loaded."""
+        last_sync = self._last_event_at or self._loaded_at
+        if last_sync is None:
+            return None
+        return time.time() - last_sync
+
+    def status(self):
+        return {
+            "live": self.is_live(),
+            "loaded_at": self._loaded_at,
+            "last_event_at": self._last_event_at,
+            "staleness_seconds": self.staleness(),
+            "user_count": len(self._users),
+            "version": self._version,
+            "restarting": self._restarter is not None and self._restarter.is_alive(),
+            "error": self._error
+        }
+
+    @property
+    def version(self):
+        return self._version
+
+    def subscribe(self, callback):
+        """Register `callback(user_id, old_user, new_user)` to be called for every changed user."""
+        self._listeners.append(callback)
+
+    def get_users(self):
+        """Read-only view of `/users`, or None when the tree is empty.
+
+        Falls back to a direct `users_ref.get()` when the stream is down.
+        """
+        if not self.is_live():
+            self.restart()
+            print("Users listener is down, falling back to a direct fetch")
+            users_data = self.users_ref.get()
+            return MappingProxyType(users_data) if users_data else None
+
+        # Published dicts are never modified, no copy needed
+        users_data = self._users
+        return MappingProxyType(users_data) if users_data else None
+
+    def get_user(self, user_id):
+        if not self.is_live():
+            self.restart()
+            return self.users_ref.child(user_id).get()
+        return self._users.get(user_id)
+
+    def sorted_user_ids(self, users_data):
+        """IDs of every user profile in `users_data` (a `get_users()` view) in key order.
+
+        While the mirror is live the order is cached until a user is added or
+        removed, so paging through it doesn't re-sort on every request.
+        """
+        if not self.is_live():
+            return sorted(user_id for user_id, user_data in (users_data or {}).items() if isinstance(user_data, dict))
+
+        with self._lock:
+            if self._sorted_ids is None or self._sorted_ids[0] != self._membership_version:
+                user_ids = sorted(user_id for user_id, user_data in self._users.items() if isinstance(user_data, dict))
+                self._sorted_ids = (self._membership_version, user_ids)
+            return self._sorted_ids[1]
+
+    def _on_event(self, event):
+        if event.event_type == "put":
+            puts = [(event.path, event.data)]
+        elif event.event_type == "patch":
+            puts = [(f"{event.path.rstrip('/')}/{key}", value) for key, value in (event.data or {}).items()]
+        else:
+            return
+
+        try:
+            changes = self._apply_puts(puts)
+        except Exception as e:
+            print(f"Error applying users event at {event.path}: {e}")
+            self._error = str(e)
+            return
+
+        now = time.time()
+        if not self._loaded.is_set():
+            self._loaded_at = now
+            self._loaded.set()
+        else:
+            self._last_event_at = now
+
+        for user_id, old_user, new_user in changes:
+            for callback in self._listeners:
+                try:
+                    callback(user_id, old_user, new_user)
+                except Exception as e:
+                    print(f"Error in users listener for user {user_id}: {e}")
+
+    def _apply_puts(self, puts):
+        """Apply (path, data) puts to a copy of the mirror and publish it, returns the changed users."""
+        changes = []
+        with self._lock:
+            users = None
+            for path, data in puts:
+                segments = [segment for segment in path.split("/") if segment]
+                data = _share_strings(data)
+                self._version += 1
+
+                if not segments:
+                    self._membership_version += 1
+                    old_users = self._users if users is None else users
+                    users = data if isinstance(data, dict) else {}
+                    changes.extend(
+                        (user_id, old_users.get(user_id), users.get(user_id))
+                        for user_id in set(old_users) | set(users)
+                        if old_users.get(user_id) is not users.get(user_id)
+                    )
+                    continue
+
+                if users is None:
+                    users = dict(self._users)
+
+                user_id = segments[0]
+                old_user = users.get(user_id)
+                new_user = _set_path(old_user, segments[1:], data)
+
+                if isinstance(new_user, dict) != isinstance(old_user, dict):
+                    self._membership_version += 1
+
+                if new_user is None:
+                    users.pop(user_id, None)
+                else:
+                    users[user_id] = new_user
+                changes.append((user_id, old_user, new_user))
+
+            if users is not None:
+                self._users = users
+        return changes
+
+def _share_strings(value):
+    """`value` with every short string replaced by its interned copy."""
+    if isinstance(value, str):
+        return sys.intern(value) if len(value) <= SHARED_STRING_LENGTH else value
+    if isinstance(value, dict):
+        return {key: _share_strings(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_share_strings(item) for item in value]
+    return value
+
+def _set_path(node, segments, value):
+    """Copy-on-write equivalent of setting `value` at `segments` below `node`."""
+    if not segments:
+        return value
+
+    # RTDB hands back children with sequential integer keys as lists
+    if isinstance(node, list) and segments[0].isdigit():
+        index = int(segments[0])
+        updated = list(node) + [None] * max(0, index + 1 - len(node))
+        updated[index] = _set_path(updated[index], segments[1:], value)
+        while updated and updated[-1] is None:
+            updated.pop()
+        return updated or None
+
+    updated = dict(node) if isinstance(node, dict) else {}
+    child = _set_path(updated.get(segments[0]), segments[1:], value)
+
+    if child is None:
+        updated.pop(segments[0], None)
+    else:
+        updated[segments[0]] = child
+
+    return updated or None
+
+
+user_snapshot = UserSnapshot(realtime_db.child('users'))
@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+import zlib
+
+from flask import Response, request, stream_with_context
+
+def batched_lines(lines, batch_size=500):
+    """Join lines into bigger chunks so a large export isn't written a few bytes at a time."""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, separators=(",", ":")) + "\n"
+
+def csv_lines(fields, records):
+    """Header row, then one row per record, each written through a reused buffer."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def row(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield row(fields)
+    for record in records:
+        yield row([record.get(field) for field in fields])
+
+def json_object_chunks(header, key, items):
+    """A JSON object whose `key` member is a mapping streamed one item at a time."""
+    prefix = json.dumps(header, separators=(",", ":"))[:-1]
+    yield f'{prefix},"{key}":{{' if header else f'{{"{key}":{{'
+
+    first = True
+    for item_key, value in items:
+        separator = "" if first else ","
+        first = False
+        yield f"{separator}{json.dumps(str(item_key))}:{json.dumps(value, separators=(',', ':'))}"
+
+    yield "}}"
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode("utf-8"))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def streamed_response(chunks, mimetype):
+    """Chunked response, gzip-compressed on the fly when the client accepts it."""
+    headers = {"Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+def sse_event(data, event_id=None, event=None):
+    """One Server-Sent Events frame carrying `data` as JSON."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
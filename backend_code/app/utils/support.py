@@ -0,0 +1,226 @@
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from app import realtime_db
+from app.utils.batch import BatchWriter, increment, summarize_report
+from app.utils.bookings import iter_children
+from app.utils.listing import list_newest
+
+# supportTicketSummaries/<ticketId> holds what the inbox shows of a ticket,
+# without its messages. status_activity is "<status>|<last_activity>", so one
+# status is a single index range already ordered by last activity.
+SUPPORT_TICKET_SUMMARIES = "supportTicketSummaries"
+
+# userTickets/<userId>/<ticketId> = true for each ticket a user opened, so
+# their tickets are found without reading all of supportTickets
+USER_TICKETS = "userTickets"
+
+NO_MESSAGES = "No messages yet"
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+_push_lock = threading.Lock()
+_last_push = {"ms": None, "random": None}
+
+def push_key(now=None):
+    """Chronologically ordered key in the format of `Reference.push()`, made without a round trip."""
+    with _push_lock:
+        ms = int((time.time() if now is None else now) * 1000)
+        if ms == _last_push["ms"]:
+            # Same millisecond, bump the random part so keys stay ordered
+            digits = _last_push["random"]
+            for index in range(len(digits) - 1, -1, -1):
+                if digits[index] < 63:
+                    digits[index] += 1
+                    break
+                digits[index] = 0
+        else:
+            digits = [random.randrange(64) for _ in range(12)]
+        _last_push["ms"] = ms
+        _last_push["random"] = digits
+
+    stamp = []
+    for _ in range(8):
+        stamp.append(PUSH_CHARS[ms % 64])
+        ms //= 64
+    return "".join(reversed(stamp)) + "".join(PUSH_CHARS[digit] for digit in digits)
+
+def messages_since(ticket_id, since=None):
+    """Messages of a ticket keyed after `since` (a message key), everything without it."""
+    messages_ref = realtime_db.child("supportTickets").child(ticket_id).child("messages")
+    if not since:
+        return messages_ref.get() or {}
+
+    # Push keys sort by creation time, so this is one key range read
+    messages = messages_ref.order_by_key().start_at(since).get() or {}
+    return {key: message for key, message in messages.items() if key != since}
+
+def message_page(ticket_id, limit, before=None):
+    """The `limit` messages keyed before `before` (newest when not given), oldest first, plus the next cursor.
+
+    The cursor is the key of the oldest message returned, None once the
+    start of the conversation is reached.
+    """
+    query = realtime_db.child("supportTickets").child(ticket_id).child("messages").order_by_key()
+    if before:
+        # end_at includes `before` itself, read one more and drop it
+        query = query.end_at(before)
+    page = query.limit_to_last(limit + 2 if before else limit + 1).get() or {}
+
+    messages = [(key, message) for key, message in sorted(page.items()) if key != before]
+    more = len(messages) > limit
+    messages = messages[-limit:]
+    return messages, messages[0][0] if more else None
+
+MESSAGE_FIELDS = ["id", "sender", "sender_type", "text", "timestamp"]
+
+def compact_messages(messages):
+    """(key, message) pairs as rows of MESSAGE_FIELDS values, so field names aren't repeated per message."""
+    return [
+        [key] + [message.get(field) for field in MESSAGE_FIELDS[1:]]
+        for key, message in messages if isinstance(message, dict)
+    ]
+
+def message_preview(text):
+    return (text or "")[:50] + "..."
+
+def status_activity(status, last_activity):
+    return f"{status}|{last_activity or ''}"
+
+def ticket_summary(ticket_id, ticket):
+    """Summary of a full ticket, messages included."""
+    messages = ticket.get("messages") or {}
+    if not isinstance(messages, dict):
+        messages = {}
+    messages = [message for message in messages.values() if isinstance(message, dict)]
+    last_message = max(messages, key=lambda message: message.get("timestamp", "")) if messages else None
+
+    summary = {
+        "ticket_id": ticket_id,
+        "created_by": ticket.get("created_by"),
+        "created_at": ticket.get("created_at"),
+        "status": ticket.get("status", "open"),
+        "message_count": len(messages),
+        "last_message": message_preview(last_message.get("text")) if last_message else NO_MESSAGES,
+        "last_activity": ticket.get("last_activity") or ticket.get("created_at")
+    }
+    summary["status_activity"] = status_activity(summary["status"], summary["last_activity"])
+    return summary
+
+def current_summary(ticket_id):
+    """(summary, stored) for a ticket, (None, False) when it doesn't exist.
+
+    Tickets from before the summaries get theirs built from the full ticket
+    once, `stored` is False then and the caller writes it whole.
+    """
+    summary = realtime_db.child(SUPPORT_TICKET_SUMMARIES).child(ticket_id).get()
+    if summary:
+        return summary, True
+
+    ticket = realtime_db.child("supportTickets").child(ticket_id).get()
+    if not ticket:
+        return None, False
+    return ticket_summary(ticket_id, ticket), False
+
+def summary_update_writes(ticket_id, summary, stored, values, new_messages=0):
+    """Multi-location update entries applying `values` and `new_messages` to a ticket's summary."""
+    values = dict(values)
+    if "status" in values or "last_activity" in values:
+        values["status_activity"] = status_activity(
+            values.get("status", summary.get("status")),
+            values.get("last_activity", summary.get("last_activity"))
+        )
+
+    path = f"{SUPPORT_TICKET_SUMMARIES}/{ticket_id}"
+    if not stored:
+        return {path: {**summary, **values, "message_count": summary.get("message_count", 0) + new_messages}}
+
+    writes = {f"{path}/{key}": value for key, value in values.items()}
+    if new_messages:
+        writes[f"{path}/message_count"] = increment(new_messages)
+    return writes
+
+def rebuild_ticket_summaries(page_size=100, chunk_size=None):
+    """Rewrite supportTicketSummaries from supportTickets, one page of tickets at a time."""
+    writer = BatchWriter(chunk_size=chunk_size)
+    seen = set()
+    for ticket_id, ticket in iter_children(realtime_db.child("supportTickets"), page_size):
+        if isinstance(ticket, dict) and ticket:
+            writer.set(f"{SUPPORT_TICKET_SUMMARIES}/{ticket_id}", ticket_summary(ticket_id, ticket))
+            seen.add(ticket_id)
+
+    for ticket_id in realtime_db.child(SUPPORT_TICKET_SUMMARIES).get(shallow=True) or {}:
+        if ticket_id not in seen:
+            writer.delete(f"{SUPPORT_TICKET_SUMMARIES}/{ticket_id}")
+
+    return {"tickets": len(seen), "writes": summarize_report(writer.flush())}
+
+def user_tickets(user_id, workers=8):
+    """Summaries of the user's tickets from the userTickets index, most recent activity first."""
+    ticket_ids = list(realtime_db.child(USER_TICKETS).child(user_id).get(shallow=True) or {})
+    if len(ticket_ids) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(ticket_ids))) as executor:
+            summaries = list(executor.map(lambda ticket_id: current_summary(ticket_id)[0], ticket_ids))
+    else:
+        summaries = [current_summary(ticket_id)[0] for ticket_id in ticket_ids]
+
+    # Skips index entries left behind by a ticket that is gone
+    tickets = [dict(summary, ticket_id=ticket_id) for ticket_id, summary in zip(ticket_ids, summaries) if summary]
+    for ticket in tickets:
+        ticket.pop("status_activity", None)
+    tickets.sort(key=lambda ticket: ticket.get("last_activity") or "", reverse=True)
+    return tickets
+
+def rebuild_user_ticket_index(page_size=100, chunk_size=None):
+    """Write the missing userTickets entries from supportTickets and drop the stale ones."""
+    expected = set()
+    for ticket_id, ticket in iter_children(realtime_db.child("supportTickets"), page_size):
+        if isinstance(ticket, dict) and ticket.get("created_by"):
+            expected.add((str(ticket["created_by"]), ticket_id))
+
+    indexed = set()
+    for user_id, entries in (realtime_db.child(USER_TICKETS).get() or {}).items():
+        if isinstance(entries, dict):
+            indexed.update((user_id, ticket_id) for ticket_id in entries)
+
+    writer = BatchWriter(chunk_size=chunk_size)
+    for user_id, ticket_id in expected - indexed:
+        writer.set(f"{USER_TICKETS}/{user_id}/{ticket_id}", True)
+    for user_id, ticket_id in indexed - expected:
+        writer.delete(f"{USER_TICKETS}/{user_id}/{ticket_id}")
+
+    return {
+        "tickets": len(expected),
+        "written": len(expected - indexed),
+        "deleted": len(indexed - expected),
+        "writes": summarize_report(writer.flush())
+    }
+
+def inbox(status=None, limit=None, cursor=None):
+    """Ticket summaries, most recent activity first, paged when `limit` is given."""
+    ref = realtime_db.child(SUPPORT_TICKET_SUMMARIES)
+    prefix = status_activity(status, "") if status else ""
+
+    if limit is not None:
+        order_child = "status_activity" if status else "last_activity"
+        tickets, next_cursor = list_newest(ref, order_child, limit, cursor=cursor, id_field="ticket_id", prefix=prefix)
+    else:
+        try:
+            query = ref.order_by_child("status_activity").start_at(prefix).end_at(prefix + "~") if status else ref
+            summaries = query.get() or {}
+        except Exception as e:
+            print(f"Error querying ticket summaries by status, filtering locally: {e}")
+            summaries = ref.get() or {}
+
+        tickets = [
+            dict(summary, ticket_id=ticket_id) for ticket_id, summary in summaries.items()
+            if isinstance(summary, dict) and (not status or summary.get("status") == status)
+        ]
+        tickets.sort(key=lambda ticket: ticket.get("last_activity") or "", reverse=True)
+        next_cursor = None
+
+    for ticket in tickets:
+        ticket.pop("status_activity", None)
+    return tickets, next_cursor
@@ -0,0 +1,286 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app import bucket, realtime_db
+from app.config import SUPPORT_ARCHIVE_STORE
+from app.utils.batch import BatchWriter, summarize_report
+from app.utils.support import SUPPORT_TICKET_SUMMARIES, USER_TICKETS, status_activity, ticket_summary
+
+class TicketChangedError(Exception):
+    pass
+
+class ArchiveInProgressError(Exception):
+    pass
+
+class LocalArchiveStore:
+    """Archive files under a directory on local disk."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, name):
+        return os.path.join(self.root, *name.split("/"))
+
+    def read(self, name, start=None, length=None):
+        try:
+            with open(self._path(name), "rb") as f:
+                if start is None:
+                    return f.read()
+                f.seek(start)
+                return f.read(length)
+        except FileNotFoundError:
+            return None
+
+    def write(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers only ever see the old file or the whole new one
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+class BucketArchiveStore:
+    """Archive files under a prefix of the storage bucket."""
+
+    def __init__(self, bucket, prefix):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def read(self, name, start=None, length=None):
+        from google.api_core.exceptions import NotFound
+
+        blob = self.bucket.blob(f"{self.prefix}/{name}")
+        try:
+            if start is None:
+                return blob.download_as_bytes()
+            return blob.download_as_bytes(start=start, end=start + length - 1)
+        except NotFound:
+            return None
+
+    def write(self, name, data):
+        self.bucket.blob(f"{self.prefix}/{name}").upload_from_string(data)
+
+def archive_store(spec):
+    """Store for SUPPORT_ARCHIVE_STORE, "bucket:<prefix>" or "local:<directory>"."""
+    kind, _, location = spec.partition(":")
+    if kind == "bucket":
+        return BucketArchiveStore(bucket, location or "support_archive")
+    return LocalArchiveStore(location or "support_archive")
+
+class TicketArchive:
+    """Closed support tickets moved out of the realtime database.
+
+    `archive()` writes tickets closed before a cutoff to gzip JSON-lines
+    segments at segments/<day closed>/<run>.jsonl.gz, one segment per day
+    and run, and only then deletes them from supportTickets, the summaries
+    and userTickets. Each ticket is its own gzip member, so a segment
+    still reads as one JSON-lines file, while index/<2 hex of sha1(id)>.json
+    keeps each ticket's segment, offset and length and `get()` reads just
+    that member. Runs are serialized per process, run the job from one place.
+    Summaries that disagree with their ticket are rewritten from it, so they
+    don't come back as candidates on every run.
+    """
+
+    def __init__(self, store, workers=8):
+        self.store = store
+        self.workers = workers
+        self._run_lock = threading.Lock()
+        # Only around index read-modify-writes, forget() never waits out a run
+        self._index_lock = threading.Lock()
+
+    def _index_name(self, ticket_id):
+        return f"index/{hashlib.sha1(ticket_id.encode('utf-8')).hexdigest()[:2]}.json"
+
+    def _read_index(self, name):
+        data = self.store.read(name)
+        return json.loads(data) if data else {}
+
+    def _write_index(self, name, entries):
+        self.store.write(name, json.dumps(entries, separators=(",", ":")).encode("utf-8"))
+
+    def _update_index(self, added=None, removed=()):
+        """Apply `added` entries and drop `removed` ticket IDs, one read and write per index shard."""
+        shards = {}
+        for ticket_id, entry in (added or {}).items():
+            shards.setdefault(self._index_name(ticket_id), ({}, set()))[0][ticket_id] = entry
+        for ticket_id in removed:
+            shards.setdefault(self._index_name(ticket_id), ({}, set()))[1].add(ticket_id)
+
+        for name, (shard_added, shard_removed) in shards.items():
+            with self._index_lock:
+                entries = self._read_index(name)
+                entries.update(shard_added)
+                for ticket_id in shard_removed:
+                    entries.pop(ticket_id, None)
+                self._write_index(name, entries)
+
+    def get(self, ticket_id):
+        """The archived ticket, None when it isn't in the archive."""
+        entry = self._read_index(self._index_name(ticket_id)).get(ticket_id)
+        if not entry:
+            return None
+        member = self.store.read(entry["segment"], entry["offset"], entry["length"])
+        if not member:
+            return None
+        return json.loads(gzip.decompress(member))["ticket"]
+
+    def forget(self, ticket_id):
+        """Drop a ticket from the index, returns whether it was archived."""
+        with self._index_lock:
+            name = self._index_name(ticket_id)
+            entries = self._read_index(name)
+            if entries.pop(ticket_id, None) is None:
+                return False
+            self._write_index(name, entries)
+            return True
+
+    def _candidates(self, cutoff, limit):
+        """Summaries of up to `limit` tickets closed with last activity before `cutoff`, by ticket ID."""
+        ref = realtime_db.child(SUPPORT_TICKET_SUMMARIES)
+        try:
+            summaries = (
+                ref.order_by_child("status_activity")
+                .start_at(status_activity("closed", ""))
+                .end_at(status_activity("closed", cutoff))
+                .limit_to_first(limit)
+                .get() or {}
+            )
+        except Exception as e:
+            print(f"Error querying closed ticket summaries, filtering locally: {e}")
+            summaries = {
+                ticket_id: summary for ticket_id, summary in (ref.get() or {}).items()
+                if isinstance(summary, dict) and summary.get("status") == "closed"
+                and (summary.get("last_activity") or "") <= cutoff
+            }
+        return dict(list(summaries.items())[:limit])
+
+    def _repair_summary(self, ticket_id, stale, ticket):
+        """Rewrite a summary from its ticket (or drop it), unless it changed since it was read."""
+        def repair(summary):
+            if summary != stale:
+                raise TicketChangedError()
+            return ticket_summary(ticket_id, ticket) if isinstance(ticket, dict) else None
+
+        try:
+            realtime_db.child(SUPPORT_TICKET_SUMMARIES).child(ticket_id).transaction(repair)
+            return True
+        except TicketChangedError:
+            return False
+        except Exception as e:
+            print(f"Error repairing summary of ticket {ticket_id}: {e}")
+            return False
+
+    def _delete_hot(self, ticket_id, last_activity):
+        """Delete the ticket unless it changed since it was archived, returns whether it did."""
+        def delete(ticket):
+            # Deleted meanwhile counts as changed, its archived copy must go too
+            if ticket is None or ticket.get("status") != "closed" or ticket.get("last_activity") != last_activity:
+                raise TicketChangedError()
+            return None
+
+        try:
+            realtime_db.child("supportTickets").child(ticket_id).transaction(delete)
+            return True
+        except TicketChangedError:
+            return False
+        except Exception as e:
+            print(f"Error deleting archived ticket {ticket_id}: {e}")
+            return False
+
+    def archive(self, max_age_days, limit=1000, now=None, chunk_size=None):
+        """Move up to `limit` tickets closed more than `max_age_days` ago into the archive."""
+        if not self._run_lock.acquire(blocking=False):
+            raise ArchiveInProgressError("An archive run is already in progress")
+        try:
+            return self._archive(max_age_days, limit, now, chunk_size)
+        finally:
+            self._run_lock.release()
+
+    def _archive(self, max_age_days, limit, now, chunk_size):
+        cutoff = ((now or datetime.utcnow()) - timedelta(days=max_age_days)).isoformat()
+        summaries = self._candidates(cutoff, limit)
+        ticket_ids = list(summaries)
+        if not ticket_ids:
+            return {"archived": 0, "skipped": 0, "repaired": 0, "segments": [], "cutoff": cutoff}
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(ticket_ids))) as executor:
+            tickets = list(executor.map(lambda ticket_id: realtime_db.child("supportTickets").child(ticket_id).get(), ticket_ids))
+
+        # Summaries can lag behind, the full ticket decides
+        closed = {
+            ticket_id: ticket for ticket_id, ticket in zip(ticket_ids, tickets)
+            if isinstance(ticket, dict) and ticket.get("status") == "closed"
+            and (ticket.get("last_activity") or ticket.get("created_at") or "") <= cutoff
+        }
+
+        # Stale summaries would fill the next run's window again
+        stale = [(ticket_id, ticket) for ticket_id, ticket in zip(ticket_ids, tickets) if ticket_id not in closed]
+        repaired = 0
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(stale))) as executor:
+                repaired = sum(executor.map(
+                    lambda item: self._repair_summary(item[0], summaries[item[0]], item[1]), stale
+                ))
+
+        if not closed:
+            return {"archived": 0, "skipped": len(ticket_ids), "repaired": repaired, "segments": [], "cutoff": cutoff}
+
+        by_day = {}
+        for ticket_id, ticket in closed.items():
+            day = (ticket.get("last_activity") or ticket.get("created_at") or "undated")[:10]
+            by_day.setdefault(day, []).append(ticket_id)
+
+        run_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        entries = {}
+        segments = []
+        for day, day_ticket_ids in sorted(by_day.items()):
+            name = f"segments/{day}/{run_id}.jsonl.gz"
+            members = []
+            offset = 0
+            for ticket_id in sorted(day_ticket_ids):
+                line = json.dumps({"ticket_id": ticket_id, "ticket": closed[ticket_id]}, separators=(",", ":")) + "\n"
+                member = gzip.compress(line.encode("utf-8"))
+                members.append(member)
+                entries[ticket_id] = {"segment": name, "offset": offset, "length": len(member), "closed": day}
+                offset += len(member)
+            self.store.write(name, b"".join(members))
+            segments.append({"segment": name, "tickets": len(day_ticket_ids), "bytes": offset})
+
+        # Indexed before the hot copies go, so every ticket stays reachable
+        self._update_index(added=entries)
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(closed))) as executor:
+            deleted = list(executor.map(
+                lambda ticket_id: self._delete_hot(ticket_id, closed[ticket_id].get("last_activity")),
+                list(closed)
+            ))
+        moved = [ticket_id for ticket_id, ok in zip(closed, deleted) if ok]
+        changed = [ticket_id for ticket_id, ok in zip(closed, deleted) if not ok]
+        if changed:
+            self._update_index(removed=changed)
+
+        writer = BatchWriter(chunk_size=chunk_size)
+        for ticket_id in moved:
+            writer.delete(f"{SUPPORT_TICKET_SUMMARIES}/{ticket_id}")
+            if closed[ticket_id].get("created_by"):
+                writer.delete(f"{USER_TICKETS}/{closed[ticket_id]['created_by']}/{ticket_id}")
+
+        return {
+            "archived": len(moved),
+            "skipped": len(ticket_ids) - len(moved),
+            "repaired": repaired,
+            "segments": segments,
+            "cutoff": cutoff,
+            "writes": summarize_report(writer.flush())
+        }
+
+
+support_archive = TicketArchive(archive_store(SUPPORT_ARCHIVE_STORE))
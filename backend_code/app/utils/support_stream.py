@@ -0,0 +1,136 @@
+import queue
+import threading
+
+from app import realtime_db
+from app.utils.support import messages_since
+
+class _Channel:
+    def __init__(self):
+        self.registration = None
+        self.starting = False
+        self.subscribers = set()
+        self.messages = {}
+        self.ready = threading.Event()
+        self.close_timer = None
+
+class SupportMessageHub:
+    """Fans new support chat messages out to every connected client.
+
+    The first subscriber of a ticket starts one `listen()` on its messages
+    and every later subscriber shares it. The listener's first event carries
+    the whole conversation, which stays in memory, so reconnecting clients
+    get what they missed from there instead of from the database. New
+    messages arrive as single-path events and go on each subscriber's queue
+    as (key, message). The listener is closed `linger` seconds after the
+    last subscriber left, so a client reconnecting right away finds it open.
+    """
+
+    def __init__(self, linger=30):
+        self.linger = linger
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, ticket_id):
+        subscriber = queue.Queue()
+        with self._lock:
+            channel = self._channels.get(ticket_id)
+            if channel is None:
+                channel = self._channels[ticket_id] = _Channel()
+            if channel.close_timer is not None:
+                channel.close_timer.cancel()
+                channel.close_timer = None
+            channel.subscribers.add(subscriber)
+            start = channel.registration is None and not channel.starting
+            channel.starting = channel.starting or start
+
+        if start:
+            try:
+                registration = self._messages_ref(ticket_id).listen(lambda event: self._on_event(ticket_id, channel, event))
+            except Exception:
+                with self._lock:
+                    channel.starting = False
+                self.unsubscribe(ticket_id, subscriber)
+                raise
+            with self._lock:
+                channel.registration = registration
+                channel.starting = False
+        return subscriber
+
+    def unsubscribe(self, ticket_id, subscriber):
+        with self._lock:
+            channel = self._channels.get(ticket_id)
+            if channel is None:
+                return
+            channel.subscribers.discard(subscriber)
+            if channel.subscribers or channel.close_timer is not None:
+                return
+            channel.close_timer = threading.Timer(self.linger, self._close, args=(ticket_id, channel))
+            channel.close_timer.daemon = True
+            channel.close_timer.start()
+
+    def _close(self, ticket_id, channel):
+        with self._lock:
+            if channel.subscribers or self._channels.get(ticket_id) is not channel:
+                return
+            del self._channels[ticket_id]
+        if channel.registration is not None:
+            channel.registration.close()
+
+    def _messages_ref(self, ticket_id):
+        return realtime_db.child("supportTickets").child(ticket_id).child("messages")
+
+    def backlog(self, ticket_id, since=None, timeout=5):
+        """(key, message) pairs after `since` in key order, from memory once the listener is up."""
+        with self._lock:
+            channel = self._channels.get(ticket_id)
+        if channel is not None and channel.ready.wait(timeout):
+            with self._lock:
+                messages = dict(channel.messages)
+            return [(key, messages[key]) for key in sorted(messages) if since is None or key > since]
+        return list(messages_since(ticket_id, since).items())
+
+    def _on_event(self, ticket_id, channel, event):
+        path = event.path.strip("/")
+        data = event.data
+
+        with self._lock:
+            if not path:
+                children = data if isinstance(data, dict) else {}
+                if event.event_type == "put":
+                    # Initial snapshot, or a fresh one after the SDK reconnected
+                    known = channel.messages if channel.ready.is_set() else children
+                    channel.messages = dict(children)
+                    channel.ready.set()
+                else:
+                    known = dict(channel.messages)
+                    channel.messages.update(children)
+                new = [(key, message) for key, message in sorted(children.items()) if key not in known]
+            elif "/" not in path:
+                # One message written (or removed) at messages/<key>
+                known = path in channel.messages
+                if data is None:
+                    channel.messages.pop(path, None)
+                    new = []
+                else:
+                    channel.messages[path] = data
+                    new = [] if known else [(path, data)]
+            else:
+                return
+
+            new = [(key, message) for key, message in new if isinstance(message, dict)]
+            subscribers = list(channel.subscribers)
+
+        for key, message in new:
+            for subscriber in subscribers:
+                subscriber.put((key, message))
+
+    def status(self):
+        with self._lock:
+            return {
+                "tickets": len(self._channels),
+                "subscribers": sum(len(channel.subscribers) for channel in self._channels.values()),
+                "listening": sum(1 for channel in self._channels.values() if channel.registration is not None)
+            }
+
+
+support_message_hub = SupportMessageHub()
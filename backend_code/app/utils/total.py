@@ -1,8 +1,13 @@
 import os
 import math
+import numpy as np
 import xml.etree.ElementTree as ET
 
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from app.utils.snapshot import user_snapshot
 
 def haversine(lat1, lon1, lat2, lon2):
     R = 6371
@@ -34,29 +39,60 @@ def parse_kml(file_path):
 
   return locations
 
-def get_closest_city(user_lat, user_lon):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    cities_dir = os.path.join(base_dir, "../../assets/Cities.kml")
+CITIES_KML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../assets/Cities.kml")
 
-    cities = parse_kml(cities_dir)
-    all_locations = [loc for loc in cities if isinstance(loc.get("name"), str) and loc["name"].isalpha()]
+def to_unit_vectors(lats, lons):
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lats = np.cos(lats)
+    return np.column_stack((cos_lats * np.cos(lons), cos_lats * np.sin(lons), np.sin(lats)))
+
+class CityIndex:
+    """Nearest-city lookup over the cities in a KML file.
+
+    Cities are stored as unit vectors, and on the unit sphere the largest dot
+    product is the smallest great-circle distance, so a whole batch of users is
+    matched with one matrix product instead of a haversine per user and city.
+    """
 
-    closest_city = None
-    min_distance = float('inf')
-    for location in all_locations:
-        loc_lat = location['latitude']
-        loc_lon = location['longitude']
-        distance = haversine(user_lat, user_lon, loc_lat, loc_lon)
+    def __init__(self, locations, chunk_size=65536):
+        self.locations = locations
+        self.names = [location["name"] for location in locations]
+        self.chunk_size = chunk_size
+        self._vectors = to_unit_vectors(
+            [location["latitude"] for location in locations],
+            [location["longitude"] for location in locations]
+        )
 
-        if distance < min_distance:
-            min_distance = distance
-            closest_city = location["name"]
+    def nearest_indices(self, lats, lons):
+        points = to_unit_vectors(lats, lons)
+        indices = np.empty(len(points), dtype=np.int64)
 
-    return closest_city
+        for start in range(0, len(points), self.chunk_size):
+            chunk = points[start:start + self.chunk_size]
+            indices[start:start + len(chunk)] = np.argmax(chunk @ self._vectors.T, axis=1)
 
-def fetch_user_locations(realtime_db):
-    users_ref = realtime_db.child('users')
-    users_data = users_ref.get()
+        return indices
+
+    def nearest(self, lats, lons):
+        return [self.names[index] for index in self.nearest_indices(lats, lons)]
+
+@lru_cache(maxsize=None)
+def get_city_index(file_path=CITIES_KML_PATH):
+    cities = parse_kml(file_path)
+    all_locations = [loc for loc in cities if isinstance(loc.get("name"), str) and loc["name"].isalpha()]
+    return CityIndex(all_locations)
+
+def get_closest_cities(lats, lons):
+    if len(lats) == 0:
+        return []
+    return get_city_index().nearest(lats, lons)
+
+def get_closest_city(user_lat, user_lon):
+    return get_closest_cities([user_lat], [user_lon])[0]
+
+def fetch_user_locations():
+    users_data = user_snapshot.get_users()
 
     if not users_data:
         return []
@@ -78,51 +114,83 @@ def fetch_user_locations(realtime_db):
 
     return user_locations
 
-def fetch_college_counts(realtime_db):
-    users_ref = realtime_db.child('users')
-    users_data = users_ref.get()
+def fetch_college_counts():
+    # Imported here to avoid a circular import, the table is built on this module
+    from app.utils.columnar import get_user_table
 
-    if not users_data:
-        return {}
+    return get_user_table().college_counts()
 
-    college_counts = {}
-    for user_id, user_data in users_data.items():
-        if not isinstance(user_data, dict):
-            print(f"Skipping invalid user data for user ID: {user_id}")
-            continue
+def fetch_recent_users():
+    from app.utils.columnar import get_user_table
 
-        college = user_data.get("collegeOrSchool")
-        if college:
-            college_counts[college] = college_counts.get(college, 0) + 1
+    current_time = datetime.now(timezone.utc).replace(tzinfo=None)
+    recent_users_12h_count, recent_users_4h_count = get_user_table().recent_user_counts(current_time, [12, 4])
 
-    return college_counts
+    return recent_users_12h_count, recent_users_4h_count
 
-def fetch_recent_users(realtime_db):
-    users_ref = realtime_db.child('users')
-    users_data = users_ref.get()
+SIGNUP_EPOCH = datetime(1970, 1, 1)
 
-    if not users_data:
-        return 0
-    
-    recent_users_12h_count = 0
-    recent_users_4h_count = 0
-    current_time = datetime.now(timezone.utc)
+def build_signup_epochs(users_data):
+    """Sorted `created_at` epochs of every user that counts towards the signup charts.
 
-    for user_id, user_data in users_data.items():
+    Each `created_at` is parsed exactly once. Epochs are taken against a naive
+    1970-01-01 so they order exactly like the naive datetimes they came from.
+    """
+    epochs = []
+    for user_data in users_data.values():
         if not isinstance(user_data, dict):
-            print(f"Skipping invalid user data for user ID: {user_id}")
             continue
 
-        created_at = user_data.get("created_at")
-        if created_at:
-            try:
-                created_time = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-                if current_time - created_time <= timedelta(hours=12):
-                    recent_users_12h_count += 1
-                if current_time - created_time <= timedelta(hours=4):
-                    recent_users_4h_count += 1
-            except ValueError:
-                print(f"Skipping user {user_id}: Invalid 'created_at' format.")
-                continue
-
-    return recent_users_12h_count, recent_users_4h_count
\ No newline at end of file
+        created_at_str = user_data.get("created_at", None)
+        lives_in = user_data.get("livesIn", None)
+        if not created_at_str or not lives_in or not isinstance(lives_in, dict):
+            continue
+
+        try:
+            created_at = datetime.strptime(created_at_str, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+
+        epochs.append((created_at - SIGNUP_EPOCH).total_seconds())
+
+    epochs.sort()
+    return epochs
+
+def count_created_before(epochs, moment):
+    return bisect_left(epochs, (moment - SIGNUP_EPOCH).total_seconds())
+
+def count_created_until(epochs, moment):
+    return bisect_right(epochs, (moment - SIGNUP_EPOCH).total_seconds())
+
+def compute_gained_users(epochs, now):
+    """Cumulative signup series for `/api/v1/total_users` from sorted signup epochs.
+
+    Every bucket is a single binary search, see `build_signup_epochs()`.
+    """
+
+    last_week = OrderedDict()
+    for i in range(7, 0, -1):
+        day = now - timedelta(days=i)
+        last_week[day.strftime("%a")] = last_week.get(day.strftime("%a"), 0) + count_created_before(epochs, day)
+
+    last_month = OrderedDict()
+    for i in range(30, 0, -1):
+        day = now - timedelta(days=i)
+        last_month[day.strftime("%d %b")] = last_month.get(day.strftime("%d %b"), 0) + count_created_before(epochs, day)
+
+    def monthly(months):
+        series = OrderedDict()
+        for i in range(months, 0, -1):
+            start_of_month = (now - timedelta(days=i * 30)).replace(day=1)
+            end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            month_name = start_of_month.strftime("%b %Y")
+            series[month_name] = series.get(month_name, 0) + count_created_until(epochs, end_of_month)
+        return series
+
+    return {
+        "last_week": list(last_week.items()),
+        "last_month": list(last_month.items()),
+        "last_4_months": list(monthly(4).items()),
+        "last_6_months": list(monthly(6).items()),
+        "last_year": list(monthly(12).items()),
+    }
@@ -1,6 +1,7 @@
 import random
 
 from app import bucket
+from bisect import bisect_right
 from datetime import datetime, timedelta
 
 def upload_image_to_firebase(file_path, user_id):
@@ -12,24 +13,49 @@ def upload_image_to_firebase(file_path, user_id):
   except Exception as e:
     print(f"Error uploading image for user {user_id}: {e}")
 
+def parse_fields(fields_param):
+  """Field names from a `fields=a,b,c` query parameter, or None for every field."""
+  fields = [field.strip() for field in (fields_param or "").split(",") if field.strip()]
+  return fields or None
+
+def project_user(user_id, user_data, fields=None):
+  if not fields:
+    return {"id": user_id, **user_data}
+  return {"id": user_id, **{field: user_data[field] for field in fields if field in user_data}}
+
+def search_texts(user_data):
+  """The strings the admin user search matches a lowercased query against."""
+  return (
+    str(user_data.get("name", "")).lower(),
+    str(user_data.get("email", "")).lower(),
+    str(user_data.get("age", "")),
+    str(user_data.get("attractiveness", "")),
+    str(user_data.get("gender", "")).lower(),
+  )
+
+def matches_search(user_data, search_query):
+  return any(search_query in text for text in search_texts(user_data))
+
+LIKE_PERIODS = {
+  'day': timedelta(days=1),
+  'week': timedelta(days=7),
+  'month': timedelta(days=30),
+  '6months': timedelta(days=182),
+  'year': timedelta(days=365),
+}
+
+def count_likes_by_period(likes_received, current_time=None):
+  """Likes newer than each of LIKE_PERIODS, parsing every timestamp only once."""
+  if current_time is None:
+    current_time = datetime.now()
+
+  like_times = sorted(datetime.fromisoformat(timestamp) for timestamp in likes_received)
+  total = len(like_times)
+
+  return {
+    period: total - bisect_right(like_times, current_time - delta)
+    for period, delta in LIKE_PERIODS.items()
+  }
+
 def filter_likes_by_period(likes_received, period='day'):
-  current_time = datetime.now()
-
-  if period == 'day':
-    delta = timedelta(days=1)
-  elif period == 'week':
-    delta = timedelta(days=7)
-  elif period == 'month':
-    delta = timedelta(days=30)
-  elif period == '6months':
-    delta = timedelta(days=182)
-  elif period == 'year':
-    delta = timedelta(days=365)
-
-  period_start = current_time - delta
-
-  filtered_likes = [
-    timestamp for timestamp in likes_received
-    if datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S') > period_start
-  ]
-  return len(filtered_likes)
\ No newline at end of file
+  return count_likes_by_period(likes_received)[period]
@@ -0,0 +1,159 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+class WebhookQueue:
+    """Durable SQLite queue between the webhook endpoint and a worker pool.
+
+    The endpoint only verifies and `enqueue()`s an event, which is one insert
+    keyed on the event ID, so redeliveries of an event that is already queued
+    or processed are dropped there. Workers pass the stored payload to
+    `handler(event)`. A failing event is retried with backoff up to
+    `max_attempts` times and then left as `failed` until `replay()` queues it
+    again. Rows still `queued` or `processing` when the process stopped are
+    picked up again by `start()`.
+    """
+
+    def __init__(self, db_path, handler, workers=4, max_attempts=3, retry_delay=2):
+        self.db_path = db_path
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self._ready = queue.Queue()
+        self._threads = []
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id TEXT PRIMARY KEY,
+                    type TEXT,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    received_at REAL NOT NULL,
+                    processed_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS events_status ON events (status, received_at)")
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connect().execute(sql, params)
+
+    def start(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            missing = self.workers - len(self._threads)
+            if missing <= 0:
+                return
+
+            conn = self._connect()
+            # Anything left mid-flight by a previous process goes back in line
+            conn.execute("UPDATE events SET status = 'queued' WHERE status = 'processing'")
+            pending = [row[0] for row in conn.execute(
+                "SELECT id FROM events WHERE status = 'queued' ORDER BY received_at"
+            )]
+
+            for _ in range(missing):
+                thread = threading.Thread(target=self._work, name="webhook-worker", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        for event_id in pending:
+            self._ready.put(event_id)
+
+    def enqueue(self, event_id, event_type, payload):
+        """Store a verified event, returns False if this event ID was seen before."""
+        cursor = self._execute(
+            "INSERT OR IGNORE INTO events (id, type, payload, status, received_at) VALUES (?, ?, ?, 'queued', ?)",
+            (event_id, event_type, payload, time.time())
+        )
+        if cursor.rowcount == 0:
+            return False
+
+        self._ready.put(event_id)
+        return True
+
+    def replay(self, event_id=None, status="failed"):
+        """Queue failed events again (or one event by ID), returns the replayed IDs."""
+        if event_id:
+            rows = self._execute("SELECT id FROM events WHERE id = ?", (event_id,)).fetchall()
+        else:
+            rows = self._execute("SELECT id FROM events WHERE status = ? ORDER BY received_at", (status,)).fetchall()
+
+        event_ids = [row[0] for row in rows]
+        for replay_id in event_ids:
+            self._execute("UPDATE events SET status = 'queued', attempts = 0, error = NULL WHERE id = ?", (replay_id,))
+            self._ready.put(replay_id)
+        return event_ids
+
+    def _claim(self, event_id):
+        cursor = self._execute(
+            "UPDATE events SET status = 'processing', attempts = attempts + 1 WHERE id = ? AND status = 'queued'",
+            (event_id,)
+        )
+        if cursor.rowcount == 0:
+            return None
+        return self._execute("SELECT payload, attempts FROM events WHERE id = ?", (event_id,)).fetchone()
+
+    def _retry_later(self, event_id, delay):
+        timer = threading.Timer(delay, self._ready.put, args=(event_id,))
+        timer.daemon = True
+        timer.start()
+
+    def _work(self):
+        while True:
+            event_id = self._ready.get()
+            claimed = self._claim(event_id)
+            if claimed is None:
+                continue
+
+            payload, attempts = claimed
+            try:
+                self.handler(json.loads(payload))
+                self._execute(
+                    "UPDATE events SET status = 'done', error = NULL, processed_at = ? WHERE id = ?",
+                    (time.time(), event_id)
+                )
+            except Exception as e:
+                print(f"Error processing webhook event {event_id} (attempt {attempts}): {e}")
+                status = "queued" if attempts < self.max_attempts else "failed"
+                self._execute(
+                    "UPDATE events SET status = ?, error = ?, processed_at = ? WHERE id = ?",
+                    (status, str(e), time.time(), event_id)
+                )
+                if status == "queued":
+                    self._retry_later(event_id, self.retry_delay * 2 ** (attempts - 1))
+
+    def stats(self, recent=1000):
+        """Events per status and processing lag percentiles over the last `recent` finished events."""
+        counts = dict(self._execute("SELECT status, COUNT(*) FROM events GROUP BY status").fetchall())
+        lags = sorted(row[0] for row in self._execute(
+            "SELECT processed_at - received_at FROM events WHERE status = 'done' ORDER BY processed_at DESC LIMIT ?",
+            (recent,)
+        ).fetchall())
+
+        def percentile(fraction):
+            if not lags:
+                return None
+            return lags[min(len(lags) - 1, int(fraction * len(lags)))]
+
+        return {
+            "counts": counts,
+            "workers": sum(1 for thread in self._threads if thread.is_alive()),
+            "lag_p50_seconds": percentile(0.5),
+            "lag_p99_seconds": percentile(0.99)
+        }
@@ -0,0 +1,211 @@
+"""In-memory stand-in for the realtime database, so app modules import and run without Firebase.
+
+Import this module before any `app` module. It registers a bare `app`
+package whose `realtime_db` is a `FakeReference` over `database`.
+"""
+import copy
+import os
+import random
+import sys
+import threading
+import time
+import types
+
+from collections import OrderedDict
+from firebase_admin.db import TransactionAbortedError
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+def _sort_rank(value):
+    # Realtime database order: null, false, true, numbers, strings, objects
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, 0)
+
+class FakeDatabase:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = {}
+        # fail_when(writes) returning True makes that update() or set() raise
+        self.fail_when = None
+        self.latency = 0
+        # Round trips to the database since the last reset
+        self.requests = 0
+
+    def reset(self, data=None):
+        with self.lock:
+            self.data = copy.deepcopy(data or {})
+            self.fail_when = None
+            self.requests = 0
+
+    def read(self, segments):
+        node = self.data
+        for segment in segments:
+            if not isinstance(node, dict):
+                return None
+            node = node.get(segment)
+        return node
+
+    def write(self, segments, value):
+        if not segments:
+            self.data = value if isinstance(value, dict) else {}
+            return
+        parents = [self.data]
+        node = self.data
+        for segment in segments[:-1]:
+            if not isinstance(node.get(segment), dict):
+                if value is None:
+                    return
+                node[segment] = {}
+            node = node[segment]
+            parents.append(node)
+        if value is None or value == {}:
+            node.pop(segments[-1], None)
+        else:
+            node[segments[-1]] = value
+        # Empty objects don't exist in the realtime database
+        for depth in range(len(segments) - 1, 0, -1):
+            if parents[depth]:
+                break
+            parents[depth - 1].pop(segments[depth - 1], None)
+
+    def pause(self):
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(random.random() * self.latency)
+
+def _split(path):
+    return tuple(segment for segment in path.split("/") if segment)
+
+class FakeReference:
+    def __init__(self, database, segments=()):
+        self.database = database
+        self.segments = tuple(segments)
+
+    @property
+    def key(self):
+        return self.segments[-1] if self.segments else None
+
+    @property
+    def path(self):
+        return "/" + "/".join(self.segments)
+
+    def child(self, path):
+        return FakeReference(self.database, self.segments + _split(path))
+
+    def get(self, shallow=False):
+        self.database.pause()
+        with self.database.lock:
+            value = copy.deepcopy(self.database.read(self.segments))
+        if shallow and isinstance(value, dict):
+            return {key: True for key in value}
+        return value
+
+    def set(self, value):
+        self.database.pause()
+        with self.database.lock:
+            if self.database.fail_when and self.database.fail_when({"/".join(self.segments): value}):
+                raise ConnectionError("Injected set failure")
+            self.database.write(self.segments, copy.deepcopy(value))
+
+    def delete(self):
+        self.set(None)
+
+    def update(self, value):
+        self.database.pause()
+        with self.database.lock:
+            if self.database.fail_when and self.database.fail_when(value):
+                raise ConnectionError("Injected update failure")
+            for path, item in value.items():
+                segments = self.segments + _split(path)
+                if isinstance(item, dict) and ".sv" in item:
+                    current = self.database.read(segments)
+                    item = (current if isinstance(current, (int, float)) else 0) + item[".sv"]["increment"]
+                self.database.write(segments, copy.deepcopy(item))
+
+    def transaction(self, transaction_update):
+        # Compare-and-set on the value, as the real client does with its hash
+        for _ in range(25):
+            current = self.get()
+            new_value = transaction_update(copy.deepcopy(current))
+            self.database.pause()
+            with self.database.lock:
+                if self.database.read(self.segments) == current:
+                    self.database.write(self.segments, copy.deepcopy(new_value))
+                    return new_value
+        raise TransactionAbortedError("Transaction aborted after failed retries")
+
+    def order_by_key(self):
+        return FakeQuery(self, None)
+
+    def order_by_child(self, child):
+        return FakeQuery(self, child)
+
+class FakeQuery:
+    def __init__(self, reference, child):
+        self.reference = reference
+        self.child = child
+        self.start = None
+        self.end = None
+        self.first = None
+        self.last = None
+
+    def start_at(self, value):
+        self.start = value
+        return self
+
+    def end_at(self, value):
+        self.end = value
+        return self
+
+    def limit_to_first(self, limit):
+        self.first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        self.last = limit
+        return self
+
+    def _value(self, key, item):
+        if self.child is None:
+            return key
+        return item.get(self.child) if isinstance(item, dict) else None
+
+    def get(self):
+        data = self.reference.get()
+        if not isinstance(data, dict):
+            return OrderedDict()
+        entries = sorted(
+            ((_sort_rank(self._value(key, item)), key) for key, item in data.items())
+        )
+        if self.start is not None:
+            entries = [entry for entry in entries if entry >= (_sort_rank(self.start), "")]
+        if self.end is not None:
+            entries = [entry for entry in entries if entry[0] <= _sort_rank(self.end)]
+        if self.first is not None:
+            entries = entries[:self.first]
+        if self.last is not None:
+            entries = entries[-self.last:]
+        return OrderedDict((key, data[key]) for _, key in entries)
+
+database = FakeDatabase()
+realtime_db = FakeReference(database)
+
+if "app" not in sys.modules:
+    app_module = types.ModuleType("app")
+    app_module.__path__ = [APP_DIR]
+    app_module.realtime_db = realtime_db
+    app_module.bucket = None
+    firebase_module = types.ModuleType("app.firebase")
+    firebase_module.realtime_db = realtime_db
+    firebase_module.bucket = None
+    firebase_module.firestore_db = None
+    sys.modules["app"] = app_module
+    sys.modules["app.firebase"] = firebase_module
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+from tests import fake_firebase
+
+os.environ.setdefault("CHECKIN_BUFFER_PATH", os.path.join(tempfile.mkdtemp(), "checkin_buffer.sqlite3"))
+
+from flask import Flask
+from app.api.event import event_bp
+from app.utils.events import EVENT_SUMMARIES, event_summary
+
+database = fake_firebase.database
+
+# More past events than one default page holds
+PAST_EVENTS = 120
+
+def past_event(index):
+    return {"name": f"Gig {index}", "event_date": f"2020-01-01T00:{index // 60:02d}:{index % 60:02d}",
+            "max_tickets": 10, "vip_limit": 2, "booked_normal": 0, "booked_vip": 0}
+
+class PastEventsTest(unittest.TestCase):
+    def setUp(self):
+        events = {f"gig{index:03d}": past_event(index) for index in range(PAST_EVENTS)}
+        database.reset({
+            "events": events,
+            EVENT_SUMMARIES: {event_id: event_summary(event) for event_id, event in events.items()}
+        })
+        app = Flask(__name__)
+        app.register_blueprint(event_bp)
+        self.client = app.test_client()
+
+    def test_plain_list_holds_every_past_event(self):
+        events = self.client.get("/api/v1/events/past").get_json()
+        self.assertEqual(len(events), PAST_EVENTS)
+        self.assertEqual(events[0]["event_id"], f"gig{PAST_EVENTS - 1:03d}")
+        self.assertEqual(events[-1]["event_id"], "gig000")
+
+    def test_cursor_pages_default_to_50_and_cover_every_event(self):
+        seen = []
+        page = self.client.get("/api/v1/events/past?limit=").get_json()
+        self.assertEqual(len(page["events"]), 50)
+        while True:
+            seen += [event["event_id"] for event in page["events"]]
+            if not page["next_cursor"]:
+                break
+            page = self.client.get("/api/v1/events/past", query_string={"cursor": page["next_cursor"]}).get_json()
+
+        self.assertEqual(seen, [f"gig{index:03d}" for index in reversed(range(PAST_EVENTS))])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from unittest import mock
+from tests import fake_firebase
+
+os.environ.setdefault("WEBHOOK_QUEUE_PATH", os.path.join(tempfile.mkdtemp(), "webhook_queue.sqlite3"))
+
+from app.api import payment
+from app.utils.holds import hold_sweeper
+from app.utils.seats import seat_counts
+
+database = fake_firebase.database
+realtime_db = fake_firebase.realtime_db
+
+def fail_once(prefix):
+    """`fail_when` hook failing the first update that writes under `prefix`."""
+    failed = []
+
+    def check(writes):
+        if not failed and any(path.startswith(prefix) for path in writes):
+            failed.append(True)
+            return True
+        return False
+    return check
+
+def payment_event(booking_id, intent_id):
+    return {
+        "id": f"evt_{intent_id}",
+        "type": "payment_intent.succeeded",
+        "data": {"object": {
+            "id": intent_id,
+            "amount": 1000,
+            "currency": "usd",
+            "status": "succeeded",
+            "metadata": {"booking_id": booking_id}
+        }}
+    }
+
+class SeatHoldPaymentTest(unittest.TestCase):
+    def setUp(self):
+        database.reset({"events": {"gig": {"max_tickets": 2, "vip_limit": 0}}})
+        # The tests sweep by hand
+        patcher = mock.patch.object(hold_sweeper, "start")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, database, "latency", 0)
+
+    def book(self, booking_id, expired=False):
+        now = time.time() - hold_sweeper.ttl - 1 if expired else None
+        hold = hold_sweeper.place_hold("gig", "normal", booking_id, now=now)
+        payment.create_booking_document("gig", "Ann", 30, "f", "normal", 1000, booking_id=booking_id, hold=hold)
+        return hold
+
+    def counts(self):
+        return seat_counts(realtime_db.child("events/gig").get())
+
+    def assert_sold(self, booking_id, sold=1):
+        self.assertEqual(realtime_db.child("bookings").child(booking_id).child("status").get(), "successful")
+        self.assertEqual(self.counts(), {"booked_normal": sold, "held_normal": 0, "available_normal": 2 - sold,
+                                         "booked_vip": 0, "held_vip": 0, "available_vip": 0})
+        self.assertIsNone(realtime_db.child("seatHolds").get())
+
+    def test_payment_turns_hold_into_sale(self):
+        self.book("b1")
+        payment.process_stripe_event(payment_event("b1", "pi_1"))
+        self.assert_sold("b1")
+
+    def test_retry_after_failed_write_takes_no_second_seat(self):
+        self.book("b1")
+        database.fail_when = fail_once("payments/")
+        with self.assertRaises(ConnectionError):
+            payment.process_stripe_event(payment_event("b1", "pi_1"))
+
+        payment.process_stripe_event(payment_event("b1", "pi_1"))
+        self.assert_sold("b1")
+
+    def test_retry_after_failed_write_on_lapsed_hold_takes_no_second_seat(self):
+        self.book("b1", expired=True)
+        hold_sweeper.sweep()
+        self.assertEqual(realtime_db.child("bookings/b1/status").get(), "expired")
+
+        database.fail_when = fail_once("payments/")
+        with self.assertRaises(ConnectionError):
+            payment.process_stripe_event(payment_event("b1", "pi_1"))
+        payment.process_stripe_event(payment_event("b1", "pi_1"))
+        self.assert_sold("b1")
+
+    def test_lapsed_hold_without_seats_left_is_kept_for_refund(self):
+        self.book("b1", expired=True)
+        hold_sweeper.sweep()
+        self.book("b2")
+        self.book("b3")
+
+        payment.process_stripe_event(payment_event("b1", "pi_1"))
+        self.assertEqual(realtime_db.child("bookings/b1/status").get(), "seats_unavailable")
+        self.assertEqual(self.counts()["held_normal"], 2)
+        self.assertEqual(self.counts()["available_normal"], 0)
+
+    def test_sweeper_racing_payment_never_expires_a_paid_booking(self):
+        database.latency = 0.002
+        for attempt in range(20):
+            database.reset({"events": {"gig": {"max_tickets": 2, "vip_limit": 0}}})
+            self.book("b1", expired=True)
+            threads = [
+                threading.Thread(target=hold_sweeper.sweep),
+                threading.Thread(target=payment.process_stripe_event, args=(payment_event("b1", "pi_1"),))
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assert_sold("b1")
+
+    def test_failed_sweep_gives_the_seat_back_on_the_next_one(self):
+        self.book("b1", expired=True)
+        database.fail_when = fail_once("seatHolds/")
+        with mock.patch.object(hold_sweeper, "claim_lease", 0):
+            self.assertEqual(hold_sweeper.sweep()["failed"], 1)
+            self.assertEqual(hold_sweeper.sweep()["released"], 1)
+
+        self.assertEqual(realtime_db.child("bookings/b1/status").get(), "expired")
+        self.assertEqual(self.counts()["available_normal"], 2)
+        self.assertEqual(self.counts()["held_normal"], 0)
+        self.assertEqual(realtime_db.child("paymentRollups/events/gig/bookings").get(), {"pending": 0, "expired": 1})
+
+    def test_sweep_releases_hold_of_missing_booking_without_writing_it(self):
+        hold_sweeper.place_hold("gig", "normal", "ghost", now=time.time() - hold_sweeper.ttl - 1)
+        self.assertEqual(hold_sweeper.sweep()["released"], 1)
+
+        self.assertIsNone(realtime_db.child("bookings").get())
+        self.assertIsNone(realtime_db.child("bookings_by_event").get())
+        self.assertEqual(self.counts()["available_normal"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
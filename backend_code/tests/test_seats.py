@@ -0,0 +1,152 @@
+import os
+import tempfile
+import unittest
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from tests import fake_firebase
+
+os.environ.setdefault("CHECKIN_BUFFER_PATH", os.path.join(tempfile.mkdtemp(), "checkin_buffer.sqlite3"))
+
+from flask import Flask
+from firebase_admin.db import TransactionAbortedError
+from app.api.event import event_bp
+from app.utils.events import EVENT_SUMMARIES, event_summary
+from app.utils.seats import (
+    EventNotFoundError,
+    SeatUnavailableError,
+    initial_seat_shards,
+    reserve_seats,
+    seat_counts
+)
+
+database = fake_firebase.database
+realtime_db = fake_firebase.realtime_db
+
+# Parallel requests per run, well above capacity so most of them race for the last seats
+BOOKINGS = 400
+THREADS = 64
+
+def new_event(max_tickets, vip_limit, shards=1):
+    event = {"name": "Gig", "max_tickets": max_tickets, "vip_limit": vip_limit, "booked_normal": 0, "booked_vip": 0}
+    if shards > 1:
+        event["seat_shard_count"] = shards
+        event["seat_shards"] = initial_seat_shards(event, shards)
+    return event
+
+def event_tree(event):
+    """Database holding `event` as `gig`, with its listing summary like create_event writes it."""
+    return {"events": {"gig": event}, EVENT_SUMMARIES: {"gig": event_summary(event)}}
+
+class ParallelBookingTest(unittest.TestCase):
+    def setUp(self):
+        database.latency = 0.001
+        self.addCleanup(setattr, database, "latency", 0)
+        app = Flask(__name__)
+        app.register_blueprint(event_bp)
+        self.app = app
+
+    def book(self, seat_type):
+        response = self.app.test_client().post("/api/v1/events/gig/book", json={
+            "name": "Ann", "age": 30, "gender": "f", "seat_type": seat_type
+        })
+        return seat_type, response.status_code
+
+    def hammer(self, max_tickets, vip_limit, shards=1):
+        database.reset(event_tree(new_event(max_tickets, vip_limit, shards)))
+        seat_types = ["vip" if index % 5 == 0 else "normal" for index in range(BOOKINGS)]
+        with ThreadPoolExecutor(max_workers=THREADS) as executor:
+            results = Counter(executor.map(self.book, seat_types))
+
+        event = realtime_db.child("events/gig").get()
+        counts = seat_counts(event)
+        tickets = Counter(ticket["seat_type"] for ticket in (event.get("tickets") or {}).values())
+
+        # Only booked, sold out, or too contended to commit
+        self.assertLessEqual({status for _, status in results}, {200, 400, 503})
+        for seat_type, capacity in (("normal", max_tickets), ("vip", vip_limit)):
+            booked = counts[f"booked_{seat_type}"]
+            self.assertLessEqual(booked, capacity)
+            self.assertEqual(booked, results[(seat_type, 200)])
+            self.assertEqual(tickets[seat_type], booked)
+            # Nobody was turned away while seats were left
+            if results[(seat_type, 503)] == 0:
+                self.assertEqual(booked, capacity)
+        return results
+
+    def test_parallel_bookings_never_exceed_capacity(self):
+        self.hammer(max_tickets=150, vip_limit=20)
+
+    def test_parallel_bookings_on_sharded_counters_never_exceed_capacity(self):
+        for shards in (4, 16):
+            with self.subTest(shards=shards):
+                self.hammer(max_tickets=150, vip_limit=20, shards=shards)
+
+    def test_missing_event_is_not_found(self):
+        database.reset({})
+        self.assertEqual(self.book("normal"), ("normal", 404))
+        self.assertIsNone(realtime_db.child("events").get())
+
+    def test_event_without_summary_still_books(self):
+        for shards in (1, 4):
+            with self.subTest(shards=shards):
+                database.reset({"events": {"gig": new_event(1, 1, shards)}})
+                self.assertEqual(self.book("vip"), ("vip", 200))
+                self.assertEqual(self.book("vip"), ("vip", 400))
+                self.assertEqual(seat_counts(realtime_db.child("events/gig").get())["booked_vip"], 1)
+
+    def test_booking_costs_four_round_trips(self):
+        # Limits, the counter transaction's read and conditional write, the ticket
+        for shards in (1, 4):
+            with self.subTest(shards=shards):
+                database.reset(event_tree(new_event(10, 2, shards)))
+                self.assertEqual(self.book("normal"), ("normal", 200))
+                self.assertEqual(database.requests, 4)
+
+    def test_failed_ticket_write_gives_the_seat_back(self):
+        for shards in (1, 4):
+            with self.subTest(shards=shards):
+                database.reset(event_tree(new_event(10, 2, shards)))
+                database.fail_when = lambda writes: any("/tickets/" in path for path in writes)
+                self.assertEqual(self.book("vip"), ("vip", 500))
+
+                event = realtime_db.child("events/gig").get()
+                self.assertIsNone(event.get("tickets"))
+                self.assertEqual(seat_counts(event)["booked_vip"], 0)
+                self.assertEqual(seat_counts(event)["available_vip"], 2)
+
+class ReserveSeatsTest(unittest.TestCase):
+    def setUp(self):
+        database.latency = 0.001
+        self.addCleanup(setattr, database, "latency", 0)
+
+    def test_parallel_multi_seat_reservations_are_all_or_nothing(self):
+        for shards in (1, 8):
+            with self.subTest(shards=shards):
+                database.reset(event_tree(new_event(100, 10, shards)))
+
+                def reserve(_):
+                    try:
+                        reserve_seats("gig", {"normal": 3, "vip": 1})
+                        return "reserved"
+                    except SeatUnavailableError:
+                        return "sold_out"
+                    except TransactionAbortedError:
+                        return "busy"
+
+                with ThreadPoolExecutor(max_workers=THREADS) as executor:
+                    results = Counter(executor.map(reserve, range(200)))
+
+                counts = seat_counts(realtime_db.child("events/gig").get())
+                self.assertEqual(counts["booked_normal"], 3 * results["reserved"])
+                self.assertEqual(counts["booked_vip"], results["reserved"])
+                self.assertLessEqual(counts["booked_normal"], 100)
+                self.assertLessEqual(counts["booked_vip"], 10)
+
+    def test_missing_event_raises(self):
+        database.reset({})
+        with self.assertRaises(EventNotFoundError):
+            reserve_seats("gig", {"normal": 1})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import random
+import unittest
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from tests import fake_firebase
+
+from app.utils.columnar import UserTable
+from app.utils.total import build_signup_epochs, compute_gained_users
+
+def legacy_gained_users(users_data, now):
+    """`gained_user` as get_total_users computed it before the signup epochs, one scan per bucket."""
+    def created_at(user_data):
+        if not isinstance(user_data, dict):
+            return None
+        created_at_str = user_data.get("created_at", None)
+        lives_in = user_data.get("livesIn", None)
+        if not created_at_str or not lives_in or not isinstance(lives_in, dict):
+            return None
+        try:
+            return datetime.strptime(created_at_str, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return None
+
+    last_week = OrderedDict((day, 0) for day in [(now - timedelta(days=i)).strftime("%a") for i in range(7, 0, -1)])
+    for i in range(7, 0, -1):
+        day = now - timedelta(days=i)
+        for user_data in users_data.values():
+            created = created_at(user_data)
+            if created is not None and created < day:
+                last_week[day.strftime("%a")] += 1
+
+    last_month = OrderedDict((day, 0) for day in [(now - timedelta(days=i)).strftime("%d %b") for i in range(30, 0, -1)])
+    for i in range(30, 0, -1):
+        day = now - timedelta(days=i)
+        for user_data in users_data.values():
+            created = created_at(user_data)
+            if created is not None and created < day:
+                last_month[day.strftime("%d %b")] += 1
+
+    def monthly(months):
+        series = OrderedDict((month, 0) for month in [(now - timedelta(days=i * 30)).strftime("%b %Y") for i in range(months, 0, -1)])
+        for i in range(months, 0, -1):
+            start_of_month = (now - timedelta(days=i * 30)).replace(day=1)
+            end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            for user_data in users_data.values():
+                created = created_at(user_data)
+                if created is not None and created <= end_of_month:
+                    series[start_of_month.strftime("%b %Y")] += 1
+        return series
+
+    return {
+        "last_week": list(last_week.items()),
+        "last_month": list(last_month.items()),
+        "last_4_months": list(monthly(4).items()),
+        "last_6_months": list(monthly(6).items()),
+        "last_year": list(monthly(12).items()),
+    }
+
+def synthetic_users(now, count=400, seed=7):
+    rng = random.Random(seed)
+    users = {}
+    for index in range(count):
+        created = now - timedelta(seconds=rng.randint(0, 420 * 86400))
+        user = {"created_at": created.strftime("%Y-%m-%d %H:%M:%S")}
+        if rng.random() < 0.9:
+            user["livesIn"] = {"latitude": rng.uniform(30, 45), "longitude": rng.uniform(-120, -75)}
+        users[f"user{index:04d}"] = user
+
+    # Exactly on bucket boundaries, where < and <= differ
+    for i in range(1, 13):
+        start_of_month = (now - timedelta(days=i * 30)).replace(day=1)
+        end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        users[f"month_end{i}"] = {"created_at": end_of_month.strftime("%Y-%m-%d %H:%M:%S"), "livesIn": {"latitude": 40, "longitude": -74}}
+        users[f"day{i}"] = {"created_at": (now - timedelta(days=i)).strftime("%Y-%m-%d %H:%M:%S"), "livesIn": {"latitude": 40, "longitude": -74}}
+
+    users["no_lives_in"] = {"created_at": "2024-01-01 00:00:00"}
+    users["bad_date"] = {"created_at": "yesterday", "livesIn": {"latitude": 40, "longitude": -74}}
+    users["not_a_profile"] = True
+    return users
+
+class ComputeGainedUsersTest(unittest.TestCase):
+    # Whole seconds, like the stored created_at values, so boundary users land exactly on them
+    REFERENCE_DATES = [
+        datetime(2024, 3, 1, 12, 0, 0),
+        datetime(2024, 7, 31, 23, 59, 59),
+        datetime(2025, 1, 15, 8, 30, 0),
+        datetime(2024, 12, 31, 0, 0, 0),
+    ]
+
+    def test_matches_legacy_loops(self):
+        for now in self.REFERENCE_DATES:
+            with self.subTest(now=now):
+                users = synthetic_users(now)
+                self.assertEqual(compute_gained_users(build_signup_epochs(users), now), legacy_gained_users(users, now))
+
+    def test_matches_legacy_loops_through_user_table(self):
+        for now in self.REFERENCE_DATES:
+            with self.subTest(now=now):
+                users = synthetic_users(now)
+                table = UserTable()
+                table.rebuild(users)
+                self.assertEqual(compute_gained_users(table.signup_epochs(), now), legacy_gained_users(users, now))
+
+    def test_merges_duplicate_month_keys_like_legacy_loops(self):
+        # Two 30-day steps back from 1 March both land in January
+        now = datetime(2024, 3, 1, 12, 0, 0)
+        users = synthetic_users(now)
+        gained = compute_gained_users(build_signup_epochs(users), now)
+
+        months = [month for month, _ in gained["last_year"]]
+        self.assertLess(len(months), 12)
+        self.assertEqual(len(months), len(set(months)))
+        self.assertEqual(gained["last_year"], legacy_gained_users(users, now)["last_year"])
+
+if __name__ == "__main__":
+    unittest.main()
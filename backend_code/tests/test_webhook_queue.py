@@ -0,0 +1,142 @@
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from tests import fake_firebase
+
+os.environ.setdefault("WEBHOOK_QUEUE_PATH", os.path.join(tempfile.mkdtemp(), "webhook_queue.sqlite3"))
+
+from flask import Flask
+from app.api import payment
+from app.utils.holds import hold_sweeper
+from app.utils.seats import seat_counts
+from app.utils.webhook_queue import WebhookQueue
+
+database = fake_firebase.database
+realtime_db = fake_firebase.realtime_db
+
+ENDPOINT_SECRET = "whsec_kszJzWPepqIpvejK1N1QIj805lbhb5s8"
+
+# Bookings paid per load run, raise it for a local soak run
+LOAD_EVENTS = int(os.getenv("WEBHOOK_LOAD_EVENTS", 200))
+
+def signed_event(event_id, booking_id, intent_id):
+    """Webhook body and stripe-signature header for a payment_intent.succeeded event."""
+    body = json.dumps({
+        "id": event_id,
+        "object": "event",
+        "type": "payment_intent.succeeded",
+        "data": {"object": {
+            "id": intent_id,
+            "object": "payment_intent",
+            "amount": 1000,
+            "currency": "usd",
+            "status": "succeeded",
+            "metadata": {"booking_id": booking_id}
+        }}
+    })
+    timestamp = int(time.time())
+    signature = hmac.new(ENDPOINT_SECRET.encode(), f"{timestamp}.{body}".encode(), hashlib.sha256).hexdigest()
+    return body, f"t={timestamp},v1={signature}"
+
+class WebhookQueueLoadTest(unittest.TestCase):
+    def setUp(self):
+        database.reset({"events": {"gig": {"max_tickets": LOAD_EVENTS, "vip_limit": 0}}})
+        patcher = mock.patch.object(hold_sweeper, "start")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, database, "latency", 0)
+
+        self.queue = WebhookQueue(
+            os.path.join(tempfile.mkdtemp(), "webhook_queue.sqlite3"),
+            payment.process_stripe_event,
+            workers=8,
+            retry_delay=0.01
+        )
+        patcher = mock.patch.object(payment, "stripe_event_queue", self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue.start()
+
+        app = Flask(__name__)
+        app.register_blueprint(payment.payment_bp)
+        self.app = app
+
+    def initiate(self, count):
+        client = self.app.test_client()
+        booking_ids = []
+        for _ in range(count):
+            response = client.post("/api/v1/bookings/initiate", json={
+                "name": "Ann", "age": 30, "gender": "f", "seat_type": "normal", "event_id": "gig", "amount": 1000
+            })
+            self.assertEqual(response.status_code, 201)
+            booking_ids.append(response.get_json()["booking_id"])
+        return booking_ids
+
+    def post(self, signed):
+        body, signature = signed
+        response = self.app.test_client().post("/api/v1/webhook", data=body, headers={"stripe-signature": signature})
+        return response.get_json()["status"]
+
+    def wait_for(self, status, count, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            counts = self.queue.stats()["counts"]
+            if counts.get(status, 0) >= count and not counts.get("queued") and not counts.get("processing"):
+                return counts
+            time.sleep(0.02)
+        self.fail(f"Timed out waiting for {count} {status} events: {self.queue.stats()['counts']}")
+
+    def test_concurrent_deliveries_and_redeliveries_sell_each_seat_once(self):
+        booking_ids = self.initiate(LOAD_EVENTS)
+        events = [signed_event(f"evt_{index}", booking_id, f"pi_{index}") for index, booking_id in enumerate(booking_ids)]
+        database.latency = 0.001
+
+        # Stripe delivers at least once, every event arrives twice
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            statuses = list(executor.map(self.post, events * 2))
+
+        self.assertEqual(statuses.count("queued"), LOAD_EVENTS)
+        self.assertEqual(statuses.count("duplicate"), LOAD_EVENTS)
+        self.assertEqual(self.wait_for("done", LOAD_EVENTS), {"done": LOAD_EVENTS})
+
+        counts = seat_counts(realtime_db.child("events/gig").get())
+        self.assertEqual(counts["booked_normal"], LOAD_EVENTS)
+        self.assertEqual(counts["held_normal"], 0)
+        self.assertEqual(counts["available_normal"], 0)
+        self.assertEqual(len(realtime_db.child("payments").get()), LOAD_EVENTS)
+        self.assertIsNone(realtime_db.child("seatHolds").get())
+        self.assertEqual(realtime_db.child("paymentRollups/events/gig/payments").get(), LOAD_EVENTS)
+
+    def test_failed_events_are_retried_then_replayed_without_double_counting(self):
+        booking_ids = self.initiate(20)
+        failing = set(booking_ids[:5])
+
+        # Every final write of the first five bookings fails until replay
+        database.fail_when = lambda writes: any(f"bookings/{booking_id}/status" in writes for booking_id in failing)
+        for index, booking_id in enumerate(booking_ids):
+            self.assertEqual(self.post(signed_event(f"evt_{index}", booking_id, f"pi_{index}")), "queued")
+
+        self.assertEqual(self.wait_for("failed", 5), {"done": 15, "failed": 5})
+        self.assertEqual(seat_counts(realtime_db.child("events/gig").get())["held_normal"], 5)
+
+        database.fail_when = None
+        response = self.app.test_client().get("/api/v1/webhook/replay")
+        self.assertEqual(response.get_json()["count"], 5)
+        self.assertEqual(self.wait_for("done", 20), {"done": 20})
+
+        counts = seat_counts(realtime_db.child("events/gig").get())
+        self.assertEqual(counts["booked_normal"], 20)
+        self.assertEqual(counts["held_normal"], 0)
+        self.assertEqual(counts["available_normal"], LOAD_EVENTS - 20)
+        self.assertEqual(realtime_db.child("paymentRollups/events/gig/payments").get(), 20)
+        self.assertEqual(realtime_db.child("paymentRollups/events/gig/bookings/successful").get(), 20)
+
+if __name__ == "__main__":
+    unittest.main()
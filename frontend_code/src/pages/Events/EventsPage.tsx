@@ -15,6 +15,7 @@ type Event = {
   available_normal?: number;
   available_vip?: number;
   rsvps?: Record<string, boolean>;
+  rsvp_count?: number;
 };
 
 
@@ -85,7 +86,7 @@ const handleDelete = async (event_id: string) => {
 
 
   const EventCard = ({ event, isPast = false }: { event: Event; isPast?: boolean }) => {
-    const rsvpCount = Object.keys(event.rsvps || {}).length;
+    const rsvpCount = event.rsvp_count ?? Object.keys(event.rsvps || {}).length;
     const attendancePercentage = getAttendancePercentage(event);
 
     return (
@@ -307,7 +308,7 @@ const handleDelete = async (event_id: string) => {
               </div>
               <div className="ml-4">
                 <p className="text-2xl font-bold text-gray-900">
-                  {upcoming.reduce((total, event) => total + Object.keys(event.rsvps || {}).length, 0)}
+                  {upcoming.reduce((total, event) => total + (event.rsvp_count ?? Object.keys(event.rsvps || {}).length), 0)}
                 </p>
                 <p className="text-gray-600">Total RSVPs</p>
               </div>
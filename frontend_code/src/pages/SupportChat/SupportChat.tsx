@@ -28,11 +28,14 @@ const SupportChatWidget: React.FC<SupportChatProps> = ({ currentUser }) => {
   const [ticketId, setTicketId] = useState('');
   const [hasActiveTicket, setHasActiveTicket] = useState(false);
   const [unreadCount, setUnreadCount] = useState(0);
+  const [olderCursor, setOlderCursor] = useState<string | null>(null);
+  const [historyLoaded, setHistoryLoaded] = useState(false);
 
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const chatContainerRef = useRef<HTMLDivElement>(null);
 
   const API_BASE_URL = 'http://64.225.53.112:5000';
+  const PAGE_SIZE = 50;
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -73,11 +76,14 @@ const SupportChatWidget: React.FC<SupportChatProps> = ({ currentUser }) => {
   const fetchMessages = async (tId = ticketId) => {
     if (!tId) return;
     try {
-      const res = await fetch(`${API_BASE_URL}/api/v1/support/tickets/${tId}/messages`);
+      // Newest page only, earlier messages are loaded on demand
+      const res = await fetch(`${API_BASE_URL}/api/v1/support/tickets/${tId}/messages?limit=${PAGE_SIZE}`);
       const data = await res.json();
-      setMessages(data);
+      setMessages(data.messages);
+      setOlderCursor(data.next_cursor);
+      setHistoryLoaded(true);
       if (!isOpen) {
-        const newMsgs = data.filter((msg: Message) => msg.sender_type === 'admin');
+        const newMsgs = data.messages.filter((msg: Message) => msg.sender_type === 'admin');
         setUnreadCount((prev) => prev + newMsgs.length);
       }
     } catch (err) {
@@ -85,11 +91,34 @@ const SupportChatWidget: React.FC<SupportChatProps> = ({ currentUser }) => {
     }
   };
 
+  const fetchOlderMessages = async () => {
+    if (!ticketId || !olderCursor) return;
+    try {
+      const res = await fetch(
+        `${API_BASE_URL}/api/v1/support/tickets/${ticketId}/messages?limit=${PAGE_SIZE}&before=${encodeURIComponent(olderCursor)}`
+      );
+      const data = await res.json();
+      setMessages((prev) => [...data.messages.filter((msg: Message) => !prev.some((p) => p.id === msg.id)), ...prev]);
+      setOlderCursor(data.next_cursor);
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
+  const addMessage = (message: Message) => {
+    setMessages((prev) => (prev.some((msg) => msg.id === message.id) ? prev : [...prev, message]));
+  };
+
+  // New messages are pushed over Server-Sent Events, the browser reconnects
+  // on its own and resumes after the last message it got (Last-Event-ID)
   useEffect(() => {
-    if (!isOpen || !hasActiveTicket || !ticketId) return;
-    const interval = setInterval(() => fetchMessages(), 3000);
-    return () => clearInterval(interval);
-  }, [isOpen, hasActiveTicket, ticketId]);
+    if (!isOpen || !hasActiveTicket || !ticketId || !historyLoaded) return;
+    const lastId = messages.length ? messages[messages.length - 1].id : '';
+    const since = lastId ? `?since=${encodeURIComponent(lastId)}` : '';
+    const source = new EventSource(`${API_BASE_URL}/api/v1/support/tickets/${ticketId}/messages/stream${since}`);
+    source.onmessage = (event) => addMessage(JSON.parse(event.data));
+    return () => source.close();
+  }, [isOpen, hasActiveTicket, ticketId, historyLoaded]);
 
   const sendMessage = async () => {
     if (!text.trim() || !ticketId || !currentUser) return;
@@ -99,8 +128,9 @@ const SupportChatWidget: React.FC<SupportChatProps> = ({ currentUser }) => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ sender: currentUser, text }),
       });
+      const data = await res.json();
       setText('');
-      await fetchMessages();
+      if (data.message) addMessage(data.message);
     } catch (err) {
       console.error(err);
       setError('Failed to send message');
@@ -202,7 +232,15 @@ const SupportChatWidget: React.FC<SupportChatProps> = ({ currentUser }) => {
                   <p className="text-xs">How can we help you today?</p>
                 </div>
               ) : (
-                messages.map((msg, i) => (
+                <>
+                {olderCursor && (
+                  <div className="flex justify-center">
+                    <button onClick={fetchOlderMessages} className="text-xs text-blue-600 hover:underline">
+                      Load earlier messages
+                    </button>
+                  </div>
+                )}
+                {messages.map((msg, i) => (
                   <div key={i} className={`flex ${msg.sender_type === 'admin' ? 'justify-start' : 'justify-end'}`}>
                     <div className={`flex items-start gap-2 max-w-[85%] ${msg.sender_type === 'admin' ? 'flex-row' : 'flex-row-reverse'}`}>
                       <div className={`w-8 h-8 rounded-full flex items-center justify-center text-xs font-medium ${msg.sender_type === 'admin'
@@ -223,7 +261,8 @@ const SupportChatWidget: React.FC<SupportChatProps> = ({ currentUser }) => {
                       </div>
                     </div>
                   </div>
-                ))
+                ))}
+                </>
               )}
               <div ref={messagesEndRef} />
             </div>